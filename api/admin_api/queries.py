@@ -1,3 +1,5 @@
+from api.database import read_only
+
 def get_user_from_pending_signups_query() -> str:
     """Retrieve verified users from pending_signups table."""
     return """
@@ -37,17 +39,17 @@ def get_approved_users_query() -> str:
 """
 
 def delete_user_query() -> str:
-    """Delete a user from users table based on email."""
+    """Delete a user from users table based on email. Their balance and redemptions are deleted with them."""
     return """
         DELETE FROM users
         WHERE email = %(email)s
 """
 
 def insert_user_to_user_points_query() -> str:
-    """Insert a user's email into user_points table."""
+    """Insert a user's id into user_points table."""
     return """
-        INSERT INTO user_points (email)
-        VALUES (%(email)s);
+        INSERT INTO user_points (user_id)
+        VALUES (%(user_id)s);
     """
 
 def insert_scheme_query() -> str:
@@ -72,10 +74,12 @@ def update_scheme_query() -> str:
             scheme_valid_from = COALESCE(%(scheme_valid_from)s, scheme_valid_from),
             scheme_valid_to = COALESCE(%(scheme_valid_to)s, scheme_valid_to),
             scheme_perks = COALESCE(%(scheme_perks)s, scheme_perks),
-            points = COALESCE(%(points)s, points)
+            points = COALESCE(%(points)s, points),
+            status = CASE WHEN %(scheme_valid_to)s IS NOT NULL THEN 'active' ELSE status END
         WHERE scheme_title = %(scheme_title)s;
 """
 
+@read_only
 def get_scheme_query() -> str:
     """Retrieve all schemes from the scheme table."""
     return """
@@ -131,27 +135,32 @@ def delete_admin_query() -> str:
 """
 
 def update_user_details_query() -> str:
+    """Update a user's name and set their points balance through an adjustment entry in points_ledger."""
     return """
+        INSERT INTO points_ledger (user_id, entry_type, points, source)
+        SELECT user_id, 'adjustment', %(points)s - points, 'admin_update'
+        FROM user_points
+        WHERE user_id = %(user_id)s AND points <> %(points)s;
         UPDATE users u
         SET name = %(name)s
         FROM user_points up
-        WHERE up.email = u.email
-        AND u.email = %(email)s;
-        UPDATE user_points up
-        SET points = %(points)s
-        WHERE up.email = %(email)s;
+        WHERE up.user_id = u.id
+        AND u.id = %(user_id)s;
     """
     
+@read_only
 def get_scheme_redemption_details_query():
     return"""
-        SELECT * FROM schemes_redemption;
+        SELECT sr.id, sr.name, u.email, sr.scheme_status, sr.scheme_id
+        FROM schemes_redemption sr
+        JOIN users u ON u.id = sr.user_id;
 """
 
 def approve_scheme_query():
     return """
         UPDATE schemes_redemption
         SET scheme_status = 'approved'
-        WHERE id = %(id)s AND email = %(email)s;
+        WHERE id = %(id)s AND user_id = %(user_id)s;
 """    
 
 def reject_scheme_query_admin_api():
@@ -168,4 +177,108 @@ def get_required_points_query():
             (SELECT scheme_id
             FROM schemes_redemption
             WHERE id = %(id)s)
-"""
\ No newline at end of file
+"""
+def approve_scheme_redemptions_query():
+    """
+    Approves pending scheme redemptions in bulk and debits their points in one statement.
+
+    Redemptions are picked by id (%(ids)s) or by scheme (%(scheme_id)s). The redemption and
+    user_points rows are locked, and each user's redemptions are taken in id order: one is
+    approved if its points fit in what is left of the balance, otherwise it is skipped without
+    using any of it, so a later cheaper redemption can still be approved. Every approval
+    appends a ledger debit. Returns one row per requested redemption with its id, email,
+    result and points.
+    """
+    return """
+        WITH RECURSIVE locked AS (
+            SELECT sr.id, sr.user_id, COALESCE(s.points, 0) AS required_points, up.points AS user_points
+            FROM schemes_redemption sr
+            JOIN scheme s ON s.scheme_id = sr.scheme_id
+            JOIN user_points up ON up.user_id = sr.user_id
+            WHERE sr.scheme_status = 'pending'
+            AND (sr.id = ANY(%(ids)s::int[]) OR sr.scheme_id = %(scheme_id)s)
+            ORDER BY sr.id
+            FOR UPDATE OF sr, up
+        ),
+        ordered AS (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY id) AS position
+            FROM locked
+        ),
+        balances AS (
+            SELECT id, user_id, position, required_points, required_points <= user_points AS fits,
+                   user_points - CASE WHEN required_points <= user_points THEN required_points ELSE 0 END AS balance
+            FROM ordered
+            WHERE position = 1
+            UNION ALL
+            SELECT o.id, o.user_id, o.position, o.required_points, o.required_points <= b.balance,
+                   b.balance - CASE WHEN o.required_points <= b.balance THEN o.required_points ELSE 0 END
+            FROM balances b
+            JOIN ordered o ON o.user_id = b.user_id AND o.position = b.position + 1
+        ),
+        eligible AS (
+            SELECT id, user_id, required_points
+            FROM balances
+            WHERE fits
+        ),
+        approved AS (
+            UPDATE schemes_redemption sr
+            SET scheme_status = 'approved'
+            FROM eligible e
+            WHERE sr.id = e.id
+            RETURNING sr.id
+        ),
+        debited AS (
+            INSERT INTO points_ledger (user_id, entry_type, points, source)
+            SELECT e.user_id, 'debit', -e.required_points, 'scheme_redemption:' || e.id
+            FROM eligible e
+            JOIN approved a ON a.id = e.id
+            WHERE e.required_points > 0
+        )
+        SELECT
+            r.id,
+            u.email,
+            CASE
+                WHEN a.id IS NOT NULL THEN 'approved'
+                WHEN sr.id IS NULL THEN 'not_found'
+                WHEN sr.scheme_status <> 'pending' THEN 'not_pending'
+                WHEN l.id IS NULL THEN 'user_or_scheme_not_found'
+                ELSE 'insufficient_points'
+            END AS result,
+            l.required_points
+        FROM (
+            SELECT id FROM locked
+            UNION
+            SELECT unnest(COALESCE(%(ids)s::int[], '{}'))
+        ) r
+        LEFT JOIN schemes_redemption sr ON sr.id = r.id
+        LEFT JOIN users u ON u.id = sr.user_id
+        LEFT JOIN locked l ON l.id = r.id
+        LEFT JOIN approved a ON a.id = r.id
+        ORDER BY r.id;
+"""
+
+def expire_schemes_query():
+    """
+    Marks schemes whose scheme_valid_to has passed as expired and rejects the pending
+    redemptions of every expired scheme. Returns the number of schemes expired and
+    redemptions rejected.
+    """
+    return """
+        WITH expired AS (
+            UPDATE scheme
+            SET status = 'expired'
+            WHERE status = 'active'
+            AND scheme_date(scheme_valid_to) < CURRENT_DATE
+            RETURNING scheme_id
+        ),
+        rejected AS (
+            UPDATE schemes_redemption sr
+            SET scheme_status = 'rejected'
+            FROM scheme s
+            WHERE sr.scheme_id = s.scheme_id
+            AND sr.scheme_status = 'pending'
+            AND (s.status = 'expired' OR s.scheme_id IN (SELECT scheme_id FROM expired))
+            RETURNING sr.id
+        )
+        SELECT (SELECT COUNT(*) FROM expired), (SELECT COUNT(*) FROM rejected);
+"""
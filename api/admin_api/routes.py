@@ -1,17 +1,34 @@
+import logging
 from api.blueprints import admin  
 from flask import jsonify, request  
 from api.admin_api.utils.user_utils import*
 from api.admin_api.utils.scheme_utils import*
 from api.admin_api.utils.admin_utils import*
-from api.decoraters import token_required
+from api.decoraters import token_required, admin_required
 from datetime import date
-from time import sleep
 from api.login_api.utils.validate_utils import*
 import jwt
 import datetime
 from api.config import JWT_ALGORITHM, JWT_EXPIRY_MINUTES,JWT_SECRET_KEY
 from api.login_api.utils.otp_utlis import*
-from api.points_api.utils.points_util import redeem_user_points
+from api.user_api.utils.users_util import refresh_leaderboards
+from api.points_api.utils.points_util import redeem_user_points, insert_points_data, mint_points_codes, archive_points
+from api.points_api.utils.code_filter import code_filter
+from api.points_api.utils.scan_monitor import scan_monitor
+from api.user_cache import user_cache
+from api.response_cache import response_cache, cached_response
+from api.job_runner import job_runner
+from api.profiler import profiler
+from api.database import replica_router
+from api.circuit_breaker import breaker_stats
+from api.rate_limiter import limiter
+from api.config import RATE_LIMIT_OTP, RATE_LIMIT_OTP_IP, RATE_LIMIT_OTP_VERIFY, SCHEME_APPROVAL_MAX_IDS, JOB_MAINTENANCE_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+limiter.limit(admin, RATE_LIMIT_OTP, key="email", endpoint="send_otp")
+limiter.limit(admin, RATE_LIMIT_OTP_IP, key="ip", endpoint="send_otp")
+limiter.limit(admin, RATE_LIMIT_OTP_VERIFY, key="email", endpoint="verify_otp")
 @admin.route('/')
 def home():
     """ 
@@ -67,8 +84,8 @@ def approve_or_reject():
         if not update_status:
             return jsonify({"message": "Unable to update the status"}), 400
     
+        # Each insert is committed before the next runs, so no wait is needed in between
         res = insert_user_to_users(email)
-        sleep(2)
         res_2 = insert_user_to_user_point(email)
         return jsonify({"message": "Status updated successfully"}), 200
 
@@ -126,6 +143,8 @@ def add_schemes():
         if not response:
             return ({"message":"Unable to add scheme please try later"}), 400
         return jsonify({"message":"Scheme added","scheme_title":scheme_title}), 200
+    except ValueError as ve:
+        return jsonify({"message":str(ve)}), 400
     except Exception as e:
         return jsonify({"message":f"Internal server error {str(e)}"}), 500
         
@@ -156,10 +175,13 @@ def update_schemes():
         if not response:
             return jsonify({"message":"Unable update Scheme"}), 400
         return jsonify({"message":"Scheme Updated","Scheme title":scheme_title}), 200
+    except ValueError as ve:
+        return jsonify({"message":str(ve)}), 400
     except Exception as e:
         return jsonify({"message":f"Internal server error {str(e)}"}), 500
     
 @admin.route('/get_schemes',methods=["GET"])
+@cached_response(depends_on=("schemes",), max_age=30, stale_while_revalidate=60, private=True)
 def get_schemes():
     try:
         response = get_scheme()
@@ -178,7 +200,7 @@ def get_scheme_to_approve():
             return jsonify({"message":"No scheme found"}), 404
         return jsonify({"message":applied_schemes}), 200
     except Exception as e:
-        print(str(e))
+        logger.exception(str(e))
         return jsonify({"message":"Internal server error"}), 500
     
 @admin.route('/approve_scheme',methods=["POST"])
@@ -190,26 +212,63 @@ def approve_scheme():
         
         if not data:
             return jsonify({"message":"JSON must contain data"}), 400
-        scheme_id = data.get("id")
+        # "id" is the schemes_redemption id, not the scheme's
+        redemption_id = data.get("id")
         email = data.get("email")
         
-        if not scheme_id or not email:
+        if not redemption_id or not email:
             return jsonify({"message":"All fields required"}), 400
-        response = enough_points_for_scheme(scheme_id, email) 
+        response = enough_points_for_scheme(redemption_id, email) 
         if not  response[0]:
             return jsonify({"message":"Insuficient points"}), 400
         required_point = response[1]
         
         # if not res:
             # return jsonify({"message":"Not able to update point"}), 400
-        res_2 = update_scheme_status(scheme_id, email)
+        res_2 = update_scheme_status(redemption_id, email)
         if not res_2:
             return jsonify({"message":"Unable to update the status, Please try later"}), 400
-        res = redeem_user_points(email, required_point)
+        # Same ledger source as approve_scheme_redemptions_query()
+        res = redeem_user_points(email, required_point, f"scheme_redemption:{redemption_id}")
         return jsonify({"message":"Updated"}), 200
             
     except Exception as e:
-        print("Internal server occred", e)
+        logger.exception(f"Internal server occred: {str(e)}")
+        return jsonify({"message":"Internal server error"}), 500
+
+@admin.route('/approve_schemes',methods=["POST"])
+@admin_required
+def approve_schemes():
+    """
+    Approve many pending scheme redemptions at once
+    Takes either "ids" (a list of redemption ids) or "scheme_id" (every pending redemption of that scheme)
+    """
+    try:
+        if not request.is_json:
+            return jsonify({"message":"Request must contain JSON"}), 400
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({"message":"JSON must contain data"}), 400
+        ids = data.get("ids")
+        scheme_id = data.get("scheme_id")
+        
+        if not ids and scheme_id is None:
+            return jsonify({"message":"ids or scheme_id required"}), 400
+        if ids is not None and not isinstance(ids, list):
+            return jsonify({"message":"ids must be a list"}), 400
+        if ids and len(ids) > SCHEME_APPROVAL_MAX_IDS:
+            return jsonify({"message":f"At most {SCHEME_APPROVAL_MAX_IDS} ids per request"}), 400
+        
+        results = approve_scheme_redemptions(ids, scheme_id)
+        summary = {}
+        for result in results:
+            summary[result["result"]] = summary.get(result["result"], 0) + 1
+        return jsonify({"message":"Processed","summary":summary,"results":results}), 200
+    except ValueError as ve:
+        return jsonify({"message":str(ve)}), 400
+    except Exception as e:
+        logger.exception(f"Internal server occred: {str(e)}")
         return jsonify({"message":"Internal server error"}), 500
 
 @admin.route("/reject_scheme")
@@ -233,7 +292,7 @@ def reject_scheme():
             return jsonify({"message":"Not able to update status"}), 400
         return jsonify({"message":"Updated"}), 200
     except Exception as e:
-        print(f"Internal error {str(e)}")
+        logger.exception(f"Internal error {str(e)}")
         return jsonify({"message":"Internal server error"}), 500
 
 @admin.route('/update_user_details',methods=["PUT"])
@@ -254,7 +313,7 @@ def update_user_details():
             return jsonify({"message":"All fields required"}), 400
         
         if not isinstance(points, int):
-            print(f"Error: 'points' must be int (got {type(points).__name__}: {points})")
+            logger.warning(f"Error: 'points' must be int (got {type(points).__name__}: {points})")
             return jsonify({"message":"Type error"}), 400
         
         response = update_user_details_(email, points, name)
@@ -263,11 +322,11 @@ def update_user_details():
         return jsonify({"message":"user details updated"}), 200
         
     except Exception as e:
-        print(f"Internal server error {str(e)}")
+        logger.exception(f"Internal server error {str(e)}")
         return jsonify({"message":"Internal server error"}), 500
     
 @admin.route("/delete_user",methods=["DELETE"])
-def delete_user():
+def delete_user_route():
     try:
         if not request.is_json:
             return jsonify({"message":"Reuest most contain JSON"}), 400
@@ -283,7 +342,7 @@ def delete_user():
             return jsonify({"message":"Unable to delete user"}), 400
         return jsonify({"message":"User deleted"}),200
     except Exception as e:
-        print(f"Internal server error {str(e)}")
+        logger.exception(f"Internal server error {str(e)}")
         return jsonify({"message":"Internal server error"}),500
     
 @admin.route('/send_otp',methods=["POST"])
@@ -306,14 +365,15 @@ def send_otp():
             return jsonify({"message":"Wring mail id"}), 400
         
         otp = generate_otp()
-        response = send_otp(email, otp)
+        if not send_otp_to_db(email, otp):
+            return jsonify({"message":"Not able to store otp"}), 500
+        response = queue_otp_email(email)
         if not response:
             return jsonify({"message":"Not able to send otp"}), 400
-        res = send_otp_to_db(email, otp)
         
         return jsonify({"message":"OTP sent"}), 200
     except Exception as e:
-        print(f"Internal server error {str(e)}")
+        logger.exception(f"Internal server error {str(e)}")
         return jsonify({"message":"Internal server error"}), 500
         
 @admin.route('/verify_otp',methods=["POST"])
@@ -346,7 +406,7 @@ def verify_otp():
             return jsonify({"message":"Incorrect opt"}), 400
         return jsonify({"message":"Otp verified"}), 200
     except Exception as e:
-        print(f"Internal server error {str(e)}")
+        logger.exception(f"Internal server error {str(e)}")
         return jsonify({"message":"Internal server error"}), 500
 
 @admin.route('/admin_login', methods=["POST"])
@@ -380,7 +440,210 @@ def admin_login():
 
         return jsonify({"message": "Login Successful", "token": token, "user": email}), 200
     except DatabaseError as dber:
-        print(f"Database error: {str(dber)}")
-        return jsonify({"Database error"}), 500
+        logger.error(f"Database error: {str(dber)}")
+        return jsonify({"message": "Database error"}), 500
+    except Exception as e:
+        logger.exception(f"Internal server error {str(e)}")
+        return jsonify({"message": "Internal server error"}), 500
+
+@admin.route('/add_points', methods=["POST"])
+@admin_required
+def add_points():
+    try:
+        if not request.is_json:
+            return jsonify({"message":"Request must contain JSON payload"}), 400
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({"message":"Payload cannot be empty"}), 400
+        if "count" in data:
+            # New codes are generated with a check digit
+            codes = mint_points_codes(data.get("count"), data.get("points_value"), data.get("expiry_date"))
+            return jsonify({"message":"Points codes added","count":len(codes),"codes":codes}), 200
+        
+        points_data = data.get("points")
+        if not points_data or not isinstance(points_data, list):
+            return jsonify({"message":"points must be a non-empty list"}), 400
+        
+        inserted = insert_points_data(points_data)
+        return jsonify({"message":"Points codes added","count":inserted}), 200
+    except ValueError as ve:
+        return jsonify({"message":str(ve)}), 400
+    except Exception as e:
+        logger.exception(f"Internal server error {str(e)}")
+        return jsonify({"message":"Internal server error"}), 500
+
+@admin.route('/code_filter_stats', methods=["GET"])
+@admin_required
+def code_filter_stats():
+    if code_filter is None:
+        return jsonify({"message":"Code filter disabled"}), 404
+    return jsonify({"message":code_filter.stats()}), 200
+
+@admin.route('/user_cache_stats', methods=["GET"])
+@admin_required
+def user_cache_stats():
+    """
+    Hit ratios of the per-email profile and balance cache
+    """
+    return jsonify({"message":user_cache.stats()}), 200
+
+
+@admin.route('/response_cache_stats', methods=["GET"])
+@admin_required
+def response_cache_stats():
+    """
+    Entries, bytes, hits, 304s and evictions of the HTTP response cache
+    """
+    return jsonify({"message":response_cache.stats()}), 200
+
+
+@admin.route('/archive_points', methods=["GET", "POST"])
+@admin_required
+def archive_points_route():
+    """
+    Move scanned and expired codes to points_archive
+    Called on a schedule by the Vercel cron defined in vercel.json
+    """
+    try:
+        archived = archive_points()
+        return jsonify({"message":"Points archived","count":archived}), 200
+    except Exception as e:
+        logger.exception(f"Internal server error {str(e)}")
+        return jsonify({"message":"Internal server error"}), 500
+
+@admin.route('/expire_schemes', methods=["GET", "POST"])
+@admin_required
+def expire_schemes_route():
+    """
+    Expire schemes past their valid-to date and reject their pending redemptions
+    Called on a schedule by the Vercel cron defined in vercel.json
+    """
+    try:
+        response = expire_schemes()
+        return jsonify({"message":"Schemes expired", **response}), 200
+    except Exception as e:
+        logger.exception(f"Internal server error {str(e)}")
+        return jsonify({"message":"Internal server error"}), 500
+
+@admin.route('/refresh_leaderboards', methods=["GET", "POST"])
+@admin_required
+def refresh_leaderboards_route():
+    """
+    Rebuild the weekly, monthly and all-time leaderboard snapshot
+    Called on a schedule by the Vercel cron defined in vercel.json
+    """
+    try:
+        ranked = refresh_leaderboards()
+        return jsonify({"message":"Leaderboards refreshed","count":ranked}), 200
+    except Exception as e:
+        logger.exception(f"Internal server error {str(e)}")
+        return jsonify({"message":"Internal server error"}), 500
+
+@admin.route('/job_stats', methods=["GET"])
+@admin_required
+def job_stats():
+    """
+    Queue depth and oldest job age per job type and status
+    """
+    try:
+        return jsonify({"message":job_runner.stats()}), 200
+    except Exception as e:
+        logger.exception(f"Internal server error {str(e)}")
+        return jsonify({"message":"Internal server error"}), 500
+
+@admin.route('/replicas', methods=["GET"])
+@admin_required
+def replicas():
+    """
+    Lag and state of each read replica at its last check, and where read only queries went
+    """
+    try:
+        return jsonify({"message":replica_router.status()}), 200
     except Exception as e:
-        print(f"Internal server error {str(e)}"), 500
\ No newline at end of file
+        logger.exception(f"Internal server error {str(e)}")
+        return jsonify({"message":"Internal server error"}), 500
+
+@admin.route('/circuit_breakers', methods=["GET"])
+@admin_required
+def circuit_breakers():
+    """
+    State, window counts and totals of the circuit breaker of each dependency
+    """
+    try:
+        return jsonify({"message":breaker_stats()}), 200
+    except Exception as e:
+        logger.exception(f"Internal server error {str(e)}")
+        return jsonify({"message":"Internal server error"}), 500
+
+@admin.route('/profile', methods=["GET"])
+@admin_required
+def profile():
+    """
+    Samples every thread's stack for ?seconds= (default 10) every ?interval_ms= (default 5)
+    and returns the folded stacks, or JSON with ?format=json
+    """
+    if not profiler.enabled:
+        return jsonify({"message":"Profiler disabled"}), 404
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        interval = float(request.args.get("interval_ms", 5)) / 1000
+        include_idle = request.args.get("idle", "false").lower() == "true"
+        result = profiler.profile(seconds, interval, include_idle)
+        if result is None:
+            return jsonify({"message":"Another profile is running"}), 409
+        if request.args.get("format") == "json":
+            return jsonify({"message":{"samples":result["samples"], "seconds":result["seconds"], "stacks":dict(result["stacks"])}}), 200
+        return profiler.folded(result["stacks"]), 200, {"Content-Type":"text/plain", "X-Profile-Samples":str(result["samples"])}
+    except ValueError as ve:
+        return jsonify({"message":str(ve)}), 400
+    except Exception as e:
+        logger.exception(f"Internal server error {str(e)}")
+        return jsonify({"message":"Internal server error"}), 500
+
+@admin.route('/run_jobs', methods=["GET", "POST"])
+@admin_required
+def run_jobs():
+    """
+    Queue the maintenance jobs and run pending jobs in this request
+    Called on a schedule by the Vercel cron defined in vercel.json, where background threads do not outlive a request
+    """
+    try:
+        job_runner.enqueue("purge_expired_otps", priority=JOB_MAINTENANCE_PRIORITY)
+        job_runner.enqueue("purge_finished_jobs", priority=JOB_MAINTENANCE_PRIORITY)
+        response = job_runner.run_pending()
+        return jsonify({"message":"Jobs run", **response}), 200
+    except Exception as e:
+        logger.exception(f"Internal server error {str(e)}")
+        return jsonify({"message":"Internal server error"}), 500
+
+@admin.route('/suspicious_users', methods=["GET"])
+@admin_required
+def suspicious_users():
+    """
+    Users flagged by the scan monitor, most suspicious first
+    Flagged users get 429 from /points/validate_points until the throttle expires
+    """
+    if scan_monitor is None:
+        return jsonify({"message":"Scan monitor disabled"}), 404
+    limit = request.args.get("limit", type=int)
+    if limit is not None and limit <= 0:
+        return jsonify({"message":"limit must be a positive integer"}), 400
+    return jsonify({"message":scan_monitor.suspicious_users(limit)}), 200
+
+@admin.route('/clear_suspicious_user', methods=["POST"])
+@admin_required
+def clear_suspicious_user():
+    """
+    Lift the scan throttle of a user after review
+    """
+    if scan_monitor is None:
+        return jsonify({"message":"Scan monitor disabled"}), 404
+    if not request.is_json:
+        return jsonify({"message":"JSON data required"}), 400
+    email = request.get_json().get("email")
+    if not email:
+        return jsonify({"message":"Email required"}), 400
+    if not scan_monitor.clear(email.strip()):
+        return jsonify({"message":"User is not flagged"}), 404
+    return jsonify({"message":"User cleared"}), 200
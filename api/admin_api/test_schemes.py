@@ -0,0 +1,151 @@
+import pytest
+from datetime import date, timedelta
+from api.admin_api.queries import approve_scheme_redemptions_query, expire_schemes_query
+from api.admin_api.utils.scheme_utils import parse_scheme_date
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("01-01-2024", date(2024, 1, 1)),
+    ("29-02-2024", date(2024, 2, 29)),
+    ("31-12-1999", date(1999, 12, 31)),
+])
+def test_parse_scheme_date(value, expected):
+    assert parse_scheme_date(value, "valid_to") == expected
+
+
+@pytest.mark.parametrize("value", ["2024-01-01", "1-1-2024", "01/01/2024", "01-01-24", "31-02-2024",
+                                   "29-02-2023", "00-01-2024", "01-13-2024", " 01-01-2024", "", None, 1])
+def test_parse_scheme_date_rejects_other_values(value):
+    with pytest.raises(ValueError, match="valid_to must be a DD-MM-YYYY date"):
+        parse_scheme_date(value, "valid_to")
+
+
+def add_scheme(cursor, valid_to: str, status: str = "active", points: int = 10) -> int:
+    cursor.execute(
+        """
+        INSERT INTO scheme (scheme_title, scheme_valid_from, scheme_valid_to, points, status)
+        VALUES ('pytest scheme', '01-01-2020', %s, %s, %s)
+        RETURNING scheme_id
+        """,
+        (valid_to, points, status)
+    )
+    return cursor.fetchone()[0]
+
+
+def add_user(cursor, points: int = 0) -> int:
+    cursor.execute("INSERT INTO users (name, email, password) "
+                   "VALUES ('pytest', 'pytest.' || md5(random()::text) || '@example.com', 'x') RETURNING id")
+    user_id = cursor.fetchone()[0]
+    cursor.execute("INSERT INTO user_points (user_id, points) VALUES (%s, %s)", (user_id, points))
+    return user_id
+
+
+def add_redemption(cursor, scheme_id: int, status: str = "pending", user_id: int = None) -> int:
+    """A redemption by user_id, or by a new user as schemes_redemption allows one per user."""
+    if user_id is None:
+        user_id = add_user(cursor)
+    cursor.execute(
+        """
+        INSERT INTO schemes_redemption (name, user_id, scheme_status, scheme_id)
+        VALUES ('pytest', %s, %s, %s)
+        RETURNING id
+        """,
+        (user_id, status, scheme_id)
+    )
+    return cursor.fetchone()[0]
+
+
+def days_from_today(days: int) -> str:
+    return (date.today() + timedelta(days=days)).strftime("%d-%m-%Y")
+
+
+@pytest.fixture
+def cursor(database):
+    cursor = database.cursor()
+    # Other rows in the database would count towards the sweep's totals
+    cursor.execute("UPDATE scheme SET status = 'expired'")
+    cursor.execute("UPDATE schemes_redemption SET scheme_status = 'rejected' WHERE scheme_status = 'pending'")
+    return cursor
+
+
+def statuses(cursor, table: str, key: str, column: str, ids: list) -> list:
+    cursor.execute(f"SELECT {column} FROM {table} WHERE {key} = ANY(%s) ORDER BY array_position(%s, {key})", (ids, ids))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def test_sweep_expires_past_schemes_and_rejects_their_pending_redemptions(cursor):
+    past, today, future, malformed = (add_scheme(cursor, days_from_today(-1)), add_scheme(cursor, days_from_today(0)),
+                                      add_scheme(cursor, days_from_today(30)), add_scheme(cursor, "31-02-2024"))
+    pending = [add_redemption(cursor, scheme_id) for scheme_id in (past, today, future, malformed)]
+    approved = add_redemption(cursor, past, "approved")
+
+    cursor.execute(expire_schemes_query())
+    assert cursor.fetchone() == (1, 1)
+    # A malformed date reads as no expiry
+    assert statuses(cursor, "scheme", "scheme_id", "status", [past, today, future, malformed]) == \
+        ["expired", "active", "active", "active"]
+    assert statuses(cursor, "schemes_redemption", "id", "scheme_status", pending + [approved]) == \
+        ["rejected", "pending", "pending", "pending", "approved"]
+
+
+def test_sweep_rejects_pending_redemptions_of_schemes_that_were_already_expired(cursor):
+    expired = add_scheme(cursor, days_from_today(-10), "expired")
+    # Applied for before the scheme was expired, or expired by hand
+    pending = add_redemption(cursor, expired)
+
+    cursor.execute(expire_schemes_query())
+    # The scheme is not counted again, its redemption is still rejected
+    assert cursor.fetchone() == (0, 1)
+    assert statuses(cursor, "schemes_redemption", "id", "scheme_status", [pending]) == ["rejected"]
+
+    cursor.execute(expire_schemes_query())
+    assert cursor.fetchone() == (0, 0)
+
+
+def approve(cursor, ids: list = None, scheme_id: int = None) -> dict:
+    cursor.execute(approve_scheme_redemptions_query(), {"ids": ids, "scheme_id": scheme_id})
+    return {row[0]: (row[2], row[3]) for row in cursor.fetchall()}
+
+
+def balance(cursor, user_id: int) -> int:
+    cursor.execute("SELECT points FROM user_points WHERE user_id = %s", (user_id,))
+    return cursor.fetchone()[0]
+
+
+def test_approval_result_of_each_requested_id(database):
+    cursor = database.cursor()
+    scheme_id = add_scheme(cursor, days_from_today(30), points=50)
+    rich, poor = add_user(cursor, 80), add_user(cursor, 49)
+    approved = add_redemption(cursor, scheme_id, user_id=rich)
+    insufficient = add_redemption(cursor, scheme_id, user_id=poor)
+    not_pending = add_redemption(cursor, scheme_id, "rejected")
+    cursor.execute("SELECT COALESCE(MAX(id), 0) + 1000 FROM schemes_redemption")
+    not_found = cursor.fetchone()[0]
+
+    results = approve(cursor, [approved, insufficient, not_pending, not_found])
+    assert results == {
+        approved: ("approved", 50),
+        insufficient: ("insufficient_points", 50),
+        not_pending: ("not_pending", None),
+        not_found: ("not_found", None),
+    }
+    assert (balance(cursor, rich), balance(cursor, poor)) == (30, 49)
+    assert statuses(cursor, "schemes_redemption", "id", "scheme_status", [approved, insufficient]) == \
+        ["approved", "pending"]
+    cursor.execute("SELECT points FROM points_ledger WHERE source = %s", (f"scheme_redemption:{approved}",))
+    assert cursor.fetchall() == [(-50,)]
+
+
+def test_redemption_that_does_not_fit_leaves_the_balance_to_later_ones(database):
+    cursor = database.cursor()
+    # The query takes several redemptions per user, which the unique key does not allow yet
+    cursor.execute("ALTER TABLE schemes_redemption DROP CONSTRAINT schemes_redemption_user_id_key")
+    user_id = add_user(cursor, 100)
+    cheap, expensive = add_scheme(cursor, days_from_today(30), points=30), add_scheme(cursor, days_from_today(30), points=90)
+    first = add_redemption(cursor, cheap, user_id=user_id)
+    too_much = add_redemption(cursor, expensive, user_id=user_id)
+    second = add_redemption(cursor, cheap, user_id=user_id)
+
+    results = approve(cursor, [first, too_much, second])
+    assert [results[id_][0] for id_ in (first, too_much, second)] == ["approved", "insufficient_points", "approved"]
+    assert balance(cursor, user_id) == 40
@@ -1,21 +1,43 @@
 # import sys
 # import os
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-from api.database import execute_query
-from api.admin_api.queries import insert_scheme_query, delete_scheme_query, update_scheme_query, get_scheme_query, get_scheme_redemption_details_query, reject_scheme_query, get_required_points_query, approve_scheme_query
+import logging
+import re
+from api.database import execute_query, execute_query_for_points
+from api.user_cache import user_cache
+from api.user_ids import resolve_user_id
+from api.admin_api.queries import insert_scheme_query, delete_scheme_query, update_scheme_query, get_scheme_query, get_scheme_redemption_details_query, reject_scheme_query_admin_api as reject_scheme_query, get_required_points_query, approve_scheme_query, approve_scheme_redemptions_query, expire_schemes_query
+from api.user_api.utils.users_util import invalidate_scheme_catalog
 from datetime import date, datetime
 from typing import Optional
 from psycopg2 import DatabaseError
 from api.points_api.queris import get_points_query
 
+logger = logging.getLogger(__name__)
+
+def parse_scheme_date(value: str, field: str) -> date:
+    """
+    Parses a scheme validity date. Schemes store them as DD-MM-YYYY strings, the format the
+    scheme_date() SQL function reads.
+
+    Raises:
+        ValueError: If value is not a DD-MM-YYYY date.
+    """
+    if not isinstance(value, str) or not re.fullmatch(r"\d{2}-\d{2}-\d{4}", value):
+        raise ValueError(f"{field} must be a DD-MM-YYYY date")
+    try:
+        return datetime.strptime(value, "%d-%m-%Y").date()
+    except ValueError:
+        raise ValueError(f"{field} must be a DD-MM-YYYY date")
+
 def add_scheme(scheme_title: str, valid_from: str, valid_to: str, perks: str, points: int) -> bool:
     """
     Adds a new scheme to the database with the specified details.
 
     Args:
         scheme_title (str): The title of the scheme.
-        valid_from (date): The start date of the scheme's validity.
-        valid_to (date): The end date of the scheme's validity.
+        valid_from (str): The start date of the scheme's validity, DD-MM-YYYY.
+        valid_to (str): The end date of the scheme's validity, DD-MM-YYYY.
         perks (str): Description of the perks associated with the scheme.
         points (int): The number of points required to complete the scheme.
 
@@ -30,7 +52,7 @@ def add_scheme(scheme_title: str, valid_from: str, valid_to: str, perks: str, po
         # Input validation
         if not scheme_title.strip():
             raise ValueError("Scheme title cannot be empty")
-        if valid_from > valid_to:
+        if parse_scheme_date(valid_from, "valid_from") > parse_scheme_date(valid_to, "valid_to"):
             raise ValueError("Valid from date must be before valid to date")
         if points < 0:
             raise ValueError("Points cannot be negative")
@@ -45,6 +67,7 @@ def add_scheme(scheme_title: str, valid_from: str, valid_to: str, perks: str, po
         }
 
         response = execute_query(query, params)
+        invalidate_scheme_catalog()
         return response > 0
 
     except ValueError as ve:
@@ -58,6 +81,7 @@ def remove_scheme(id_:int)->Optional[bool]:
         query = delete_scheme_query()
         params = {"id":id_}
         response = execute_query(query, params)
+        invalidate_scheme_catalog()
         
     except Exception as e:
         raise RuntimeError(f"error: {str(e)}")
@@ -80,7 +104,7 @@ def update_scheme(scheme_title: str, valid_from: Optional[str] = None, valid_to:
         bool: True if the scheme was successfully updated, False otherwise.
 
     Raises:
-        ValueError: If scheme_title is empty or None.
+        ValueError: If scheme_title is empty or None, or a date is not DD-MM-YYYY.
         TypeError: If any parameter is of an incorrect type.
         DatabaseError: If there is an issue executing the database query.
     """
@@ -91,10 +115,10 @@ def update_scheme(scheme_title: str, valid_from: Optional[str] = None, valid_to:
             
 
         # Type checking for optional parameters
-        if valid_from is not None and not isinstance(valid_from, str):
-            raise ValueError("valid_from must be a date object")
-        if valid_to is not None and not isinstance(valid_to, str):
-            raise ("valid_to must be a date object")
+        parsed_from = parse_scheme_date(valid_from, "valid_from") if valid_from is not None else None
+        parsed_to = parse_scheme_date(valid_to, "valid_to") if valid_to is not None else None
+        if parsed_from and parsed_to and parsed_from > parsed_to:
+            raise ValueError("Valid from date must be before valid to date")
             
         if perks is not None and not isinstance(perks, str):
             raise ValueError("perks must be a string")
@@ -112,10 +136,11 @@ def update_scheme(scheme_title: str, valid_from: Optional[str] = None, valid_to:
         }
 
         response = execute_query(query, params)
+        invalidate_scheme_catalog()
         return response > 0
 
     except ValueError as ve:
-        return f"Validation error: {str(ve)}"
+        raise ValueError(f"Validation error: {str(ve)}")
     except TypeError as te:
         return f"Type error: {str(te)}"
 
@@ -158,7 +183,7 @@ def get_scheme()->list[dict]:
                 schemes.append(schemes_details)
             except (AttributeError, ValueError) as e:
                 # Handle cases where row[2] or row[3] are not valid datetime objects or other issues
-                print(f"Error processing row {row}: {e}")
+                logger.warning(f"Error processing row {row}: {e}")
                 schemes_details = {
                     "id": row[0] if row[0] else 0,
                     "Title": row[1] if row[1] else "N/A",
@@ -202,8 +227,11 @@ def update_scheme_status(id_:int, email:int)->bool:
     try:
         if not isinstance(id_, int):
             raise TypeError(f"The scheme id should be of type int, but provided {type(id_).__name__}")
+        user_id = resolve_user_id(email)
+        if user_id is None:
+            return False
         query = approve_scheme_query()
-        params = {"id":id_, "email":email}
+        params = {"id":id_, "user_id":user_id}
         response = execute_query(query, params)
         
         return response > 0
@@ -246,8 +274,11 @@ def enough_points_for_scheme(scheme_id: int, email: str) -> tuple[bool, int]:
     try:
         if not isinstance(scheme_id, int):
             raise TypeError(f"The scheme id should be of type int, but provided {type(scheme_id).__name__}")
+        user_id = resolve_user_id(email)
+        if user_id is None:
+            return (False, 0)
         query_1 = get_points_query()
-        params_1 = {"email": email}
+        params_1 = {"user_id": user_id}
         response_1 = execute_query(query_1, params_1, fetch_results=True)
         
         if not response_1 or response_1 == []:
@@ -266,4 +297,79 @@ def enough_points_for_scheme(scheme_id: int, email: str) -> tuple[bool, int]:
     except DatabaseError as dber:
         raise DatabaseError(f"Database error: {str(dber)}")
     except Exception as e:
-        raise RuntimeError(str(e))
\ No newline at end of file
+        raise RuntimeError(str(e))
+
+def approve_scheme_redemptions(ids: Optional[list[int]] = None, scheme_id: Optional[int] = None) -> list[dict]:
+    """
+    Approves many pending scheme redemptions in a single transaction and debits the
+    required points of every approved one from the user's balance.
+
+    Args:
+        ids (list[int], optional): The redemption ids to approve.
+        scheme_id (int, optional): Approve every pending redemption of this scheme instead.
+
+    Returns:
+        list[dict]: One entry per redemption with its id, email, result ('approved',
+                    'not_found', 'not_pending', 'user_or_scheme_not_found' or
+                    'insufficient_points') and the points required.
+
+    Raises:
+        ValueError: If neither ids nor scheme_id is given, or an id is not an integer.
+        DatabaseError: If a database error occurs during query execution.
+        RuntimeError: For other unexpected errors.
+    """
+    try:
+        if not ids and scheme_id is None:
+            raise ValueError("Either ids or scheme_id is required")
+        if ids and not all(isinstance(id_, int) and not isinstance(id_, bool) for id_ in ids):
+            raise ValueError("Every redemption id must be an integer")
+        if scheme_id is not None and (not isinstance(scheme_id, int) or isinstance(scheme_id, bool)):
+            raise ValueError("scheme_id must be an integer")
+        
+        query = approve_scheme_redemptions_query()
+        params = {"ids": ids or None, "scheme_id": scheme_id}
+        response = execute_query_for_points(query, params, fetch_results=True)
+        
+        results = [{
+            "id": row[0],
+            "email": row[1] if row[1] else "NA",
+            "result": row[2],
+            "points": row[3] if row[3] is not None else 0
+        } for row in response or []]
+        
+        for result in results:
+            if result["result"] == "approved":
+                user_cache.invalidate(result["email"])
+        return results
+    except ValueError as ve:
+        raise ValueError(str(ve))
+    except DatabaseError as dber:
+        raise DatabaseError(f"Database error {str(dber)}")
+    except Exception as e:
+        raise RuntimeError(str(e))
+
+def expire_schemes() -> dict:
+    """
+    Expires schemes whose valid-to date has passed and rejects their pending redemptions,
+    then drops the cached scheme catalog so users stop seeing them.
+
+    Returns:
+        dict: The number of schemes expired and of redemptions rejected.
+
+    Raises:
+        DatabaseError: If a database error occurs during query execution.
+        RuntimeError: For other unexpected errors.
+    """
+    try:
+        query = expire_schemes_query()
+        response = execute_query_for_points(query, fetch_results=True)
+        invalidate_scheme_catalog()
+        
+        return {
+            "expired_schemes": response[0][0] if response else 0,
+            "rejected_redemptions": response[0][1] if response else 0
+        }
+    except DatabaseError as dber:
+        raise DatabaseError(f"Database error {str(dber)}")
+    except Exception as e:
+        raise RuntimeError(str(e))
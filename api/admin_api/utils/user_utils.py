@@ -1,11 +1,16 @@
 # import sys
 # import os
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+import logging
 from api.database import execute_query
+from api.user_cache import user_cache
+from api.user_ids import resolve_user_id, forget_user_id
 from api.admin_api.queries import*
 from typing import List, Dict, Optional, Any
 from psycopg2 import DatabaseError
 
+logger = logging.getLogger(__name__)
+
 def get_user_from_pending_signups() -> Optional[List[Dict[str, Any]] | None]:
     """
     Fetch all users from the pending signups table and return their details.
@@ -147,6 +152,8 @@ def insert_user_to_users(email: str) -> bool:
 
         # Delete from pending_signups
         delete_response = execute_query(delete_approved_user(), {"email": email})
+        user_cache.invalidate(email, listed=True)
+        forget_user_id(email)
 
         # Both operations should be successful
         return insert_response > 0 and delete_response > 0
@@ -190,17 +197,18 @@ def delete_user(email: str) -> bool:
 
         # Execute query and get response
         response = execute_query(query, params)
+        user_cache.invalidate(email, listed=True)
+        forget_user_id(email)
 
         # Return True if at least one row was affected
         return response > 0
 
     except ValueError as ve:
-        # Log the error (in a real application, use proper logging)
-        print(f"Validation error: {str(ve)}")
+        logger.warning(f"Validation error: {str(ve)}")
         return False
     except Exception as e:
         # Handle any other unexpected errors
-        print(f"An unexpected error occurred: {str(e)}")
+        logger.exception(f"An unexpected error occurred: {str(e)}")
         return False
 
 def insert_user_to_user_point(email: str) -> bool:
@@ -225,10 +233,15 @@ def insert_user_to_user_point(email: str) -> bool:
         if not email:
             raise ValueError("Email cannot be empty")
 
+        user_id = resolve_user_id(email)
+        if user_id is None:
+            return False
+
         # Prepare and execute query
         query = insert_user_to_user_points_query()
-        params = {"email": email}
+        params = {"user_id": user_id}
         response = execute_query(query, params)
+        user_cache.invalidate(email, listed=True)
 
         # Check if insertion was successful
         return response > 0
@@ -258,9 +271,13 @@ def update_user_details_(email: str, points: int, name: str) -> bool:
         RuntimeError: If any other unexpected error occurs.
     """
     try:
+        user_id = resolve_user_id(email)
+        if user_id is None:
+            return False
         query = update_user_details_query()
-        params = {"email": email, "points": points, "name": name}
+        params = {"user_id": user_id, "points": points, "name": name}
         response = execute_query(query, params)
+        user_cache.invalidate(email, listed=True)
         
         return response > 0
     except DatabaseError as dber:
@@ -1,68 +1,159 @@
-from flask import Flask
+from flask import Flask, jsonify
+import importlib
 import logging
+import threading
+import time
 from flask_cors import CORS
-from config import SECRET_KEY
+from api.log_pipeline import configure_logging, init_request_logging
+from api.tracing import init_tracing
+from api.profiler import init_profiling
+from api.circuit_breaker import init_circuit_breakers
+from api.config import SECRET_KEY, SCHEME_SWEEP_INTERVAL_SECONDS, LEADERBOARD_REFRESH_INTERVAL_SECONDS, JOB_RUNNER_ENABLED, JOB_MAINTENANCE_INTERVAL_SECONDS, JOB_MAINTENANCE_PRIORITY
+
+# URL prefix -> (blueprint in api.blueprints, module that adds its routes)
+BLUEPRINTS = {
+    '/auth': ('auth', 'api.login_api.routes'),
+    '/admin': ('admin', 'api.admin_api.routes'),
+    '/points': ('points', 'api.points_api.routes'),
+    '/user': ('user', 'api.user_api.routes'),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def start_background_work():
+    """Starts the code filter build, the scheduler and the job runner. Called once per process."""
+    # Build the points code filter in the background so the first scans do not wait for it
+    from api.points_api.utils.code_filter import code_filter
+    if code_filter is not None:
+        code_filter.start_build()
+
+    # Long running servers run their own background work; Vercel uses the crons in vercel.json
+    from api.scheduler import scheduler
+    if SCHEME_SWEEP_INTERVAL_SECONDS > 0:
+        from api.admin_api.utils.scheme_utils import expire_schemes
+        scheduler.every(SCHEME_SWEEP_INTERVAL_SECONDS, expire_schemes, "expire_schemes")
+    if LEADERBOARD_REFRESH_INTERVAL_SECONDS > 0:
+        from api.user_api.utils.users_util import refresh_leaderboards
+        scheduler.every(LEADERBOARD_REFRESH_INTERVAL_SECONDS, refresh_leaderboards, "refresh_leaderboards")
+
+    if JOB_RUNNER_ENABLED:
+        from api.job_runner import job_runner
+        job_runner.start()
+        if JOB_MAINTENANCE_INTERVAL_SECONDS > 0:
+            def enqueue_maintenance():
+                job_runner.enqueue("purge_expired_otps", priority=JOB_MAINTENANCE_PRIORITY)
+                job_runner.enqueue("purge_finished_jobs", priority=JOB_MAINTENANCE_PRIORITY)
+            scheduler.every(JOB_MAINTENANCE_INTERVAL_SECONDS, enqueue_maintenance, "job_maintenance")
+
+    scheduler.start()
+
+
+def create_error_response(status_code, error, message):
+    """Helper function to create a consistent error response."""
+    response = {
+        "status": status_code,
+        "error": error,
+        "message": message
+    }
+    return jsonify(response), status_code
+
+
+def create_app(prefixes=tuple(BLUEPRINTS)):
+    """
+    Builds a Flask app serving the blueprints mounted at prefixes, with the home route and
+    the JSON error handlers. Only the route modules of those blueprints are imported.
+    """
+    configure_logging()
 
-def create_app():
     app = Flask(__name__)
 
     app.config['SECRET_KEY'] = SECRET_KEY
-    
+
     CORS(app)
 
-    # Configure logging
-    logging.basicConfig(
-        level=logging.ERROR,
-        format='%(asctime)s %(levelname)s: %(message)s',
-        handlers=[
-            logging.FileHandler('app_errors.log'), 
-            logging.StreamHandler()  
-        ]
-    )
+    init_request_logging(app)
+    init_circuit_breakers(app)
+    init_tracing(app)
+    init_profiling(app)
 
     # Register blueprints
     try:
-        from blueprints import auth as auth_blueprint, admin as admin_blueprint, points as point_blueprint, user as user_blueprint
-        app.register_blueprint(auth_blueprint, url_prefix='/auth')
-        app.register_blueprint(admin_blueprint, url_prefix='/admin')
-        app.register_blueprint(point_blueprint, url_prefix='/points')
-        app.register_blueprint(user_blueprint, url_prefix='/user')
+        import api.blueprints as blueprints
+        for prefix in prefixes:
+            name, routes_module = BLUEPRINTS[prefix]
+            importlib.import_module(routes_module)
+            app.register_blueprint(getattr(blueprints, name), url_prefix=prefix)
     except ImportError as e:
         app.logger.error(f'Failed to import blueprints: {str(e)}')
         raise
 
+    @app.route('/')
+    def home():
+        return jsonify({"message":"API is working"})
+
+    @app.errorhandler(404)
+    def not_found(error):
+        return create_error_response(404, "Not Found", "The requested resource was not found on the server.")
+
+    @app.errorhandler(500)
+    def internal_server_error(error):
+        return create_error_response(500, "Internal Server Error", "Something went wrong on our end. Please try again later.")
+
+    @app.errorhandler(405)
+    def method_not_allowed_error(error):
+        return create_error_response(405, "Method not allowed", "Invalid request. Please check the request type")
+
     return app
 
 
+class LazyApp:
+    """
+    WSGI entry point that builds the app for a URL prefix on the first request under it.
 
-from login_api.routes import*
-from points_api.routes import*
-from admin_api.routes import*
-from user_api.routes import*
+    A cold start only pays for importing Flask and this module; a request to /points
+    imports the points routes and their dependencies, and never the admin, auth or user
+    ones unless those are called too. The first request also starts a thread that opens
+    the database pool and the background work while the request is being handled.
+    """
 
-app = create_app()
- 
-@app.route('/')
-def home():
-    return jsonify({"message":"API is working"})
+    def __init__(self):
+        self._apps = {}
+        self._lock = threading.Lock()
+        self._warm_started = False
+        self.load_times = {}
 
-def create_error_response(status_code, error, message):
-    """Helper function to create a consistent error response."""
-    response = {
-        "status": status_code,
-        "error": error,
-        "message": message
-    }
-    return jsonify(response), status_code
+    def app_for(self, path: str) -> Flask:
+        """Returns the app serving path, building it on first use."""
+        prefix = '/' + path.lstrip('/').split('/', 1)[0]
+        if prefix not in BLUEPRINTS:
+            prefix = '/'
+        app = self._apps.get(prefix)
+        if app is None:
+            with self._lock:
+                app = self._apps.get(prefix)
+                if app is None:
+                    started = time.perf_counter()
+                    app = create_app(() if prefix == '/' else (prefix,))
+                    self.load_times[prefix] = round((time.perf_counter() - started) * 1000, 2)
+                    self._apps[prefix] = app
+        return app
+
+    def _warm(self):
+        from api.database import warm_pool
+        warm_pool()
+        try:
+            start_background_work()
+        except Exception as e:
+            logger.exception(f"Error starting background work: {str(e)}")
 
-@app.errorhandler(404)
-def not_found(error):
-    return create_error_response(404, "Not Found", "The requested resource was not found on the server.")
+    def __call__(self, environ, start_response):
+        if not self._warm_started:
+            with self._lock:
+                if not self._warm_started:
+                    self._warm_started = True
+                    threading.Thread(target=self._warm, name="warm-up", daemon=True).start()
+        return self.app_for(environ.get('PATH_INFO', ''))(environ, start_response)
 
-@app.errorhandler(500)
-def internal_server_error(error):
-    return create_error_response(500, "Internal Server Error", "Something went wrong on our end. Please try again later.")
 
-@app.errorhandler(405)
-def method_not_allowed_error(error):
-    return create_error_response(405, "Method not allowed", "Invalid request. Please check the request type")
\ No newline at end of file
+app = LazyApp()
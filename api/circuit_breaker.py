@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+from flask import Flask, g, has_request_context, jsonify
+from api.config import (CIRCUIT_BREAKER_ENABLED, CIRCUIT_BREAKER_WINDOW_SECONDS, CIRCUIT_BREAKER_MIN_FAILURES,
+                    CIRCUIT_BREAKER_FAILURE_RATIO, CIRCUIT_BREAKER_OPEN_SECONDS, CIRCUIT_BREAKER_HALF_OPEN_PROBES)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def _mark_request(name: str, retry_after: float) -> None:
+    # Lets the request's 5xx response be turned into a 503, whatever the utils made of the error
+    if has_request_context():
+        g.unavailable_dependency = (name, retry_after)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a dependency that keeps failing. While closed, calls are counted in one
+    second buckets over window_seconds; once at least min_failures of them failed, making
+    up failure_ratio of the calls, the circuit opens and calls raise CircuitOpenError
+    right away instead of waiting on timeouts. After open_seconds it goes half open and
+    lets half_open_probes calls through: a success closes it, a failure opens it again.
+    """
+
+    def __init__(self, name: str, enabled: bool, window_seconds: int, min_failures: int, failure_ratio: float,
+                 open_seconds: float, half_open_probes: int):
+        self.name = name
+        self.enabled = enabled
+        self.window_seconds = window_seconds
+        self.min_failures = min_failures
+        self.failure_ratio = failure_ratio
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._lock = threading.Lock()
+        # [second, calls, failures], oldest first
+        self._buckets = deque()
+        self._opened_at = 0.0
+        self._probes = 0
+        self.metrics = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0, "last_failure": None}
+
+    def _set_state(self, state: str) -> None:
+        # Called with the lock held
+        if state == self.state:
+            return
+        logger.warning(f"Circuit {self.name} {self.state} -> {state}", extra={"event": "circuit_state", "circuit": self.name, "state": state})
+        self.state = state
+        self._probes = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.metrics["opened"] += 1
+        elif state == CLOSED:
+            self._buckets.clear()
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> None:
+        """
+        Raises:
+            CircuitOpenError: If the circuit is open, or half open with its probes in flight.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.state == OPEN and self.retry_after() <= 0:
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return
+            if self.state == CLOSED:
+                return
+            self.metrics["rejected"] += 1
+            retry_after = max(1.0, self.retry_after())
+        _mark_request(self.name, retry_after)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record(self, failed: bool, error: Optional[BaseException] = None) -> None:
+        if not self.enabled:
+            return
+        now = int(time.monotonic())
+        with self._lock:
+            self.metrics["calls"] += 1
+            if failed:
+                self.metrics["failures"] += 1
+                self.metrics["last_failure"] = " ".join(str(error).split())[:200] if error is not None else None
+            if self.state == HALF_OPEN:
+                self._set_state(OPEN if failed else CLOSED)
+            elif self.state == CLOSED:
+                if self._buckets and self._buckets[-1][0] == now:
+                    bucket = self._buckets[-1]
+                else:
+                    bucket = [now, 0, 0]
+                    self._buckets.append(bucket)
+                bucket[1] += 1
+                bucket[2] += failed
+                while self._buckets and self._buckets[0][0] <= now - self.window_seconds:
+                    self._buckets.popleft()
+                calls = sum(bucket[1] for bucket in self._buckets)
+                failures = sum(bucket[2] for bucket in self._buckets)
+                if failures >= self.min_failures and failures >= self.failure_ratio * calls:
+                    self._set_state(OPEN)
+            retry_after = max(1.0, self.retry_after()) if self.state == OPEN else 1.0
+        if failed:
+            _mark_request(self.name, retry_after)
+
+    @contextmanager
+    def call(self, is_failure: Callable[[BaseException], bool] = lambda error: True):
+        """
+        Runs the block as a call to the dependency, recording whether it failed. Errors for
+        which is_failure() is False (bad input rather than an outage) count as successes.
+        """
+        self.allow()
+        try:
+            yield
+        except BaseException as e:
+            self.record(is_failure(e), e)
+            raise
+        self.record(False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            if self.state == OPEN and self.retry_after() <= 0:
+                self._set_state(HALF_OPEN)
+            return {
+                "state": self.state,
+                "retry_after_seconds": round(self.retry_after(), 1) if self.state == OPEN else 0,
+                "window_calls": sum(bucket[1] for bucket in self._buckets),
+                "window_failures": sum(bucket[2] for bucket in self._buckets),
+                **self.metrics,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name: str) -> CircuitBreaker:
+    """The circuit breaker of a dependency, created with the CIRCUIT_BREAKER_* settings on first use."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, CIRCUIT_BREAKER_ENABLED, CIRCUIT_BREAKER_WINDOW_SECONDS,
+                                             CIRCUIT_BREAKER_MIN_FAILURES, CIRCUIT_BREAKER_FAILURE_RATIO,
+                                             CIRCUIT_BREAKER_OPEN_SECONDS, CIRCUIT_BREAKER_HALF_OPEN_PROBES)
+        return _breakers[name]
+
+
+def breaker_stats() -> dict:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {circuit.name: circuit.stats() for circuit in breakers}
+
+
+def init_circuit_breakers(app: Flask) -> None:
+    """
+    Answers requests that failed on an unavailable dependency with 503 and Retry-After
+    instead of 500, so clients and load balancers back off. The routes still catch the
+    errors; only their 5xx responses are replaced.
+    """
+
+    def unavailable(name: str, retry_after: float):
+        response = jsonify({"message": f"Service temporarily unavailable ({name}), please try again later"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(max(1, round(retry_after)))
+        return response
+
+    @app.errorhandler(CircuitOpenError)
+    def circuit_open(error):
+        return unavailable(error.name, error.retry_after)
+
+    @app.after_request
+    def replace_dependency_errors(response):
+        dependency = g.pop("unavailable_dependency", None)
+        if dependency is None or response.status_code < 500:
+            return response
+        return unavailable(*dependency)
@@ -10,6 +10,16 @@ DB_NAME = os.getenv("DB_NAME")
 DB_PORT = os.getenv("DB_PORT")
 
 DB_URI = f'postgres://{DB_ADMIN}:{DB_PASSWORD}.c.{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require'
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 10))
+DB_POOL_PING_AFTER_SECONDS = int(os.getenv("DB_POOL_PING_AFTER_SECONDS", 30))
+DB_REPLICA_URIS = [uri.strip() for uri in os.getenv("DB_REPLICA_URIS", "").split(",") if uri.strip()]
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", 5))
+DB_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", 5))
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", 15))
+DB_READ_YOUR_WRITES_MAX_SESSIONS = int(os.getenv("DB_READ_YOUR_WRITES_MAX_SESSIONS", 100000))
+DB_CONNECT_TIMEOUT_SECONDS = int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", 5))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 15000))
 
 JWT_EXPIRY_MINUTES = int(os.getenv("JWT_EXPIRY_MINUTES"))
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
@@ -17,8 +27,107 @@ JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
 
 PASSWORD = os.getenv("MAIL_PASSWORD")
 MAIL =  os.getenv("MAIL")
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", 10))
 
 ADMIN_KEY = os.getenv("ADMIN_KEY")
+CRON_SECRET = os.getenv("CRON_SECRET")
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 
+ASYNC_SCAN_BATCH_THRESHOLD = int(os.getenv("ASYNC_SCAN_BATCH_THRESHOLD", 200))
+SCAN_BATCH_JOB_PRIORITY = int(os.getenv("SCAN_BATCH_JOB_PRIORITY", 50))
+SCAN_BATCH_STALE_MINUTES = int(os.getenv("SCAN_BATCH_STALE_MINUTES", 10))
+CARTON_SCAN_CHUNK_SIZE = int(os.getenv("CARTON_SCAN_CHUNK_SIZE", 200))
+CARTON_SCAN_MAX_CODES = int(os.getenv("CARTON_SCAN_MAX_CODES", 10000))
+
+# Reject scanned codes whose check digit does not match; turn on once every live code was minted with one
+POINTS_CODE_CHECK_DIGIT = os.getenv("POINTS_CODE_CHECK_DIGIT", "false").lower() == "true"
+MINT_MAX_CODES = int(os.getenv("MINT_MAX_CODES", 10000))
+
+CODE_FILTER_ENABLED = os.getenv("CODE_FILTER_ENABLED", "true").lower() == "true"
+CODE_FILTER_ERROR_RATE = float(os.getenv("CODE_FILTER_ERROR_RATE", 0.01))
+CODE_FILTER_MIN_CAPACITY = int(os.getenv("CODE_FILTER_MIN_CAPACITY", 100000))
+CODE_FILTER_REFRESH_SECONDS = int(os.getenv("CODE_FILTER_REFRESH_SECONDS", 3600))
+CODE_FILTER_GENERATION_TTL_SECONDS = float(os.getenv("CODE_FILTER_GENERATION_TTL_SECONDS", 2))
+
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 5000))
+ARCHIVE_MAX_BATCHES = int(os.getenv("ARCHIVE_MAX_BATCHES", 100))
+ARCHIVE_PARTITION_AHEAD_DAYS = int(os.getenv("ARCHIVE_PARTITION_AHEAD_DAYS", 90))
+
+SCAN_MONITOR_ENABLED = os.getenv("SCAN_MONITOR_ENABLED", "true").lower() == "true"
+SCAN_MONITOR_WINDOW_SECONDS = int(os.getenv("SCAN_MONITOR_WINDOW_SECONDS", 60))
+SCAN_MONITOR_MAX_SCANS = int(os.getenv("SCAN_MONITOR_MAX_SCANS", 600))
+SCAN_MONITOR_MIN_SCANS = int(os.getenv("SCAN_MONITOR_MIN_SCANS", 20))
+SCAN_MONITOR_MAX_NOT_IN_SYSTEM_RATIO = float(os.getenv("SCAN_MONITOR_MAX_NOT_IN_SYSTEM_RATIO", 0.5))
+SCAN_MONITOR_MAX_ALREADY_SCANNED_RATIO = float(os.getenv("SCAN_MONITOR_MAX_ALREADY_SCANNED_RATIO", 0.5))
+SCAN_MONITOR_THROTTLE_SECONDS = int(os.getenv("SCAN_MONITOR_THROTTLE_SECONDS", 900))
+SCAN_MONITOR_MAX_USERS = int(os.getenv("SCAN_MONITOR_MAX_USERS", 100000))
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+RATE_LIMIT_AUTH = os.getenv("RATE_LIMIT_AUTH", "60/minute")
+RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "10/minute")
+RATE_LIMIT_OTP = os.getenv("RATE_LIMIT_OTP", "5/hour")
+RATE_LIMIT_OTP_IP = os.getenv("RATE_LIMIT_OTP_IP", "20/hour")
+RATE_LIMIT_OTP_VERIFY = os.getenv("RATE_LIMIT_OTP_VERIFY", "10/hour")
+RATE_LIMIT_SCAN = os.getenv("RATE_LIMIT_SCAN", "60/minute")
+RATE_LIMIT_SCAN_IP = os.getenv("RATE_LIMIT_SCAN_IP", "120/minute")
+
+USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "true").lower() == "true"
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", 30))
+USER_CACHE_MAXSIZE = int(os.getenv("USER_CACHE_MAXSIZE", 10000))
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", 1024 * 1024))
+
+SCHEME_APPROVAL_MAX_IDS = int(os.getenv("SCHEME_APPROVAL_MAX_IDS", 10000))
+
+SCHEME_CATALOG_TTL_SECONDS = int(os.getenv("SCHEME_CATALOG_TTL_SECONDS", 300))
+# Vercel sweeps through the cron in vercel.json, other servers daily on the scheduler
+SCHEME_SWEEP_INTERVAL_SECONDS = int(os.getenv("SCHEME_SWEEP_INTERVAL_SECONDS", 0 if os.getenv("VERCEL") else 86400))
+# Vercel refreshes through the cron in vercel.json, other servers on the scheduler
+LEADERBOARD_REFRESH_INTERVAL_SECONDS = int(os.getenv("LEADERBOARD_REFRESH_INTERVAL_SECONDS", 0 if os.getenv("VERCEL") else 3600))
+
+USERS_PAGE_MAX_LIMIT = int(os.getenv("USERS_PAGE_MAX_LIMIT", 1000))
+USERS_PAGE_FETCH_SIZE = int(os.getenv("USERS_PAGE_FETCH_SIZE", 200))
+
+# Vercel freezes background threads between requests, jobs run in the request there instead
+JOB_RUNNER_ENABLED = os.getenv("JOB_RUNNER_ENABLED", "false" if os.getenv("VERCEL") else "true").lower() == "true"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 5))
+JOB_DEFAULT_PRIORITY = int(os.getenv("JOB_DEFAULT_PRIORITY", 100))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_RETRY_BASE_SECONDS = int(os.getenv("JOB_RETRY_BASE_SECONDS", 30))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", 600))
+JOB_RETENTION_HOURS = int(os.getenv("JOB_RETENTION_HOURS", 72))
+JOB_MAINTENANCE_PRIORITY = int(os.getenv("JOB_MAINTENANCE_PRIORITY", 200))
+JOB_MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("JOB_MAINTENANCE_INTERVAL_SECONDS", 3600))
+OTP_JOB_PRIORITY = int(os.getenv("OTP_JOB_PRIORITY", 10))
+
+MIGRATION_CHECK_LARGE_TABLE_ROWS = int(os.getenv("MIGRATION_CHECK_LARGE_TABLE_ROWS", 10000))
+
+LOG_FILE = os.getenv("LOG_FILE", "app_errors.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_SLOW_REQUEST_MS = int(os.getenv("LOG_SLOW_REQUEST_MS", 1000))
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.01))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 200))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", 500))
+TRACE_OTLP_FILE = os.getenv("TRACE_OTLP_FILE", "")
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+PROFILER_MAX_SECONDS = int(os.getenv("PROFILER_MAX_SECONDS", 60))
+PROFILER_REQUEST_STATS_LIMIT = int(os.getenv("PROFILER_REQUEST_STATS_LIMIT", 50))
+STARTUP_IMPORT_BUDGET_MS = int(os.getenv("STARTUP_IMPORT_BUDGET_MS", 250))
+
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+CIRCUIT_BREAKER_WINDOW_SECONDS = int(os.getenv("CIRCUIT_BREAKER_WINDOW_SECONDS", 30))
+CIRCUIT_BREAKER_MIN_FAILURES = int(os.getenv("CIRCUIT_BREAKER_MIN_FAILURES", 5))
+CIRCUIT_BREAKER_FAILURE_RATIO = float(os.getenv("CIRCUIT_BREAKER_FAILURE_RATIO", 0.5))
+CIRCUIT_BREAKER_OPEN_SECONDS = float(os.getenv("CIRCUIT_BREAKER_OPEN_SECONDS", 30))
+CIRCUIT_BREAKER_HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_BREAKER_HALF_OPEN_PROBES", 1))
@@ -1,30 +1,407 @@
-from config import DB_URI
+import contextvars
+import logging
+from contextlib import contextmanager
+from functools import wraps
+from api.config import DB_URI, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_PING_AFTER_SECONDS, DB_CONNECT_TIMEOUT_SECONDS, DB_STATEMENT_TIMEOUT_MS, DB_REPLICA_URIS, DB_REPLICA_MAX_LAG_SECONDS, DB_REPLICA_CHECK_SECONDS, DB_READ_YOUR_WRITES_SECONDS, DB_READ_YOUR_WRITES_MAX_SESSIONS
+import threading
+import time
+from typing import Optional
 import psycopg2
-from psycopg2 import Error
+from cachetools import TTLCache
+from flask import has_request_context, request
+from psycopg2 import Error, OperationalError, InterfaceError
+from psycopg2.extensions import TransactionRollbackError
+from psycopg2.extras import execute_batch
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+from api.circuit_breaker import breaker
+from api.replica_queries import replica_lag_query
+from api.tracing import tracer, traced_query, CLIENT
 
+logger = logging.getLogger(__name__)
 
+# Connecting to an unreachable server and runaway queries fail after these instead of
+# holding a worker thread until the client gives up
+CONNECT_ARGS = {"connect_timeout": DB_CONNECT_TIMEOUT_SECONDS}
+if DB_STATEMENT_TIMEOUT_MS > 0:
+    CONNECT_ARGS["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
 
+_db_breaker = breaker("postgres")
+
+# Connections are kept open between queries instead of paying a TCP and TLS handshake
+# per query. The pool is created on first use; DB_POOL_MAX=0 connects per query.
+_pool = None
+_pool_lock = threading.Lock()
+# id of each idle pooled connection -> when it was put back
+_idle_since = {}
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, DB_URI, **CONNECT_ARGS)
+    return _pool
+
+
+def _is_alive(connection) -> bool:
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+        connection.rollback()
+        return True
+    except Error:
+        return False
+
+
+def _checkout():
+    pool = _get_pool()
+    try:
+        connection = pool.getconn()
+    except PoolError:
+        # Every pooled connection is in use, this caller gets one of its own
+        return psycopg2.connect(DB_URI, **CONNECT_ARGS)
+
+    # The server may have dropped a connection that sat idle, check it before handing it out
+    idle_since = _idle_since.pop(id(connection), None)
+    if connection.closed or (idle_since is not None and time.monotonic() - idle_since > DB_POOL_PING_AFTER_SECONDS
+                             and not _is_alive(connection)):
+        pool.putconn(connection, close=True)
+        connection = pool.getconn()
+    return connection
+
+
+@tracer.wrap("db.connect", CLIENT)
 def get_connection():
     try:
         if 'DB_URI' not in globals():
             raise NameError("DB_URI is not defined as a global variable")
 
-        connection = psycopg2.connect(DB_URI)
-        # connection.timeout = 30
+        if DB_POOL_MAX > 0:
+            connection = _checkout()
+        else:
+            connection = psycopg2.connect(DB_URI, **CONNECT_ARGS)
         
         if connection.closed:
             raise Exception("Failed to establish database connection")
             
         return connection
     
-    except Error as e:
-        print(f"Error connecting to PostgreSQL: {e}")
+    except (Error, PoolError) as e:
+        logger.error(f"Error connecting to PostgreSQL: {e}")
         raise Exception(f"Database connection failed: {str(e)}")
     except NameError as e:
-        print(f"Configuration error: {e}")
+        logger.error(f"Configuration error: {e}")
         raise
 
+def release_connection(connection):
+    """
+    Hands a connection from get_connection() back. Pooled connections return to the pool,
+    with any open transaction rolled back; others are closed.
+    """
+    pool = _pool
+    if pool is not None:
+        try:
+            pool.putconn(connection, close=bool(connection.closed))
+            if not connection.closed:
+                _idle_since[id(connection)] = time.monotonic()
+            return
+        except PoolError:
+            # Not a pooled connection
+            pass
+    connection.close()
+
+def warm_pool():
+    """
+    Opens the pool and checks one connection, so the first query does not wait for the
+    connection handshake. Errors are printed; the query that needs the connection will
+    report them.
+    """
+    if DB_POOL_MAX <= 0:
+        return
+    try:
+        connection = get_connection()
+        try:
+            _is_alive(connection)
+        finally:
+            release_connection(connection)
+    except Exception as e:
+        logger.exception(f"Error warming the connection pool: {str(e)}")
+
+class ReadOnlyQuery(str):
+    """SQL that only reads. execute_query() may fetch it from a read replica."""
+
+
+def read_only(query_function):
+    """Marks a query function whose SQL only reads, so fetching its rows may use a replica."""
+    @wraps(query_function)
+    def wrapper() -> ReadOnlyQuery:
+        return ReadOnlyQuery(query_function())
+    return wrapper
+
+
+# Outside a request: until when this job or thread reads from the primary after its writes
+_primary_until = contextvars.ContextVar("primary_until", default=0.0)
+_force_primary = contextvars.ContextVar("force_primary", default=False)
+
+
+def _session_key() -> Optional[str]:
+    """Who the current request acts for: the token's or the request's email, else the client address."""
+    email = getattr(request, "user", None) or (request.view_args or {}).get("email") or request.args.get("email")
+    if not email:
+        data = request.get_json(silent=True)
+        email = data.get("email") if isinstance(data, dict) else None
+    if isinstance(email, str) and email.strip():
+        return email.strip().lower()
+    address = request.access_route[0] if request.access_route else request.remote_addr
+    return f"ip:{address}" if address else None
+
+
+class Replica:
+    """A read replica in DB_REPLICA_URIS, its pool and what its last lag check found."""
+
+    def __init__(self, dsn: str, index: int):
+        self.dsn = dsn
+        try:
+            params = psycopg2.extensions.parse_dsn(dsn)
+            # Host, port and database only, the DSN holds the password
+            self.name = f"{params.get('host', 'localhost')}:{params.get('port', 5432)}/{params.get('dbname', '')}"
+        except Error:
+            self.name = f"replica {index}"
+        self.pool = None
+        self.usable = False
+        self.lag = None
+        self.error = None
+        self.checked_at = None
+        self.reads = 0
+        self.pool_lock = threading.Lock()
+        self.check_lock = threading.Lock()
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of queries marked read_only to the replicas, round robin. A replica's
+    lag is checked at most every check_seconds; one further behind than max_lag_seconds,
+    or that failed, is skipped until its next check, and with no usable replica reads go
+    to the primary. After a client's own write its reads stay on the primary for
+    sticky_seconds, so it reads what it wrote (keep it above max_lag_seconds).
+    """
+
+    def __init__(self, dsns: list, max_lag_seconds: float, check_seconds: float, sticky_seconds: float, max_sessions: int):
+        self.replicas = [Replica(dsn, index) for index, dsn in enumerate(dsns)]
+        self.max_lag_seconds = max_lag_seconds
+        self.check_seconds = check_seconds
+        self.sticky_seconds = sticky_seconds
+        self._sessions = TTLCache(maxsize=max_sessions, ttl=sticky_seconds) if sticky_seconds > 0 else None
+        self._next = 0
+        self._lock = threading.Lock()
+        # Reads of read only queries by where they went
+        self.primary_reads = {"sticky": 0, "no_replica": 0, "replica_failed": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def note_write(self) -> None:
+        """Keeps the current client's reads on the primary for sticky_seconds."""
+        if not self.enabled or self._sessions is None:
+            return
+        key = _session_key() if has_request_context() else None
+        if key is None:
+            _primary_until.set(time.monotonic() + self.sticky_seconds)
+            return
+        with self._lock:
+            self._sessions[key] = True
+
+    def _is_sticky(self) -> bool:
+        if _force_primary.get() or _primary_until.get() > time.monotonic():
+            return True
+        if self._sessions is None or not has_request_context():
+            return False
+        key = _session_key()
+        with self._lock:
+            return key is not None and key in self._sessions
+
+    def route(self) -> Optional[Replica]:
+        """The replica the next read only query should use, or None for the primary."""
+        if self._is_sticky():
+            self._count_primary("sticky")
+            return None
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            self._check(replica)
+            if replica.usable:
+                with self._lock:
+                    replica.reads += 1
+                return replica
+        self._count_primary("no_replica")
+        return None
+
+    def fetch(self, replica: Replica, query, params=None) -> list:
+        connection = self._connect(replica)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(query, params or None)
+                results = cursor.fetchall()
+            connection.rollback()
+            return results
+        finally:
+            self._release(replica, connection)
+
+    def mark_failed(self, replica: Replica, error: Error) -> None:
+        """Takes a replica that failed a read out of rotation until its next check."""
+        self._count_primary("replica_failed")
+        self._set_state(replica, None, " ".join(str(error).split()))
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {
+            "replicas": [{
+                "name": replica.name,
+                "usable": replica.usable,
+                "lag_seconds": replica.lag,
+                "error": replica.error,
+                "checked_seconds_ago": None if replica.checked_at is None else round(now - replica.checked_at, 1),
+                "reads": replica.reads,
+            } for replica in self.replicas],
+            "primary_reads": dict(self.primary_reads),
+            "sticky_sessions": len(self._sessions) if self._sessions is not None else 0,
+        }
+
+    def _count_primary(self, reason: str) -> None:
+        with self._lock:
+            self.primary_reads[reason] += 1
+
+    def _check(self, replica: Replica) -> None:
+        if replica.checked_at is not None and time.monotonic() - replica.checked_at < self.check_seconds:
+            return
+        if not replica.check_lock.acquire(blocking=False):
+            # Another thread is checking it, go by the last check
+            return
+        try:
+            lag, error = None, None
+            try:
+                rows = self.fetch(replica, replica_lag_query())
+                if rows[0][0] is None:
+                    error = "replication lag unknown"
+                else:
+                    lag = float(rows[0][0])
+            except (Error, PoolError) as e:
+                error = " ".join(str(e).split())
+            self._set_state(replica, lag, error)
+        finally:
+            replica.check_lock.release()
+
+    def _set_state(self, replica: Replica, lag: Optional[float], error: Optional[str]) -> None:
+        usable = error is None and lag <= self.max_lag_seconds
+        if usable != replica.usable or replica.checked_at is None or error != replica.error:
+            if usable:
+                logger.info(f"Reading from replica {replica.name}, {lag:.1f}s behind")
+            elif error is not None:
+                logger.warning(f"Replica {replica.name} unavailable, reading from the primary: {error}")
+            else:
+                logger.warning(f"Replica {replica.name} is {lag:.1f}s behind, reading from the primary")
+        replica.usable, replica.lag, replica.error = usable, lag, error
+        replica.checked_at = time.monotonic()
+
+    def _connect(self, replica: Replica):
+        if DB_POOL_MAX <= 0:
+            return psycopg2.connect(replica.dsn, **CONNECT_ARGS)
+        if replica.pool is None:
+            with replica.pool_lock:
+                if replica.pool is None:
+                    replica.pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, replica.dsn, **CONNECT_ARGS)
+        try:
+            connection = replica.pool.getconn()
+        except PoolError:
+            return psycopg2.connect(replica.dsn, **CONNECT_ARGS)
+        idle_since = _idle_since.pop(id(connection), None)
+        if connection.closed or (idle_since is not None and time.monotonic() - idle_since > DB_POOL_PING_AFTER_SECONDS
+                                 and not _is_alive(connection)):
+            replica.pool.putconn(connection, close=True)
+            connection = replica.pool.getconn()
+        return connection
+
+    def _release(self, replica: Replica, connection) -> None:
+        if replica.pool is not None:
+            try:
+                replica.pool.putconn(connection, close=bool(connection.closed))
+                if not connection.closed:
+                    _idle_since[id(connection)] = time.monotonic()
+                return
+            except PoolError:
+                pass
+        connection.close()
+
+
+replica_router = ReplicaRouter(DB_REPLICA_URIS, DB_REPLICA_MAX_LAG_SECONDS, DB_REPLICA_CHECK_SECONDS,
+                               DB_READ_YOUR_WRITES_SECONDS, DB_READ_YOUR_WRITES_MAX_SESSIONS)
+
+
+@contextmanager
+def on_primary():
+    """Reads inside the block go to the primary, for data that must not be behind."""
+    token = _force_primary.set(True)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+
+
+def _read_from_replica(query, params) -> Optional[list]:
+    """Rows of a read only query from a replica, or None when the primary should answer."""
+    replica = replica_router.route()
+    if replica is None:
+        return None
+    tracer.set_attribute("db.replica", replica.name)
+    try:
+        return replica_router.fetch(replica, query, params)
+    except (OperationalError, InterfaceError, PoolError) as e:
+        # The replica went away or cancelled the query, the primary answers instead
+        replica_router.mark_failed(replica, e)
+        return None
+    except Error as e:
+        logger.error(f"Error executing query: {e}")
+        raise Exception(f"Query execution failed: {str(e)}")
+
+def _is_outage(error: BaseException) -> bool:
+    """
+    True when error, or an error it was raised while handling, means the database is
+    unreachable or overloaded (connection failures, statement timeouts) rather than that
+    the query or its data was wrong.
+    """
+    for _ in range(5):
+        if error is None:
+            return False
+        if isinstance(error, (OperationalError, InterfaceError, PoolError)) and not isinstance(error, TransactionRollbackError):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _guarded(func):
+    """Runs a database executor through the postgres circuit breaker."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _db_breaker.call(_is_outage):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+@traced_query
 def execute_query(query, params=None, fetch_results=False):
+    # Replica reads go around the primary's circuit breaker, they still work while it is open
+    if fetch_results and replica_router.enabled and isinstance(query, ReadOnlyQuery):
+        results = _read_from_replica(query, params)
+        if results is not None:
+            return results
+    return _execute_query(query, params, fetch_results)
+
+@_guarded
+def _execute_query(query, params=None, fetch_results=False):
     connection = None
     cursor = None
     
@@ -39,6 +416,7 @@ def execute_query(query, params=None, fetch_results=False):
         
         if not fetch_results:
             connection.commit()
+            replica_router.note_write()
             return cursor.rowcount
         else:
             results = cursor.fetchall()
@@ -47,15 +425,17 @@ def execute_query(query, params=None, fetch_results=False):
     except Error as e:
         if connection:
             connection.rollback()
-        print(f"Error executing query: {e}")
+        logger.error(f"Error executing query: {e}")
         raise Exception(f"Query execution failed: {str(e)}")
     
     finally:
         if cursor:
             cursor.close()
         if connection:
-            connection.close()
+            release_connection(connection)
             
+@traced_query
+@_guarded
 def execute_query_for_points(query, params=None, fetch_results=False):
     """
     Execute a SQL query with optional parameters, committing changes and optionally fetching results.
@@ -89,16 +469,18 @@ def execute_query_for_points(query, params=None, fetch_results=False):
         if fetch_results:
             results = cursor.fetchall()
             connection.commit()  # Commit to save updates
+            replica_router.note_write()
             return results
         else:
             connection.commit()  # Commit to save updates
+            replica_router.note_write()
             return cursor.rowcount  # Return number of affected rows
     
     except Error as e:
         # Roll back transaction on error
         if connection:
             connection.rollback()
-        print(f"Error executing query: {e}")
+        logger.error(f"Error executing query: {e}")
         raise Exception(f"Query execution failed: {str(e)}")
     
     finally:
@@ -106,7 +488,88 @@ def execute_query_for_points(query, params=None, fetch_results=False):
         if cursor:
             cursor.close()
         if connection:
-            connection.close()
-
+            release_connection(connection)
 
+@traced_query
+@_guarded
+def execute_many(query, params_list, page_size=1000):
+    """
+    Execute the same SQL statement for every parameter set in a single transaction.
+    
+    Args:
+        query (str): The SQL query to execute.
+        params_list (list): A list of parameter dicts/tuples, one per execution.
+        page_size (int): Number of statements sent to the server per round trip.
+    
+    Returns:
+        int: The number of parameter sets executed.
+    
+    Raises:
+        Exception: If query execution fails, with the error message.
+    """
+    connection = None
+    cursor = None
+    
+    try:
+        connection = get_connection()
+        cursor = connection.cursor()
+        execute_batch(cursor, query, params_list, page_size=page_size)
+        connection.commit()
+        replica_router.note_write()
+        return len(params_list)
+    
+    except Error as e:
+        if connection:
+            connection.rollback()
+        logger.error(f"Error executing query: {e}")
+        raise Exception(f"Query execution failed: {str(e)}")
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            release_connection(connection)
 
+def stream_query(query, params=None, batch_size=10000):
+    """
+    Yield the rows of a SELECT query through a server-side cursor.
+    
+    Only batch_size rows are held in memory at a time, so full-table scans
+    do not materialize the whole result like fetchall() does.
+    
+    Args:
+        query (str): The SQL query to execute.
+        params (dict or tuple, optional): Parameters to pass to the query.
+        batch_size (int): Number of rows fetched from the server per round trip.
+    
+    Yields:
+        tuple: One result row at a time.
+    
+    Raises:
+        Exception: If query execution fails, with the error message.
+    """
+    connection = None
+    cursor = None
+    
+    try:
+        connection = get_connection()
+        cursor = connection.cursor(name="stream_query")
+        cursor.itersize = batch_size
+        
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        
+        for row in cursor:
+            yield row
+    
+    except Error as e:
+        logger.error(f"Error executing query: {e}")
+        raise Exception(f"Query execution failed: {str(e)}")
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            release_connection(connection)
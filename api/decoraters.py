@@ -1,8 +1,9 @@
 from flask import request, abort
 import jwt
+import hmac
 from typing import Callable, Any
 from functools import wraps
-from config import JWT_ALGORITHM, JWT_EXPIRY_MINUTES, JWT_SECRET_KEY, ADMIN_KEY
+from api.config import JWT_ALGORITHM, JWT_EXPIRY_MINUTES, JWT_SECRET_KEY, ADMIN_KEY, CRON_SECRET
 
 def token_required(f):
     @wraps(f)
@@ -21,6 +22,7 @@ def token_required(f):
             # Decode and verify JWT
             payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
             request.user = payload['sub']  # Store user data in request for use in endpoint
+            request.user_id = payload.get('uid')  # users.id, absent in tokens issued before it was added
         except jwt.ExpiredSignatureError:
             abort(401, description="Token has expired")
         except jwt.InvalidTokenError:
@@ -48,4 +50,31 @@ def admin_key_required(func: Callable) -> Callable:
         
         return func(*args, **kwargs)
     
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+def has_admin_key() -> bool:
+    """True when the request carries the ADMIN_KEY in the X-Admin-Key header."""
+    provided_key = request.headers.get('X-Admin-Key')
+    return bool(ADMIN_KEY and provided_key and hmac.compare_digest(provided_key, ADMIN_KEY))
+
+def admin_required(f):
+    """
+    Restrict a route to callers presenting the ADMIN_KEY in the X-Admin-Key header.
+    Scheduled Vercel cron invocations are let through with "Authorization: Bearer <CRON_SECRET>".
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if CRON_SECRET and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {CRON_SECRET}"):
+            return f(*args, **kwargs)
+
+        if not ADMIN_KEY:
+            abort(503, description="Admin key not configured")
+
+        provided_key = request.headers.get('X-Admin-Key')
+        if not provided_key:
+            abort(401, description="Admin key is missing")
+        if not hmac.compare_digest(provided_key, ADMIN_KEY):
+            abort(403, description="Invalid admin key")
+
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,125 @@
+from api.database import read_only
+
+def enqueue_job_query() -> str:
+    """
+    Returns a SQL query that adds a job to the queue and returns its id.
+
+    Returns:
+        str: A SQL query string with placeholders for job_type, payload, priority,
+             max_attempts and delay_seconds.
+    """
+    return """
+        INSERT INTO jobs (job_type, payload, priority, max_attempts, run_after)
+        VALUES (%(job_type)s, %(payload)s, %(priority)s, %(max_attempts)s,
+                CURRENT_TIMESTAMP + make_interval(secs => %(delay_seconds)s))
+        RETURNING id;
+    """
+
+def claim_jobs_query() -> str:
+    """
+    Returns a SQL query that claims up to %(limit)s runnable jobs, lowest priority value first.
+
+    Jobs left 'running' for longer than %(stale_seconds)s by a worker that died are claimed
+    again. SKIP LOCKED lets several workers claim concurrently without waiting on each other.
+
+    Returns:
+        str: A SQL query string returning id, job_type, payload, attempts and max_attempts.
+    """
+    return """
+        UPDATE jobs j
+        SET status = 'running',
+            attempts = j.attempts + 1,
+            locked_at = CURRENT_TIMESTAMP,
+            updated = CURRENT_TIMESTAMP
+        FROM (
+            SELECT id
+            FROM jobs
+            WHERE (status = 'queued' AND run_after <= CURRENT_TIMESTAMP)
+            OR (status = 'running' AND locked_at < CURRENT_TIMESTAMP - make_interval(secs => %(stale_seconds)s))
+            ORDER BY priority, run_after, id
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        ) claimed
+        WHERE j.id = claimed.id
+        RETURNING j.id, j.job_type, j.payload, j.attempts, j.max_attempts;
+    """
+
+def claim_job_query() -> str:
+    """
+    Returns a SQL query that claims the queued job %(id)s, for running it in the calling thread.
+    Returns no row if a worker claimed it first.
+
+    Returns:
+        str: A SQL query string returning id, job_type, payload, attempts and max_attempts.
+    """
+    return """
+        UPDATE jobs
+        SET status = 'running',
+            attempts = attempts + 1,
+            locked_at = CURRENT_TIMESTAMP,
+            updated = CURRENT_TIMESTAMP
+        WHERE id = %(id)s AND status = 'queued'
+        RETURNING id, job_type, payload, attempts, max_attempts;
+    """
+
+def complete_job_query() -> str:
+    """
+    Returns a SQL query that marks a job as done.
+
+    Returns:
+        str: A SQL query string with a placeholder for the job id (%(id)s).
+    """
+    return """
+        UPDATE jobs
+        SET status = 'done', last_error = NULL, updated = CURRENT_TIMESTAMP
+        WHERE id = %(id)s;
+    """
+
+def fail_job_query() -> str:
+    """
+    Returns a SQL query that records a failed attempt. The job is queued again after
+    %(retry_seconds)s, or marked failed once it has used all of its attempts.
+
+    Returns:
+        str: A SQL query string with placeholders for id, error and retry_seconds.
+    """
+    return """
+        UPDATE jobs
+        SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+            run_after = CURRENT_TIMESTAMP + make_interval(secs => %(retry_seconds)s),
+            last_error = %(error)s,
+            locked_at = NULL,
+            updated = CURRENT_TIMESTAMP
+        WHERE id = %(id)s;
+    """
+
+@read_only
+def job_stats_query() -> str:
+    """
+    Returns a SQL query with the number of jobs and the age in seconds of the oldest one,
+    per job type and status, for jobs that are queued, running or failed.
+
+    Returns:
+        str: A SQL query string.
+    """
+    return """
+        SELECT job_type, status, COUNT(*),
+            EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(created))::INT
+        FROM jobs
+        WHERE status IN ('queued', 'running', 'failed')
+        GROUP BY job_type, status
+        ORDER BY job_type, status;
+    """
+
+def purge_jobs_query() -> str:
+    """
+    Returns a SQL query that deletes finished jobs older than %(retention_hours)s.
+
+    Returns:
+        str: A SQL query string.
+    """
+    return """
+        DELETE FROM jobs
+        WHERE status IN ('done', 'failed')
+        AND updated < CURRENT_TIMESTAMP - make_interval(hours => %(retention_hours)s);
+    """
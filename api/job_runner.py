@@ -0,0 +1,234 @@
+import logging
+import importlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from api.job_queries import enqueue_job_query, claim_jobs_query, claim_job_query, complete_job_query, fail_job_query, job_stats_query, purge_jobs_query
+from api.database import execute_query, execute_query_for_points
+from api.tracing import tracer
+from api.config import JOB_WORKERS, JOB_POLL_SECONDS, JOB_DEFAULT_PRIORITY, JOB_MAX_ATTEMPTS, JOB_RETRY_BASE_SECONDS, JOB_STALE_SECONDS, JOB_RETENTION_HOURS
+from psycopg2 import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+
+# Modules that register job handlers. Route modules are imported lazily, so the runner
+# imports these itself before claiming jobs it may not have a handler for yet.
+HANDLER_MODULES = ("api.login_api.utils.otp_utlis", "api.points_api.utils.batch_util")
+
+
+class JobRunner:
+    """
+    In-process worker pool over the Postgres jobs table.
+
+    Routes enqueue a job and return; a poller thread claims runnable jobs (lowest priority
+    value first) into a thread pool. A handler that raises is retried with exponential
+    backoff until the job's max_attempts is used up. Because the queue lives in Postgres,
+    jobs survive restarts and can be drained by any worker or by run_pending(). Work a
+    request is waiting on goes through dispatch(), which runs it in the calling thread when
+    this process has no poller.
+    """
+
+    def __init__(self, workers: int, poll_seconds: float):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self._handlers = {}
+        self._executor = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def handler(self, job_type: str) -> Callable:
+        """Registers the decorated function as the handler of job_type. It receives the job payload."""
+        def register(func: Callable[[dict], object]) -> Callable[[dict], object]:
+            self._handlers[job_type] = func
+            return func
+        return register
+
+    def load_handlers(self) -> None:
+        """Imports HANDLER_MODULES so every job type has its handler registered."""
+        for module in HANDLER_MODULES:
+            importlib.import_module(module)
+
+    def enqueue(self, job_type: str, payload: Optional[dict] = None, priority: int = JOB_DEFAULT_PRIORITY,
+                delay_seconds: float = 0, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+        """
+        Adds a job to the queue.
+
+        Args:
+            job_type (str): A job type with a registered handler.
+            payload (dict, optional): JSON serialisable arguments for the handler.
+            priority (int): Lower values run first.
+            delay_seconds (float): Do not run the job before this many seconds have passed.
+            max_attempts (int): Number of attempts before the job is marked failed.
+
+        Returns:
+            int: The job id.
+
+        Raises:
+            ValueError: If no handler is registered for job_type.
+            DatabaseError: If the job could not be stored.
+        """
+        if job_type not in self._handlers:
+            raise ValueError(f"No handler registered for job type '{job_type}'")
+        try:
+            params = {
+                "job_type": job_type,
+                "payload": json.dumps(payload or {}),
+                "priority": priority,
+                "max_attempts": max_attempts,
+                "delay_seconds": delay_seconds
+            }
+            response = execute_query_for_points(enqueue_job_query(), params, fetch_results=True)
+            self._wake.set()
+            return response[0][0]
+        except DatabaseError as dber:
+            raise DatabaseError(f"Database error: {str(dber)}")
+        except Exception as e:
+            raise RuntimeError(f"Error enqueueing job: {str(e)}")
+
+    def dispatch(self, job_type: str, payload: Optional[dict] = None, priority: int = JOB_DEFAULT_PRIORITY,
+                 max_attempts: int = JOB_MAX_ATTEMPTS) -> bool:
+        """
+        Enqueues a job that should run now. Without a poller in this process (JOB_RUNNER_ENABLED
+        off, the default on Vercel where threads stop with the request) the job is claimed and
+        run in the calling thread rather than waiting for the next /admin/run_jobs cron.
+
+        Returns:
+            bool: False if the job ran here and failed; it is retried like any failed job.
+
+        Raises:
+            ValueError: If no handler is registered for job_type.
+            DatabaseError: If the job could not be stored.
+        """
+        job_id = self.enqueue(job_type, payload, priority, max_attempts=max_attempts)
+        if self.running:
+            return True
+        jobs = execute_query_for_points(claim_job_query(), {"id": job_id}, fetch_results=True)
+        if not jobs:
+            return True
+        return self._execute(jobs[0])
+
+    @property
+    def running(self) -> bool:
+        """Whether this process has a poller claiming jobs in the background."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _claim(self, limit: int) -> list:
+        params = {"limit": limit, "stale_seconds": JOB_STALE_SECONDS}
+        return execute_query_for_points(claim_jobs_query(), params, fetch_results=True) or []
+
+    def _execute(self, job) -> bool:
+        job_id, job_type, payload, attempts, max_attempts = job
+        with tracer.trace(f"job {job_type}", **{"job.id": job_id, "job.attempt": attempts}) as span:
+            try:
+                handler = self._handlers.get(job_type)
+                if handler is None:
+                    raise RuntimeError(f"No handler registered for job type '{job_type}'")
+                handler(payload or {})
+                execute_query(complete_job_query(), {"id": job_id})
+                return True
+            except Exception as e:
+                if span is not None:
+                    span.error = repr(e)
+                logger.exception(f"Error running job {job_id} ({job_type}), attempt {attempts}/{max_attempts}: {str(e)}")
+                try:
+                    retry_seconds = min(3600, JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+                    execute_query(fail_job_query(), {"id": job_id, "error": str(e)[:1000], "retry_seconds": retry_seconds})
+                except Exception as fe:
+                    logger.exception(f"Error recording failure of job {job_id}: {str(fe)}")
+                return False
+
+    def _execute_in_pool(self, job) -> None:
+        try:
+            self._execute(job)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._wake.set()
+
+    def _poll(self) -> None:
+        while not self._stop.is_set():
+            claimed = 0
+            with self._lock:
+                free = self.workers - self._in_flight
+            if free > 0:
+                try:
+                    jobs = self._claim(free)
+                    claimed = len(jobs)
+                    for job in jobs:
+                        with self._lock:
+                            self._in_flight += 1
+                        self._executor.submit(self._execute_in_pool, job)
+                except Exception as e:
+                    logger.exception(f"Error claiming jobs: {str(e)}")
+
+            # Keep claiming while the queue has more work than free workers
+            if claimed and claimed == free:
+                continue
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def start(self) -> bool:
+        """Starts the worker pool and the poller thread unless they are already running."""
+        self.load_handlers()
+        with self._lock:
+            if self.running:
+                return False
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job-worker")
+            self._thread = threading.Thread(target=self._poll, name="job-poller", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def run_pending(self, limit: int = 100, time_budget_seconds: float = 20) -> dict:
+        """
+        Runs queued jobs in the calling thread, e.g. from a cron request on serverless hosts
+        where background threads do not outlive the request.
+
+        Returns:
+            dict: The number of jobs that succeeded and failed.
+        """
+        self.load_handlers()
+        deadline = time.monotonic() + time_budget_seconds
+        succeeded = failed = 0
+        while succeeded + failed < limit and time.monotonic() < deadline:
+            jobs = self._claim(1)
+            if not jobs:
+                break
+            if self._execute(jobs[0]):
+                succeeded += 1
+            else:
+                failed += 1
+        return {"succeeded": succeeded, "failed": failed}
+
+    def stats(self) -> dict:
+        """Queue depth per job type and status, plus this process's worker usage."""
+        response = execute_query(job_stats_query(), fetch_results=True)
+        queue = {}
+        for job_type, status, count, oldest_seconds in response or []:
+            queue.setdefault(job_type, {})[status] = {"count": count, "oldest_seconds": oldest_seconds}
+        return {
+            "queue": queue,
+            "workers": self.workers,
+            "in_flight": self._in_flight,
+            "running": self.running
+        }
+
+
+job_runner = JobRunner(JOB_WORKERS, JOB_POLL_SECONDS)
+
+
+@job_runner.handler("purge_finished_jobs")
+def purge_finished_jobs(payload: dict) -> None:
+    execute_query(purge_jobs_query(), {"retention_hours": payload.get("retention_hours", JOB_RETENTION_HOURS)})
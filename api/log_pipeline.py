@@ -0,0 +1,198 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import Flask, g, has_request_context, request
+from api.config import LOG_FILE, LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLE_RATES, LOG_SLOW_REQUEST_MS
+
+REQUEST_ID_HEADER = "X-Request-ID"
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Events logged often enough to be sampled, with the share of records kept.
+# LOG_SAMPLE_RATES ("event=rate,event=rate") overrides them or adds others.
+DEFAULT_SAMPLE_RATES = {
+    "request": 0.01,
+    "rate_limited": 0.1,
+    "rate_limit_backend_error": 0.01,
+}
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+logger = logging.getLogger(__name__)
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def parse_sample_rates(value: str) -> dict:
+    """Parses "event=rate,event=rate" into a dict of rates between 0 and 1."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        event, _, rate = item.partition("=")
+        try:
+            rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            raise ValueError(f"Invalid sample rate '{item}', expected event=rate")
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line, with the fields passed in extra=."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a random share of the records of high volume events. A record is sampled when it
+    carries an "event" with a rate below 1; the kept ones carry the rate as "sample_rate",
+    so counts can be scaled back up. Records without an event are always kept.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        if rate is None:
+            rate = self.rates.get(getattr(record, "event", None))
+        if rate is None or rate >= 1:
+            return True
+        record.sample_rate = rate
+        return random.random() < rate
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds the request id, method and path to records logged while handling a request."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if has_request_context():
+            request_id = g.get("request_id")
+            if request_id:
+                record.request_id = request_id
+                record.method = request.method
+                record.path = request.path
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Formats records on the calling thread and hands them to the listener thread. When the
+    queue is full records are dropped instead of blocking the request, and the number
+    dropped is logged once there is room again.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+
+        if self.dropped:
+            with self._lock:
+                dropped, self.dropped = self.dropped, 0
+            notice = logging.makeLogRecord({"name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                                            "msg": f"{dropped} log records dropped, the log queue was full"})
+            try:
+                self.queue.put_nowait(self.prepare(notice))
+            except queue.Full:
+                with self._lock:
+                    self.dropped += dropped
+
+
+def configure_logging() -> None:
+    """
+    Routes every log record through a bounded queue to a listener thread that writes them
+    to stderr and, when it can be opened, LOG_FILE. Called once per process; logging
+    calls on request threads only format and enqueue.
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+
+        handlers = [logging.StreamHandler()]
+        file_error = None
+        if LOG_FILE:
+            try:
+                handlers.append(logging.FileHandler(LOG_FILE))
+            except OSError as e:
+                # Read-only filesystems such as Vercel's only get the stream handler
+                file_error = e
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        queue_handler = NonBlockingQueueHandler(log_queue)
+        queue_handler.setFormatter(JsonFormatter())
+        queue_handler.addFilter(SamplingFilter({**DEFAULT_SAMPLE_RATES, **parse_sample_rates(LOG_SAMPLE_RATES)}))
+        queue_handler.addFilter(RequestContextFilter())
+
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        # Flush what is still queued when the process exits
+        atexit.register(_listener.stop)
+
+    if file_error is not None:
+        logger.warning(f"File logging disabled: {str(file_error)}")
+
+
+def init_request_logging(app: Flask) -> None:
+    """
+    Gives every request an id, taken from a valid X-Request-ID header or generated, which
+    is added to its log records and returned in the X-Request-ID response header. Each
+    request is logged as a sampled "request" event; slow requests and server errors are
+    always logged as warnings.
+    """
+
+    @app.before_request
+    def assign_request_id():
+        incoming = request.headers.get(REQUEST_ID_HEADER, "")
+        g.request_id = incoming if VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        request_id = g.get("request_id")
+        if request_id is None:
+            return response
+        response.headers[REQUEST_ID_HEADER] = request_id
+
+        duration_ms = round((time.perf_counter() - g.request_started) * 1000, 1)
+        extra = {"event": "request", "status": response.status_code, "duration_ms": duration_ms}
+        if duration_ms >= LOG_SLOW_REQUEST_MS or response.status_code >= 500:
+            extra["sample_rate"] = 1.0
+            level = logging.WARNING
+        else:
+            level = logging.INFO
+        logger.log(level, f"{request.method} {request.path} {response.status_code} in {duration_ms} ms", extra=extra)
+        return response
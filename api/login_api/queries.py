@@ -24,6 +24,17 @@ def get_user_exists_query()->str:
         WHERE email = %(email)s
 """
 
+def get_user_id_query()->str:
+    """
+    Returns a PostgreSQL query to retrieve the id of a user based on their email.
+
+    :return: PostgreSQL query string
+    """
+    return """
+        SELECT id FROM users
+        WHERE email = %(email)s
+"""
+
 def get_insert_user_query()->str:
     """
     Returns a PostgreSQL query to insert a new user into the 'users' table.
@@ -165,4 +176,14 @@ def get_delete_otp_query()->str:
         WHERE email = %(email)s
 """
 
-    
\ No newline at end of file
+    
+def get_delete_expired_otps_query()->str:
+    """
+    Returns a PostgreSQL query to delete every OTP whose validity period has passed.
+
+    :return: PostgreSQL query string
+    """
+    return """
+        DELETE FROM otp_verification
+        WHERE valid_till < LOCALTIMESTAMP
+"""
@@ -1,3 +1,4 @@
+import logging
 from api.blueprints import auth
 from flask import jsonify, request, url_for
 from api.login_api.utils.validate_utils import validate_email, validate_password
@@ -8,6 +9,20 @@ import jwt
 from api.decoraters import token_required
 from cachetools import TTLCache
 from api.login_api.utils.otp_utlis import*
+from api.rate_limiter import limiter
+from api.user_ids import resolve_user_id
+from api.config import RATE_LIMIT_AUTH, RATE_LIMIT_LOGIN, RATE_LIMIT_OTP, RATE_LIMIT_OTP_IP, RATE_LIMIT_OTP_VERIFY
+
+logger = logging.getLogger(__name__)
+
+# Checked before the view runs, so throttled requests never reach the database or SMTP
+limiter.limit(auth, RATE_LIMIT_AUTH, key="ip")
+limiter.limit(auth, RATE_LIMIT_LOGIN, key="email", endpoint="login")
+limiter.limit(auth, RATE_LIMIT_OTP, key="email", endpoint="signup")
+limiter.limit(auth, RATE_LIMIT_OTP_IP, key="ip", endpoint="signup")
+limiter.limit(auth, RATE_LIMIT_OTP, key="email", endpoint="forgot_password")
+limiter.limit(auth, RATE_LIMIT_OTP_IP, key="ip", endpoint="forgot_password")
+limiter.limit(auth, RATE_LIMIT_OTP_VERIFY, key="email", endpoint="verify_email")
 
 @auth.route('/login', methods=["GET", "POST"])
 def login():
@@ -59,6 +74,7 @@ def login():
         
         payload = {
             'sub': email, 
+            'uid': resolve_user_id(email),  # Lets routes skip the email to id lookup
             'iat': datetime.utcnow(),  # Issued at
             'exp': datetime.utcnow() + timedelta(minutes=JWT_EXPIRY_MINUTES)  # Expiration
         }
@@ -108,8 +124,10 @@ def signup():
         if user_in_pending_signups:
             if user_mail_verified(email):
                 otp = generate_otp()
-                res = send_otp(email, otp)
-                send_otp_to_db(email, otp)
+                # The mail job reads the stored OTP, so nothing is queued without one
+                if not send_otp_to_db(email, otp):
+                    return jsonify({"message":"failed to store otp"}), 500
+                res = queue_otp_email(email)
                 if not res:
                     return jsonify({"message":"failed to send opt"}), 400
                 return jsonify({"message": "Signup successful", "user":email, "email":"unverified"}), 201
@@ -119,8 +137,10 @@ def signup():
         try:
             insert_user_to_pending(name, email, password)
             otp = generate_otp()
-            res = send_otp(email, otp)
-            send_otp_to_db(email, otp)
+            if not send_otp_to_db(email, otp):
+                return jsonify({"message":"failed to store otp"}), 500
+            # The mail is sent by the job runner so SMTP never holds up the response
+            res = queue_otp_email(email)
             if not res:
                 return jsonify({"message":"failed to send opt"}), 400
             return jsonify({"message": "Signup successful", "user":email,"email":"unverified"}), 201
@@ -159,8 +179,9 @@ def forgot_password():
         # session['password'] = password
         cache[email] = password
         otp = generate_otp()
-        res = send_otp(email, otp)
-        res_2 = send_otp_to_db(email, otp)
+        if not send_otp_to_db(email, otp):
+            return jsonify({"message":"failed to store otp"}), 500
+        res = queue_otp_email(email)
         if not res:
             return jsonify({"message":"failed to send opt"}), 400
         return jsonify({"message":"password submited verify the otp", "user":email}),200
@@ -192,6 +213,7 @@ def refresh_token():
     current_user = request.user
     payload = {
         'sub': current_user,
+        'uid': getattr(request, 'user_id', None) or resolve_user_id(current_user),
         'iat': datetime.utcnow(),
         'exp': datetime.utcnow() + timedelta(minutes=JWT_EXPIRY_MINUTES)
     }
@@ -227,7 +249,7 @@ def verify_email(email, field):
             if field == "signup":
                 success = update_user_email_status(email)
                 if not success:
-                    print(f"Failed to verify email for {email}")
+                    logger.error(f"Failed to verify email for {email}")
                     return jsonify({"message": "Failed to verify email"}), 500
             elif field == "forgot":
                 # password = session.get("password")
@@ -242,9 +264,9 @@ def verify_email(email, field):
         return jsonify({"message": "Invalid OTP"}), 401
 
     except ValueError as ve:
-        print(f"Validation error: {str(ve)}")
+        logger.warning(f"Validation error: {str(ve)}")
         return jsonify({"message": "Invalid input data"}), 400
     except Exception as e:
-        print(f"Unexpected error processing request for email {email}: {str(e)}")
+        logger.exception(f"Unexpected error processing request for email {email}: {str(e)}")
         return jsonify({"message": "Internal server error"}), 500
         
\ No newline at end of file
@@ -0,0 +1,147 @@
+import logging
+from datetime import datetime, timedelta
+import pytest
+from flask import Flask
+from api.rate_limiter import limiter
+import api.login_api.routes as login_routes
+import api.admin_api.routes as admin_routes
+import api.login_api.utils.otp_utlis as otp_utlis
+
+EMAIL = "someone@example.com"
+PASSWORD = "Passw0rd!x"
+
+
+class Mailer:
+    """Stands in for send_otp_to_db and queue_otp_email, storing whether the OTP write succeeds."""
+
+    def __init__(self):
+        self.stored = True
+        self.queued = []
+
+    def send_otp_to_db(self, email, otp):
+        return self.stored
+
+    def queue_otp_email(self, email):
+        self.queued.append(email)
+        return True
+
+
+@pytest.fixture
+def mailer(monkeypatch):
+    mailer = Mailer()
+    for module in (login_routes, admin_routes):
+        monkeypatch.setattr(module, "send_otp_to_db", mailer.send_otp_to_db)
+        monkeypatch.setattr(module, "queue_otp_email", mailer.queue_otp_email)
+    return mailer
+
+
+@pytest.fixture
+def client(monkeypatch, mailer):
+    from api.blueprints import auth, admin
+    monkeypatch.setattr(limiter, "enabled", False)
+    app = Flask(__name__)
+    app.register_blueprint(auth, url_prefix="/auth")
+    app.register_blueprint(admin, url_prefix="/admin")
+    return app.test_client()
+
+
+@pytest.fixture
+def new_user(monkeypatch):
+    monkeypatch.setattr(login_routes, "user_exists", lambda email: False)
+    monkeypatch.setattr(login_routes, "user_exists_in_pending_signups", lambda email: [])
+    monkeypatch.setattr(login_routes, "insert_user_to_pending", lambda name, email, password: True)
+
+
+@pytest.fixture
+def pending_user(monkeypatch):
+    monkeypatch.setattr(login_routes, "user_exists", lambda email: False)
+    monkeypatch.setattr(login_routes, "user_exists_in_pending_signups", lambda email: [("unverified",)])
+    monkeypatch.setattr(login_routes, "user_mail_verified", lambda email: True)
+
+
+@pytest.fixture
+def existing_user(monkeypatch):
+    monkeypatch.setattr(login_routes, "user_exists", lambda email: True)
+
+
+@pytest.fixture
+def existing_admin(monkeypatch):
+    monkeypatch.setattr(admin_routes, "is_admin_present", lambda email: True)
+
+
+SIGNUP = ("/auth/signup", "post", {"name": "Someone", "email": EMAIL, "password": PASSWORD})
+FORGOT_PASSWORD = ("/auth/forgot_password", "put", {"email": EMAIL, "password": PASSWORD})
+ADMIN_SEND_OTP = ("/admin/send_otp", "post", {"email": EMAIL})
+
+CASES = [
+    pytest.param("new_user", SIGNUP, 201, "failed to store otp", id="signup"),
+    pytest.param("pending_user", SIGNUP, 201, "failed to store otp", id="signup resend"),
+    pytest.param("existing_user", FORGOT_PASSWORD, 200, "failed to store otp", id="forgot_password"),
+    pytest.param("existing_admin", ADMIN_SEND_OTP, 200, "Not able to store otp", id="admin send_otp"),
+]
+
+
+@pytest.mark.parametrize("users, route, status, message", CASES)
+def test_otp_is_stored_then_mailed(request, client, mailer, users, route, status, message):
+    request.getfixturevalue(users)
+    path, method, body = route
+
+    response = getattr(client, method)(path, json=body)
+    assert response.status_code == status
+    assert mailer.queued == [EMAIL]
+
+
+@pytest.mark.parametrize("users, route, status, message", CASES)
+def test_otp_that_was_not_stored_is_not_mailed(request, client, mailer, users, route, status, message):
+    request.getfixturevalue(users)
+    mailer.stored = False
+    path, method, body = route
+
+    response = getattr(client, method)(path, json=body)
+    assert response.status_code == 500
+    assert response.get_json() == {"message": message}
+    assert mailer.queued == []
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    sent = []
+
+    def send_otp(email, otp):
+        sent.append((email, otp))
+        return True
+
+    monkeypatch.setattr(otp_utlis, "send_otp", send_otp)
+    return sent
+
+
+def stored_otp(monkeypatch, otp_details):
+    monkeypatch.setattr(otp_utlis, "get_otp", lambda email: otp_details)
+
+
+def test_email_job_sends_the_current_otp(monkeypatch, outbox):
+    stored_otp(monkeypatch, {"otp": "abc123", "valid_till": datetime.now() + timedelta(minutes=5)})
+
+    otp_utlis.send_otp_email_job({"email": EMAIL})
+    assert outbox == [(EMAIL, "abc123")]
+
+
+@pytest.mark.parametrize("otp_details, reason", [
+    (None, "no OTP stored"),
+    ({"otp": "abc123", "valid_till": datetime.now() - timedelta(minutes=1)}, "OTP expired"),
+])
+def test_email_job_without_a_valid_otp_logs_instead_of_sending(monkeypatch, caplog, outbox, otp_details, reason):
+    stored_otp(monkeypatch, otp_details)
+
+    with caplog.at_level(logging.WARNING, logger=otp_utlis.logger.name):
+        otp_utlis.send_otp_email_job({"email": EMAIL})
+    assert outbox == []
+    assert reason in caplog.text
+
+
+def test_email_job_raises_when_the_mail_fails_so_it_is_retried(monkeypatch):
+    stored_otp(monkeypatch, {"otp": "abc123", "valid_till": datetime.now() + timedelta(minutes=5)})
+    monkeypatch.setattr(otp_utlis, "send_otp", lambda email, otp: False)
+
+    with pytest.raises(RuntimeError, match="Failed to send OTP email"):
+        otp_utlis.send_otp_email_job({"email": EMAIL})
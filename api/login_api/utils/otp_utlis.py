@@ -1,15 +1,26 @@
 # import sys
 # import os
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+import logging
 from datetime import datetime, timedelta
-from api.login_api.queries import get_insert_or_update_otp_query, get_delete_otp_query, get_otp_query
+from api.login_api.queries import get_insert_or_update_otp_query, get_delete_otp_query, get_otp_query, get_delete_expired_otps_query
 from api.database import execute_query
-import smtplib
-from email.mime.text import MIMEText
+from api.job_runner import job_runner
+from api.tracing import tracer, CLIENT
+from api.circuit_breaker import breaker, CircuitOpenError
 import secrets
-from api.config import MAIL, PASSWORD
+from api.config import MAIL, PASSWORD, OTP_JOB_PRIORITY, SMTP_TIMEOUT_SECONDS
 from psycopg2 import DatabaseError
 
+logger = logging.getLogger(__name__)
+
+_smtp_breaker = breaker("smtp")
+
+def _is_smtp_outage(error: BaseException) -> bool:
+    """Connection, timeout and server errors; a refused recipient is the address's fault, not the server's."""
+    import smtplib
+    return isinstance(error, OSError) and not isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused))
+
 def generate_otp() -> str:
     """
     Generate a secure 6-character One-Time Password (OTP) using cryptographically secure random selection.
@@ -48,6 +59,10 @@ def send_otp(email: str, otp: str) -> bool:
 
     Sends the OTP via email using SMTP with Gmail's SMTP server.
     """
+    # Imported here so cold starts that never send mail skip them
+    import smtplib
+    from email.mime.text import MIMEText
+
     sender_email = MAIL
     sender_password = PASSWORD
     subject = "Your OTP Code"
@@ -60,13 +75,17 @@ def send_otp(email: str, otp: str) -> bool:
     message["Subject"] = subject
 
     try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
+        with _smtp_breaker.call(_is_smtp_outage), tracer.span("smtp.send", CLIENT, **{"smtp.host": "smtp.gmail.com"}), \
+                smtplib.SMTP("smtp.gmail.com", 587, timeout=SMTP_TIMEOUT_SECONDS) as server:
             server.starttls()
             server.login(sender_email, sender_password)
             server.sendmail(sender_email, email, message.as_string())
         return True
+    except CircuitOpenError as e:
+        logger.warning(f"Failed to send email: {str(e)}")
+        return False
     except Exception as e:
-        print(f"Failed to send email: {str(e)}")
+        logger.exception(f"Failed to send email: {str(e)}")
         return False
     
 def send_otp_to_db(email: str, otp: str) -> bool:
@@ -105,7 +124,7 @@ def send_otp_to_db(email: str, otp: str) -> bool:
         return bool(result)  
         
     except Exception as e:
-        print(f"Error storing OTP: {str(e)}")
+        logger.exception(f"Error storing OTP: {str(e)}")
         return False
 
 def get_otp(email: str) -> dict:
@@ -161,4 +180,40 @@ def delete_otp(email: str) -> bool:
         raise DatabaseError(str(dber))
     except Exception as e:
         raise RuntimeError(str(e))
-    
+
+def queue_otp_email(email: str) -> bool:
+    """
+    Sends the email's current OTP through the job runner so the SMTP round trip does not block
+    the request while a background poller runs; without one the mail is sent before returning.
+    Store the OTP with send_otp_to_db first. The job only carries the email and reads the OTP
+    from otp_verification when it runs, so OTPs are never kept in jobs.payload.
+
+    Args:
+        email (str): The recipient's email address.
+
+    Returns:
+        bool: True if the mail was queued or sent, False otherwise.
+    """
+    try:
+        return job_runner.dispatch("send_otp_email", {"email": email}, priority=OTP_JOB_PRIORITY, max_attempts=3)
+    except Exception as e:
+        logger.exception(f"Failed to queue OTP email: {str(e)}")
+        return False
+
+@job_runner.handler("send_otp_email")
+def send_otp_email_job(payload: dict) -> None:
+    # A replaced OTP is not resent, the job sends whichever one is current
+    otp_details = get_otp(payload["email"])
+    if not otp_details:
+        # Nothing to retry: the OTP was already used or purged, the user has to ask for a new one
+        logger.warning(f"OTP email not sent to {payload['email']}: no OTP stored")
+        return
+    if otp_details["valid_till"] < datetime.now():
+        logger.warning(f"OTP email not sent to {payload['email']}: OTP expired at {otp_details['valid_till']}")
+        return
+    if not send_otp(payload["email"], otp_details["otp"]):
+        raise RuntimeError("Failed to send OTP email")
+
+@job_runner.handler("purge_expired_otps")
+def purge_expired_otps(payload: dict) -> None:
+    execute_query(get_delete_expired_otps_query())
@@ -0,0 +1,342 @@
+import argparse
+import os
+import re
+import sys
+from typing import Optional
+from api.database import get_connection, release_connection
+from api.migration_queries import create_schema_migrations_query, lock_migrations_query, get_applied_migrations_query, insert_migration_query, delete_migration_query, get_table_sizes_query
+from api.config import MIGRATION_CHECK_LARGE_TABLE_ROWS
+from psycopg2 import DatabaseError
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+SECTION = re.compile(r"^--\s*migrate:(up|down)\s*$", re.MULTILINE)
+
+# Lookup tables that stay small; a sequential scan on them only fails the check once
+# they grow past MIGRATION_CHECK_LARGE_TABLE_ROWS. Every other table counts as large
+# whatever its current size, so a check against a development database still catches
+# plans that would scan production's tables.
+SMALL_TABLES = ("admin", "scheme", "schema_migrations")
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> list[dict]:
+    """
+    Reads the migration files, ordered by version.
+
+    Each file is named NNNN_name.sql and holds a "-- migrate:up" section and an
+    optional "-- migrate:down" section.
+
+    Raises:
+        ValueError: If a file has no up section or two files share a version.
+    """
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename)) as f:
+            sections = SECTION.split(f.read())
+
+        # split() alternates text and the captured section name: [header, 'up', sql, 'down', sql]
+        bodies = dict(zip(sections[1::2], (body.strip() for body in sections[2::2])))
+        if not bodies.get("up"):
+            raise ValueError(f"Migration {filename} has no '-- migrate:up' section")
+
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Migrations {migrations[version]['filename']} and {filename} share version {version}")
+        migrations[version] = {
+            "version": version,
+            "name": match.group(2),
+            "filename": filename,
+            "up": bodies["up"],
+            "down": bodies.get("down")
+        }
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def _applied(cursor) -> dict:
+    cursor.execute(get_applied_migrations_query())
+    return {version: (name, applied_at) for version, name, applied_at in cursor.fetchall()}
+
+
+def _in_transaction(work):
+    """Runs work(cursor) in one transaction holding the migrations lock."""
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            # Migrations may rewrite large tables, they are not held to DB_STATEMENT_TIMEOUT_MS
+            cursor.execute("SET LOCAL statement_timeout = 0;")
+            cursor.execute(create_schema_migrations_query())
+            cursor.execute(lock_migrations_query())
+            result = work(cursor)
+        connection.commit()
+        return result
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        release_connection(connection)
+
+
+def status() -> list[dict]:
+    """Every migration on disk or in schema_migrations, with whether it is applied."""
+    applied = _in_transaction(_applied)
+    rows = []
+    for migration in load_migrations():
+        _, applied_at = applied.pop(migration["version"], (None, None))
+        rows.append({"version": migration["version"], "name": migration["name"], "applied_at": applied_at, "missing": False})
+    for version, (name, applied_at) in applied.items():
+        rows.append({"version": version, "name": name, "applied_at": applied_at, "missing": True})
+    return sorted(rows, key=lambda row: row["version"])
+
+
+def migrate_up(target: Optional[int] = None) -> list[str]:
+    """
+    Applies the pending migrations up to and including target (all when omitted).
+    Each migration runs in its own transaction together with its schema_migrations row,
+    so a failing migration leaves the database at the previous version.
+
+    Returns:
+        list: The file names of the migrations applied.
+    """
+    done = []
+    for migration in load_migrations():
+        if target is not None and migration["version"] > target:
+            break
+
+        def apply(cursor, migration=migration):
+            if migration["version"] in _applied(cursor):
+                return False
+            cursor.execute(migration["up"])
+            cursor.execute(insert_migration_query(), {"version": migration["version"], "name": migration["name"]})
+            return True
+
+        if _in_transaction(apply):
+            done.append(migration["filename"])
+    return done
+
+
+def migrate_down(steps: int = 1) -> list[str]:
+    """
+    Rolls back the latest `steps` applied migrations, newest first.
+
+    Raises:
+        ValueError: If a migration to roll back is missing on disk or has no down section.
+
+    Returns:
+        list: The file names of the migrations rolled back.
+    """
+    migrations = {migration["version"]: migration for migration in load_migrations()}
+    done = []
+    for _ in range(steps):
+        def rollback(cursor):
+            applied = _applied(cursor)
+            if not applied:
+                return None
+            version = max(applied)
+            migration = migrations.get(version)
+            if migration is None:
+                raise ValueError(f"Migration {version:04d} is applied but its file is missing")
+            if not migration["down"]:
+                raise ValueError(f"Migration {migration['filename']} has no '-- migrate:down' section")
+            cursor.execute(migration["down"])
+            cursor.execute(delete_migration_query(), {"version": version})
+            return migration["filename"]
+
+        filename = _in_transaction(rollback)
+        if filename is None:
+            break
+        done.append(filename)
+    return done
+
+
+def baseline(version: int) -> list[str]:
+    """
+    Records the migrations up to version as applied without running them, for databases
+    created from tables.sql or migrated by hand before this tool existed.
+    """
+    def mark(cursor):
+        applied = _applied(cursor)
+        marked = []
+        for migration in load_migrations():
+            if migration["version"] <= version and migration["version"] not in applied:
+                cursor.execute(insert_migration_query(), {"version": migration["version"], "name": migration["name"]})
+                marked.append(migration["filename"])
+        return marked
+
+    return _in_transaction(mark)
+
+
+def registered_queries() -> list[tuple]:
+    """
+    The queries whose plans check_query_plans() inspects, as (name, query, sample params,
+    tables the query is allowed to scan). Statements that EXPLAIN cannot take (DO blocks,
+    several statements) and plain INSERTs are left out.
+    """
+    from api.admin_api import queries as admin
+    from api.login_api import queries as login
+    from api.points_api import queris as points
+    from api.points_api.utils.code_codec import encode_code
+    from api.user_api import queries as user
+    from api import job_queries as jobs
+
+    email = {"email": "check@example.com"}
+    user_id = {"user_id": 1}
+    return [
+        ("admin.get_user_from_pending_signups", admin.get_user_from_pending_signups_query(), {}, ()),
+        ("admin.update_user_status", admin.update_user_status_query(), {**email, "status": "approved"}, ()),
+        ("admin.delete_approved_user", admin.delete_approved_user(), email, ()),
+        ("admin.get_approved_users", admin.get_approved_users_query(), email, ()),
+        ("admin.delete_user", admin.delete_user_query(), email, ()),
+        ("admin.delete_scheme", admin.delete_scheme_query(), {"id": 1}, ()),
+        ("admin.update_scheme", admin.update_scheme_query(), {"scheme_title": "check", "scheme_valid_from": None, "scheme_valid_to": None, "scheme_perks": None, "points": None}, ()),
+        ("admin.get_scheme", admin.get_scheme_query(), {}, ("scheme",)),
+        ("admin.get_admin_password", admin.get_admin_password_query(), email, ()),
+        ("admin.get_admin_exists", admin.get_admin_exists_query(), email, ()),
+        ("admin.delete_admin", admin.delete_admin_query(), email, ()),
+        ("admin.get_scheme_redemption_details", admin.get_scheme_redemption_details_query(), {}, ("schemes_redemption",)),
+        ("admin.approve_scheme", admin.approve_scheme_query(), {**user_id, "id": 1}, ()),
+        ("admin.reject_scheme", admin.reject_scheme_query_admin_api(), {"id": 1}, ()),
+        ("admin.get_required_points", admin.get_required_points_query(), {"id": 1}, ()),
+        ("admin.approve_scheme_redemptions", admin.approve_scheme_redemptions_query(), {"ids": [1, 2], "scheme_id": None}, ()),
+        ("admin.expire_schemes", admin.expire_schemes_query(), {}, ()),
+        ("login.get_user_password", login.get_user_password_query(), email, ()),
+        ("login.get_user_exists", login.get_user_exists_query(), email, ()),
+        ("login.get_user_status_in_pending_signups", login.get_user_status_in_pending_signups_query(), email, ()),
+        ("login.update_user_email_status", login.update_user_email_status_query(), email, ()),
+        ("login.get_email_status", login.get_email_status_query(), email, ()),
+        ("login.get_otp", login.get_otp_query(), email, ()),
+        ("login.get_reset_password", login.get_reset_password_query(), {**email, "password": "check"}, ()),
+        ("login.get_delete_otp", login.get_delete_otp_query(), email, ()),
+        ("login.get_delete_expired_otps", login.get_delete_expired_otps_query(), {}, ()),
+        ("user.get_users_detail", user.get_users_detail_query(), email, ()),
+        ("user.get_top_users", user.get_top_users_query(), {"limit": 10, "period": "week"}, ()),
+        ("user.get_users", user.get_users_query(), {"after_id": 0, "limit": 11}, ()),
+        ("user.get_users_estimate", user.get_users_estimate_query(), {}, ()),
+        ("user.get_users_count", user.get_users_count_query(), {}, ("users",)),
+        ("user.get_scheme", user.get_scheme_query(), {}, ()),
+        ("user.get_scheme_valid_to", user.get_scheme_valid_to_query(), {"id": 1}, ()),
+        ("user.scheme_already_applied", user.scheme_already_applied_query(), user_id, ()),
+        ("user.scheme_status", user.scheme_status_query(), user_id, ()),
+        ("user.get_points_required_for_scheme", user.get_points_required_for_scheme_query(), {"scheme_id": 1}, ()),
+        ("user.apply_for_scheme", user.apply_for_scheme_query(), {**user_id, "scheme_id": 1}, ()),
+        ("points.get_points", points.get_points_query(), user_id, ()),
+        ("points.credit_points", points.credit_points_query(), {**user_id, "points": 1, "source": "check"}, ()),
+        ("points.debit_points", points.debit_points_query(), {**user_id, "points": 1, "source": "check"}, ()),
+        ("points.get_points_history", points.get_points_history_query(), {**user_id, "limit": 10}, ()),
+        ("points.get_pin_validate", points.get_pin_validate_query(), {**user_id, "codes": [encode_code("12345678ABCD")]}, ()),
+        ("points.get_pin_validate_batch", points.get_pin_validate_batch_query(), {**user_id, "codes": [encode_code("12345678ABCD")], "batch_id": "00000000-0000-0000-0000-000000000000", "recorded": "{}"}, ()),
+        ("points.get_existing_points_codes", points.get_existing_points_codes_query(), {"codes": [encode_code("12345678ABCD")]}, ()),
+        ("points.get_all_points_codes", points.get_all_points_codes_query(), {}, ("points",)),
+        ("points.get_points_mint_generation", points.get_points_mint_generation_query(), {}, ("points_mint_generation",)),
+        ("points.claim_scan_batch", points.claim_scan_batch_query(), {**email, "batch_id": "00000000-0000-0000-0000-000000000000", "status": "pending", "codes": "[]", "stale_minutes": 10}, ()),
+        ("points.start_scan_batch", points.start_scan_batch_query(), {"batch_id": "00000000-0000-0000-0000-000000000000"}, ()),
+        ("points.get_scan_batch", points.get_scan_batch_query(), {"batch_id": "00000000-0000-0000-0000-000000000000"}, ()),
+        ("points.complete_scan_batch", points.complete_scan_batch_query(), {"batch_id": "00000000-0000-0000-0000-000000000000", "result": "{}"}, ()),
+        ("jobs.claim_jobs", jobs.claim_jobs_query(), {"limit": 4, "stale_seconds": 600}, ()),
+        ("jobs.claim_job", jobs.claim_job_query(), {"id": 1}, ()),
+        ("jobs.complete_job", jobs.complete_job_query(), {"id": 1}, ()),
+        ("jobs.fail_job", jobs.fail_job_query(), {"id": 1, "error": "check", "retry_seconds": 30}, ()),
+        ("jobs.job_stats", jobs.job_stats_query(), {}, ()),
+        ("jobs.purge_jobs", jobs.purge_jobs_query(), {"retention_hours": 72}, ())
+    ]
+
+
+def _plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def check_query_plans(large_table_rows: int = MIGRATION_CHECK_LARGE_TABLE_ROWS) -> list[dict]:
+    """
+    Runs EXPLAIN on every registered query and reports sequential scans on large tables.
+
+    Plans are taken with enable_seqscan off, which makes the planner use any index that
+    can serve the query, so a sequential scan left in the plan means no index fits,
+    however few rows the table holds right now. Nothing is executed; the transaction is
+    rolled back.
+
+    Returns:
+        list: One entry per offending scan with the query name, table and estimated rows,
+              or with the error of a query that could not be planned.
+    """
+    connection = get_connection()
+    problems = []
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off;")
+            cursor.execute(get_table_sizes_query())
+            tables = {relname: (parent, rows) for relname, parent, rows in cursor.fetchall()}
+
+            for name, query, params, allowed in registered_queries():
+                cursor.execute("SAVEPOINT explain_query;")
+                try:
+                    cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+                    plan = cursor.fetchone()[0][0]["Plan"]
+                except DatabaseError as dber:
+                    # A query that no longer matches the schema fails the check too
+                    cursor.execute("ROLLBACK TO SAVEPOINT explain_query;")
+                    problems.append({"query": name, "error": str(dber).strip()})
+                    continue
+                for node in _plan_nodes(plan):
+                    if node["Node Type"] != "Seq Scan":
+                        continue
+                    relation = node["Relation Name"]
+                    table, rows = tables.get(relation, (relation, 0))
+                    if table in allowed:
+                        continue
+                    if table in SMALL_TABLES and rows < large_table_rows:
+                        continue
+                    problems.append({"query": name, "table": relation, "rows": rows, "filter": node.get("Filter")})
+    finally:
+        connection.rollback()
+        release_connection(connection)
+    return problems
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Apply, roll back and check schema migrations.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="List migrations and whether they are applied")
+    up = commands.add_parser("up", help="Apply pending migrations")
+    up.add_argument("target", nargs="?", type=int, help="Last version to apply")
+    down = commands.add_parser("down", help="Roll back applied migrations")
+    down.add_argument("steps", nargs="?", type=int, default=1, help="Number of migrations to roll back")
+    base = commands.add_parser("baseline", help="Mark migrations as applied without running them")
+    base.add_argument("version", type=int, help="Last version that is already in the database")
+    commands.add_parser("check", help="EXPLAIN the registered queries and fail on sequential scans of large tables")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "status":
+            for row in status():
+                state = "missing file" if row["missing"] else (f"applied {row['applied_at']:%Y-%m-%d %H:%M}" if row["applied_at"] else "pending")
+                print(f"{row['version']:04d} {row['name']:<32} {state}")
+        elif args.command == "up":
+            applied = migrate_up(args.target)
+            print("\n".join(f"Applied {filename}" for filename in applied) or "Nothing to apply")
+        elif args.command == "down":
+            rolled_back = migrate_down(args.steps)
+            print("\n".join(f"Rolled back {filename}" for filename in rolled_back) or "Nothing to roll back")
+        elif args.command == "baseline":
+            marked = baseline(args.version)
+            print("\n".join(f"Marked {filename} as applied" for filename in marked) or "Nothing to mark")
+        else:
+            problems = check_query_plans()
+            for problem in problems:
+                if "error" in problem:
+                    print(f"{problem['query']}: {problem['error']}")
+                else:
+                    print(f"{problem['query']}: sequential scan on {problem['table']} (~{problem['rows']} rows), filter {problem['filter']}")
+            print(f"{len(registered_queries())} queries checked, {len(problems)} problems")
+            return 1 if problems else 0
+        return 0
+    except Exception as e:
+        print(f"Migration failed: {str(e)}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+def create_schema_migrations_query() -> str:
+    """
+    Returns a SQL query that creates the table recording which migrations are applied.
+
+    Returns:
+        str: A SQL query string.
+    """
+    return """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """
+
+def lock_migrations_query() -> str:
+    """
+    Returns a SQL query that takes a transaction level advisory lock, so two deploys
+    cannot apply migrations at the same time.
+
+    Returns:
+        str: A SQL query string.
+    """
+    return """
+        SELECT pg_advisory_xact_lock(hashtext('schema_migrations'));
+    """
+
+def get_applied_migrations_query() -> str:
+    """
+    Returns a SQL query that lists the applied migrations, oldest first.
+
+    Returns:
+        str: A SQL query string.
+    """
+    return """
+        SELECT version, name, applied_at
+        FROM schema_migrations
+        ORDER BY version;
+    """
+
+def insert_migration_query() -> str:
+    """
+    Returns a SQL query that records a migration as applied.
+
+    Returns:
+        str: A SQL query string with placeholders for version and name.
+    """
+    return """
+        INSERT INTO schema_migrations (version, name)
+        VALUES (%(version)s, %(name)s)
+        ON CONFLICT (version) DO NOTHING;
+    """
+
+def delete_migration_query() -> str:
+    """
+    Returns a SQL query that records a migration as rolled back.
+
+    Returns:
+        str: A SQL query string with a placeholder for version.
+    """
+    return """
+        DELETE FROM schema_migrations
+        WHERE version = %(version)s;
+    """
+
+def get_table_sizes_query() -> str:
+    """
+    Returns a SQL query with the estimated row count of each table and the table that
+    partitions belong to, so partitions are judged by their parent's name.
+
+    Returns:
+        str: A SQL query string.
+    """
+    return """
+        SELECT c.relname, COALESCE(parent.relname, c.relname), GREATEST(c.reltuples, 0)::BIGINT
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+        LEFT JOIN pg_class parent ON parent.oid = i.inhparent
+        WHERE n.nspname = current_schema()
+        AND c.relkind IN ('r', 'p');
+    """
@@ -1,6 +1,8 @@
+from api.database import read_only
+
 def get_points_query() -> str:
     """
-    Returns a SQL query to retrieve the points for a user based on their email.
+    Returns a SQL query to retrieve the points for a user based on their user id.
     
     Returns:
         str: SQL query string.
@@ -8,77 +10,324 @@ def get_points_query() -> str:
     return """
         SELECT points
         FROM user_points
-        WHERE email = %(email)s;
+        WHERE user_id = %(user_id)s;
     """
 
-def update_user_point_query() -> str:
+def credit_points_query() -> str:
     """
-    Returns a SQL query to update the points for a user based on their email.
+    Returns a SQL query to append a credit entry to the points ledger for an existing user.
+    
+    The user's balance in user_points is updated by the points_ledger trigger.
     
     Returns:
         str: SQL query string.
     """
     return """
-        UPDATE user_points
-        SET points = %(points)s
-        WHERE email = %(email)s;
+        INSERT INTO points_ledger (user_id, entry_type, points, source)
+        SELECT user_id, 'credit', %(points)s, %(source)s
+        FROM user_points
+        WHERE user_id = %(user_id)s;
+    """
+
+def debit_points_query() -> str:
+    """
+    Returns a SQL query to append a debit entry to the points ledger if the user has enough points.
+    
+    The user_points row is locked, so a concurrent debit waits and rechecks the balance it
+    left instead of both passing the check and the second failing the points >= 0 constraint.
+    
+    Returns:
+        str: SQL query string.
+    """
+    return """
+        INSERT INTO points_ledger (user_id, entry_type, points, source)
+        SELECT user_id, 'debit', -%(points)s, %(source)s
+        FROM user_points
+        WHERE user_id = %(user_id)s AND points >= %(points)s
+        FOR UPDATE;
+    """
+
+@read_only
+def get_points_history_query() -> str:
+    """
+    Returns a SQL query to retrieve the most recent ledger entries of a user.
+    
+    Returns:
+        str: SQL query string.
+    """
+    return """
+        SELECT id, entry_type, points, source, created
+        FROM points_ledger
+        WHERE user_id = %(user_id)s
+        ORDER BY created DESC
+        LIMIT %(limit)s;
     """
 
 def insert_points_data_query() -> str:
     """
     Returns a SQL query to insert points data into the points table.
     
+    Codes are passed encoded (code_codec.encode_code()) in parallel arrays, with the status
+    as the scanned flag. A single statement lets the points_code_unique trigger check the
+    whole batch at once.
+    
     Returns:
         str: SQL query string.
     """
     return """
-        INSERT INTO points(points_code, status, points_value, expiry_date)
-        VALUES(%(points)s, %(status)s, %(points_value)s, %(expiry_date)s);
+        INSERT INTO points(points_code, scanned, points_value, expiry_date)
+        SELECT *
+        FROM unnest(%(codes)s::bigint[], %(scanned)s::boolean[], %(points_values)s::int[], %(expiry_dates)s::date[]);
     """
 
-def get_pin_validate_query() -> str:
+def count_points_codes_query() -> str:
     """
-    Returns a SQL query to validate pin codes, checking their status and updating them if valid.
+    Returns a SQL query to count all issued points codes, live and archived.
     
-    The query processes an array of pin codes and input dates, determines their validity based on 
-    status and expiry date, updates valid pins to 'scanned', and returns their status and point values.
+    Returns:
+        str: SQL query string.
+    """
+    return """
+        SELECT (SELECT COUNT(*) FROM points) + (SELECT COUNT(*) FROM points_archive);
+    """
+
+def get_all_points_codes_query() -> str:
+    """
+    Returns a SQL query to list every issued points code, encoded, used to build the in-memory code filter.
+    
+    Returns:
+        str: SQL query string.
+    """
+    return """
+        SELECT points_code FROM points
+        UNION ALL
+        SELECT points_code FROM points_archive;
+    """
+
+def get_points_mint_generation_query() -> str:
+    """
+    Returns a SQL query to read the shared counter bumped by every insert into points.
     
     Returns:
         str: SQL query string.
     """
-    PIN_VALIDATION_QUERY = """
+    return """
+        SELECT generation FROM points_mint_generation;
+    """
+
+def get_existing_points_codes_query() -> str:
+    """
+    Returns a SQL query to find which of the given encoded codes were already issued, live or archived.
+    
+    Returns:
+        str: SQL query string.
+    """
+    return """
+        SELECT points_code FROM points WHERE points_code = ANY(%(codes)s::bigint[])
+        UNION ALL
+        SELECT points_code FROM points_archive WHERE points_code = ANY(%(codes)s::bigint[]);
+    """
+
+# Shared by get_pin_validate_query() and get_pin_validate_batch_query(), which select from results
+PIN_VALIDATION_CTES = """
         WITH input AS (
             SELECT points_code
-            FROM unnest(%s::text[]) AS points_code
+            FROM unnest(%(codes)s::bigint[]) AS points_code
         ),
         to_update AS (
-            SELECT p.points_code
+            SELECT p.points_code, p.expiry_date
             FROM points p
             JOIN input i ON p.points_code = i.points_code
-            WHERE p.status = 'not_scanned' AND p.expiry_date >= CURRENT_DATE
+            WHERE NOT p.scanned AND p.expiry_date >= CURRENT_DATE
+            AND EXISTS (SELECT 1 FROM user_points WHERE user_id = %(user_id)s)
         ),
         updated AS (
             UPDATE points p
-            SET status = 'scanned'
+            SET scanned = true
             FROM to_update tu
-            WHERE p.points_code = tu.points_code
+            WHERE p.points_code = tu.points_code AND p.expiry_date = tu.expiry_date
             RETURNING p.points_code, p.points_value
+        ),
+        credited AS (
+            INSERT INTO points_ledger (user_id, entry_type, points, source)
+            SELECT %(user_id)s, 'credit', COALESCE(points_value, 0), decode_points_code(points_code)
+            FROM updated
+        ),
+        results AS (
+            SELECT 
+                i.points_code,
+                CASE
+                    WHEN p.points_code IS NULL AND pa.points_code IS NULL THEN 'not_in_system'
+                    WHEN u.points_code IS NOT NULL THEN 'success'
+                    WHEN COALESCE(p.scanned, pa.scanned) THEN 'already_scanned'
+                    WHEN COALESCE(p.expiry_date, pa.expiry_date) < CURRENT_DATE THEN 'expired'
+                    ELSE 'invalid'
+                END AS status,
+                COALESCE(p.points_value, pa.points_value, 0) AS points_value
+            FROM input i
+            LEFT JOIN points p ON p.points_code = i.points_code
+            LEFT JOIN points_archive pa ON p.points_code IS NULL AND pa.points_code = i.points_code
+            LEFT JOIN updated u ON i.points_code = u.points_code
+        )"""
+
+def get_pin_validate_query() -> str:
+    """
+    Returns a SQL query to validate pin codes, checking their status and updating them if valid.
+    
+    The query processes an array of pin codes and input dates, determines their validity based on 
+    status and expiry date, marks valid pins as scanned, and returns their status and point values.
+    Every scanned pin is credited to the user as one points_ledger entry in the same statement, so
+    the scan and the credit commit together. Codes are only scanned for users that exist in user_points.
+    Codes that are no longer in the live points partitions are classified from points_archive.
+    Codes are passed and returned encoded (code_codec.encode_code()); the ledger source keeps
+    the code text.
+    
+    Returns:
+        str: SQL query string.
+    """
+    return PIN_VALIDATION_CTES + """
+        SELECT points_code, status, points_value FROM results;
+    """
+
+def get_pin_validate_batch_query() -> str:
+    """
+    Returns get_pin_validate_query() for an idempotent scan batch: the same statement also marks the
+    batch 'completed' with its result, so a batch whose scan committed can never be reclaimed and re-run.
+    
+    %(recorded)s holds the outcome of the codes rejected before the query, in the shape of the result
+    (counts and the rejected list); the counts of the scanned codes are added to it.
+    
+    Returns:
+        str: SQL query string.
+    """
+    return PIN_VALIDATION_CTES + """,
+        recorded AS (
+            UPDATE scan_batches
+            SET status = 'completed', codes = NULL, updated = CURRENT_TIMESTAMP,
+                result = (
+                    SELECT %(recorded)s::jsonb || jsonb_build_object(
+                        'success_pins', (%(recorded)s::jsonb ->> 'success_pins')::INT + count(*) FILTER (WHERE status = 'success'),
+                        'already_scanned', (%(recorded)s::jsonb ->> 'already_scanned')::INT + count(*) FILTER (WHERE status = 'already_scanned'),
+                        'not_in_system', (%(recorded)s::jsonb ->> 'not_in_system')::INT + count(*) FILTER (WHERE status = 'not_in_system'),
+                        'expired', (%(recorded)s::jsonb ->> 'expired')::INT + count(*) FILTER (WHERE status = 'expired'),
+                        'invalid', (%(recorded)s::jsonb ->> 'invalid')::INT + count(*) FILTER (WHERE status = 'invalid'),
+                        'total_points', (%(recorded)s::jsonb ->> 'total_points')::BIGINT
+                            + COALESCE(sum(points_value) FILTER (WHERE status = 'success'), 0)
+                    )
+                    FROM results
+                )
+            WHERE batch_id = %(batch_id)s
         )
-        SELECT 
-            i.points_code,
-            CASE
-                WHEN p.points_code IS NULL THEN 'not_in_system'
-                WHEN u.points_code IS NOT NULL THEN 'success'
-                WHEN p.status = 'scanned' THEN 'already_scanned'
-                WHEN p.expiry_date < CURRENT_DATE THEN 'expired'
-                ELSE 'invalid'
-            END AS status,
-            COALESCE(p.points_value, 0) AS points_value
-        FROM input i
-        LEFT JOIN points p ON p.points_code = i.points_code
-        LEFT JOIN updated u ON i.points_code = u.points_code;
-"""
-    return PIN_VALIDATION_QUERY
+        SELECT points_code, status, points_value FROM results;
+    """
+
+
+def claim_scan_batch_query() -> str:
+    """
+    Returns a SQL query to claim a scan batch for processing by its idempotency key.
+    
+    A new batch id is inserted directly. An existing batch is only reclaimed when its
+    previous attempt failed or has been stuck in 'pending'/'processing' for longer than
+    the stale interval; otherwise no row is returned and the caller replays the stored outcome.
+    
+    Returns:
+        str: SQL query string.
+    """
+    return """
+        INSERT INTO scan_batches (batch_id, email, status, codes)
+        VALUES (%(batch_id)s, %(email)s, %(status)s, %(codes)s::jsonb)
+        ON CONFLICT (batch_id) DO UPDATE
+        SET status = EXCLUDED.status,
+            codes = EXCLUDED.codes,
+            updated = CURRENT_TIMESTAMP
+        WHERE scan_batches.email = EXCLUDED.email
+        AND (
+            scan_batches.status = 'failed'
+            OR (
+                scan_batches.status IN ('pending', 'processing')
+                AND scan_batches.updated < CURRENT_TIMESTAMP - make_interval(mins => %(stale_minutes)s)
+            )
+        )
+        RETURNING batch_id;
+    """
+
+def start_scan_batch_query() -> str:
+    """
+    Returns a SQL query to move a pending scan batch to 'processing' and fetch its codes.
+    
+    Returns:
+        str: SQL query string.
+    """
+    return """
+        UPDATE scan_batches
+        SET status = 'processing', updated = CURRENT_TIMESTAMP
+        WHERE batch_id = %(batch_id)s AND status = 'pending'
+        RETURNING email, codes;
+    """
+
+def get_scan_batch_query() -> str:
+    """
+    Returns a SQL query to retrieve a scan batch by its idempotency key.
+    
+    Returns:
+        str: SQL query string.
+    """
+    return """
+        SELECT batch_id, email, status, result, created, updated
+        FROM scan_batches
+        WHERE batch_id = %(batch_id)s;
+    """
+
+def complete_scan_batch_query() -> str:
+    """
+    Returns a SQL query to store the outcome of a processed scan batch.
+    
+    The submitted codes are dropped once the result is recorded, replays only need the result.
+    
+    Returns:
+        str: SQL query string.
+    """
+    return """
+        UPDATE scan_batches
+        SET status = 'completed', result = %(result)s::jsonb, codes = NULL, updated = CURRENT_TIMESTAMP
+        WHERE batch_id = %(batch_id)s AND status <> 'completed';
+    """
+
+def fail_scan_batch_query() -> str:
+    """
+    Returns a SQL query to mark a scan batch as failed so that a retry can reclaim it.
+    
+    Returns:
+        str: SQL query string.
+    """
+    return """
+        UPDATE scan_batches
+        SET status = 'failed', result = %(result)s::jsonb, updated = CURRENT_TIMESTAMP
+        WHERE batch_id = %(batch_id)s AND status <> 'completed';
+    """
+
+def ensure_points_partitions_query() -> str:
+    """
+    Returns a SQL query to create the monthly points partitions up to the given expiry date.
+    
+    Returns:
+        str: SQL query string.
+    """
+    return """
+        SELECT ensure_points_partitions(%(until_date)s::date);
+    """
+
+def archive_points_query() -> str:
+    """
+    Returns a SQL query to move a batch of scanned or expired codes to points_archive
+    and drop fully expired partitions.
+    
+    Returns:
+        str: SQL query string.
+    """
+    return """
+        SELECT archive_points(%(batch_size)s);
+    """
 
 params = [
     {'points': '48390215ABCD', 'status': 'not_scanned', 'points_value': 10, 'expiry_date': '2025-01-01'},  # Expired
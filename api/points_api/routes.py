@@ -1,9 +1,25 @@
+import json
+import logging
+from itertools import islice
 from api.blueprints import points
-from flask import jsonify, request
+from flask import Response, jsonify, request, stream_with_context
 from datetime import datetime
-from api.points_api.utils.points_util import execute_pin_validation, get_user_points,redeem_user_points, add_user_points
+from api.points_api.utils.points_util import execute_pin_validation, get_user_points,redeem_user_points, get_points_history, scan_codes, new_scan_summary
+from api.points_api.utils.batch_util import normalize_batch_id, claim_scan_batch, get_scan_batch, fail_scan_batch, process_scan_batch, submit_scan_batch
+from api.points_api.utils.scan_monitor import scan_monitor
 from api.login_api.utils.validate_utils import validate_email
+from api.config import ASYNC_SCAN_BATCH_THRESHOLD, RATE_LIMIT_SCAN, RATE_LIMIT_SCAN_IP, CARTON_SCAN_CHUNK_SIZE, CARTON_SCAN_MAX_CODES
+from api.rate_limiter import limiter
 from psycopg2 import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+limiter.limit(points, RATE_LIMIT_SCAN, key="email", endpoint="validate_points")
+limiter.limit(points, RATE_LIMIT_SCAN_IP, key="ip", endpoint="validate_points")
+limiter.limit(points, RATE_LIMIT_SCAN, key="email", endpoint="scan_carton")
+limiter.limit(points, RATE_LIMIT_SCAN_IP, key="ip", endpoint="scan_carton")
+
+NDJSON = "application/x-ndjson"
 # @points.route('/')
 # def home():
 #     return jsonify({"message": "This is home page"}), 200
@@ -31,15 +47,15 @@ def redeem_points():
         if points > user_points:
             return jsonify({"message":"Insuficient points"}), 400
 
-        response = redeem_user_points(email,points)
+        response = redeem_user_points(email,points,"redeem_points")
         if not response:
             return jsonify({"message":"Unable to redeem points"}), 400
         return jsonify({"message":"Points redeemed","remaining points":user_points - points,"points redeemed":points},), 200
     except DatabaseError as de:
-        print(f"Error {str(e)}")
+        logger.error(f"Error {str(de)}")
         return jsonify({"message":"Database error occured"}), 500
     except Exception as e:
-        print(f"Error in :{str(e)}")
+        logger.exception(f"Error in :{str(e)}")
         return jsonify({"error":"Internal server error"}), 500
 
 @points.route('/get_points', methods=["GET","POST"])
@@ -63,11 +79,11 @@ def get_points():
             return jsonify({"message":"Unable to find points, please try later"}), 400
         return jsonify({"points": points}), 200
     except DatabaseError as de:
-        print(f"Error: {str(de)}")
+        logger.error(f"Error: {str(de)}")
         return jsonify({"message":"Database error occured"}), 500
 
     except Exception as e:
-        print(f"Error in {str(e)}")
+        logger.exception(f"Error in {str(e)}")
         return jsonify({"error":"Internal server error"}), 500
     
 @points.route('/validate_points',methods=["PUT"])
@@ -85,21 +101,200 @@ def validate_points():
             return jsonify({"message":"Emial required"}), 400
         
         email = email.strip()
-        response = execute_pin_validation(points)
+        
+        if scan_monitor is not None and scan_monitor.is_throttled(email):
+            return jsonify({"message":"Too many suspicious scans, please try later"}), 429
+        
+        if "batch_id" in data:
+            return validate_points_batch(data.get("batch_id"), email, points)
+        
+        # Scanned codes are credited to the user in the same statement
+        response = execute_pin_validation(points, email)
         
         if not response:
             return jsonify({"message":"Unable to process"}), 400
-        total_points = response.get("total_points")
-        
-        if int(total_points) > 0:
-            update_point = add_user_points(email, int(total_points))
-            if not update_point:
-                return jsonify({"message":"Not able to update point"}), 400
         return jsonify({"message":"Points updated","details":response}), 200
     except DatabaseError as de:
-        print(f"Error in {str(de)}")
+        logger.error(f"Error in {str(de)}")
         return jsonify({"message":"Database error occured"}), 500
     except Exception as e:
-        print(f"Error in {str(e)}")
+        logger.exception(f"Error in {str(e)}")
         return jsonify({"message":"Internal server error"}), 500
+
+def ndjson_codes(stream):
+    """Codes from an NDJSON body, one JSON string or {"points_code": ...} per line, read as they arrive."""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            # Reported back as an invalid entry
+            yield {"line": line[:100].decode("utf-8", "replace")}
+            continue
+        yield item.get("points_code", item) if isinstance(item, dict) else item
+
+def scan_result(code, status: str, value: int, reason) -> dict:
+    """One code's entry in a carton scan; codes rejected before the lookup carry the reason."""
+    result = {"points_code":code, "status":status, "points_value":value}
+    if reason:
+        result["reason"] = reason
+    return result
+
+@points.route('/scan_carton', methods=["POST"])
+def scan_carton():
+    """
+    Scans a carton of codes CARTON_SCAN_CHUNK_SIZE at a time and streams every code's status
+    as its chunk is committed, then a summary. Takes {"email", "points"} as JSON, or NDJSON
+    with one code per line and the email in ?email=. Answers NDJSON when sent NDJSON or
+    asked for it in Accept, otherwise a JSON document {"results", "summary"}.
+    """
+    try:
+        if request.mimetype == NDJSON:
+            email = request.args.get("email")
+            codes = ndjson_codes(request.stream)
+        elif request.is_json:
+            data = request.get_json()
+            email = data.get("email")
+            codes = data.get("points")
+            if not isinstance(codes, list) or not codes:
+                return jsonify({"message":"Points must be a non-empty list of codes"}), 400
+            if len(codes) > CARTON_SCAN_MAX_CODES:
+                return jsonify({"message":f"At most {CARTON_SCAN_MAX_CODES} codes per carton"}), 400
+        else:
+            return jsonify({"error":f"JSON or {NDJSON} data required"}), 400
         
+        if not email or not validate_email(email.strip()):
+            return jsonify({"message":"Valid email required"}), 400
+        email = email.strip()
+        if scan_monitor is not None and scan_monitor.is_throttled(email):
+            return jsonify({"message":"Too many suspicious scans, please try later"}), 429
+    except Exception as e:
+        logger.exception(f"Error in {str(e)}")
+        return jsonify({"message":"Internal server error"}), 500
+    
+    as_ndjson = request.mimetype == NDJSON or request.accept_mimetypes.best == NDJSON
+    codes = iter(codes)
+    
+    def generate():
+        summary = new_scan_summary()
+        error = None
+        first = True
+        if not as_ndjson:
+            yield '{"results":['
+        try:
+            for results in scan_codes(islice(codes, CARTON_SCAN_MAX_CODES), email, CARTON_SCAN_CHUNK_SIZE, summary):
+                lines = [json.dumps(scan_result(*result), default=str) for result in results]
+                if as_ndjson:
+                    yield "".join(line + "\n" for line in lines)
+                else:
+                    yield ("" if first else ",") + ",".join(lines)
+                first = False
+                if scan_monitor is not None and scan_monitor.is_throttled(email):
+                    error = "Too many suspicious scans, please try later"
+                    break
+            else:
+                more = object()
+                if next(codes, more) is not more:
+                    error = f"At most {CARTON_SCAN_MAX_CODES} codes per carton, the rest were not read"
+        except Exception as e:
+            logger.exception(f"Error in {str(e)}")
+            error = "Scan interrupted, only the codes reported were processed"
+        
+        trailer = {"summary":summary}
+        if error is not None:
+            trailer["error"] = error
+        if as_ndjson:
+            yield json.dumps(trailer) + "\n"
+        else:
+            yield "]," + json.dumps(trailer)[1:]
+    
+    response = Response(stream_with_context(generate()), mimetype=NDJSON if as_ndjson else "application/json")
+    # Proxies must pass each chunk on instead of buffering the whole response
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@points.route('/history', methods=["GET","POST"])
+def points_history():
+    try:
+        if not request.is_json:
+            return jsonify({"error": "JSON data required"}), 400
+
+        data = request.get_json()
+        email = data.get('email')
+        limit = data.get('limit', 50)
+        
+        if not email:
+            return jsonify({"error": "Email required"}), 400
+        email = email.strip()
+        if not validate_email(email):
+            return jsonify({"error": "Invalid email format"}), 400
+        if not isinstance(limit, int) or limit <= 0:
+            return jsonify({"error": "Limit must be a positive integer"}), 400
+
+        history = get_points_history(email, min(limit, 500))
+        return jsonify({"history": history}), 200
+    except DatabaseError as de:
+        logger.error(f"Error: {str(de)}")
+        return jsonify({"message":"Database error occured"}), 500
+    except Exception as e:
+        logger.exception(f"Error in {str(e)}")
+        return jsonify({"error":"Internal server error"}), 500
+
+def scan_batch_response(batch: dict, email: str):
+    """Builds the response for a batch id that was already submitted."""
+    if batch["email"] != email:
+        return jsonify({"message":"Batch id already used by another user"}), 409
+    if batch["status"] == "completed":
+        return jsonify({"message":"Points updated","details":batch["result"],"batch_id":batch["batch_id"],"replayed":True}), 200
+    return jsonify({"message":"Batch is being processed","batch_id":batch["batch_id"],"status":batch["status"]}), 202
+
+def validate_points_batch(batch_id, email: str, points: list):
+    """
+    Idempotent variant of validate_points keyed by a client generated batch UUID.
+    Replays return the recorded outcome; batches above ASYNC_SCAN_BATCH_THRESHOLD are queued
+    and can be polled through /batch_status/<batch_id>.
+    """
+    batch_id = normalize_batch_id(batch_id)
+    if not batch_id:
+        return jsonify({"message":"batch_id must be a valid UUID"}), 400
+    if not isinstance(points, list) or not all(isinstance(code, str) and code for code in points):
+        return jsonify({"message":"Points must be a list of codes"}), 400
+    
+    if len(points) > ASYNC_SCAN_BATCH_THRESHOLD:
+        if not submit_scan_batch(batch_id, email, points):
+            return scan_batch_response(get_scan_batch(batch_id), email)
+        # Hosts without a background job runner validate the batch inside the request
+        batch = get_scan_batch(batch_id)
+        if batch and batch["status"] == "completed":
+            return jsonify({"message":"Points updated","details":batch["result"],"batch_id":batch_id}), 200
+        return jsonify({"message":"Batch accepted","batch_id":batch_id,"status":batch["status"] if batch else "pending"}), 202
+    
+    if not claim_scan_batch(batch_id, email):
+        return scan_batch_response(get_scan_batch(batch_id), email)
+    try:
+        response = process_scan_batch(batch_id, email, points)
+    except Exception as e:
+        # Does not touch a batch that its scan statement completed
+        fail_scan_batch(batch_id, str(e))
+        raise
+    return jsonify({"message":"Points updated","details":response,"batch_id":batch_id}), 200
+
+@points.route('/batch_status/<batch_id>', methods=["GET"])
+def batch_status(batch_id):
+    try:
+        batch_id = normalize_batch_id(batch_id)
+        if not batch_id:
+            return jsonify({"message":"batch_id must be a valid UUID"}), 400
+        
+        batch = get_scan_batch(batch_id)
+        if not batch:
+            return jsonify({"message":"Batch not found"}), 404
+        return jsonify({"batch_id":batch["batch_id"],"status":batch["status"],"details":batch["result"]}), 200
+    except DatabaseError as de:
+        logger.error(f"Error in {str(de)}")
+        return jsonify({"message":"Database error occured"}), 500
+    except Exception as e:
+        logger.exception(f"Error in {str(e)}")
+        return jsonify({"message":"Internal server error"}), 500
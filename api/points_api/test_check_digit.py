@@ -0,0 +1,105 @@
+import string
+import pytest
+from api.points_api.utils import points_util
+from api.points_api.utils.code_codec import check_digit, code_rejection, encode_code, generate_codes, CHECK_POSITION, CHECK_DIGIT, MALFORMED
+
+CODES = generate_codes(200)
+
+
+def value(char: str) -> int:
+    return ord(char) - (48 if char <= "9" else 65)
+
+
+def test_generated_codes_are_distinct_and_valid():
+    assert len(set(CODES)) == 200
+    for code in CODES:
+        assert code_rejection(code, require_check_digit=True) is None
+        assert check_digit(code) == int(code[CHECK_POSITION])
+
+
+def test_check_digit_ignores_its_own_position():
+    code = CODES[0]
+    for digit in string.digits:
+        assert check_digit(code[:CHECK_POSITION] + digit + code[CHECK_POSITION + 1:]) == check_digit(code)
+
+
+@pytest.mark.parametrize("code", CODES[:50])
+def test_every_wrong_digit_is_detected(code):
+    for position in range(8):
+        if position == CHECK_POSITION:
+            continue
+        for digit in string.digits:
+            if digit != code[position]:
+                typo = code[:position] + digit + code[position + 1:]
+                assert code_rejection(typo, require_check_digit=True) == CHECK_DIGIT
+
+
+@pytest.mark.parametrize("code", CODES[:50])
+def test_wrong_letters_are_detected_unless_11_or_22_apart(code):
+    for position in range(8, 12):
+        for letter in string.ascii_uppercase:
+            if letter == code[position]:
+                continue
+            typo = code[:position] + letter + code[position + 1:]
+            detected = code_rejection(typo, require_check_digit=True) == CHECK_DIGIT
+            assert detected == ((value(letter) - value(code[position])) % 11 != 0)
+
+
+@pytest.mark.parametrize("code", CODES[:50])
+def test_swapped_neighbours_are_detected_unless_11_or_22_apart(code):
+    for position in range(11):
+        if CHECK_POSITION in (position, position + 1) or code[position] == code[position + 1]:
+            continue
+        swapped = code[:position] + code[position + 1] + code[position] + code[position + 2:]
+        detected = code_rejection(swapped, require_check_digit=True) == CHECK_DIGIT
+        assert detected == ((value(code[position]) - value(code[position + 1])) % 11 != 0)
+
+
+def test_check_digit_is_only_enforced_when_required():
+    code = CODES[0]
+    wrong = str((int(code[CHECK_POSITION]) + 1) % 10)
+    typo = code[:CHECK_POSITION] + wrong + code[CHECK_POSITION + 1:]
+
+    assert code_rejection(typo, require_check_digit=True) == CHECK_DIGIT
+    assert code_rejection(typo, require_check_digit=False) is None
+
+
+@pytest.mark.parametrize("code", ["", "1234567ABCD", "12345678abcd", "12345678ABCDE", None, 12345678])
+def test_malformed_codes_are_rejected_before_the_check_digit(code):
+    assert code_rejection(code, require_check_digit=True) == MALFORMED
+
+
+class Issued:
+    """Stands in for the issued codes lookup: the first lookup finds the first code taken."""
+
+    def __init__(self):
+        self.lookups = []
+
+    def __call__(self, query, params=None, fetch_results=False):
+        self.lookups.append(params["codes"])
+        return [(params["codes"][0],)] if len(self.lookups) == 1 else []
+
+
+def test_mint_redraws_codes_that_were_issued(monkeypatch):
+    issued, inserted = Issued(), []
+    monkeypatch.setattr(points_util, "execute_query", issued)
+    monkeypatch.setattr(points_util, "insert_points_data", inserted.extend)
+
+    codes = points_util.mint_points_codes(5, 10, "2030-01-01")
+
+    assert len(issued.lookups) == 2
+    assert issued.lookups[0][0] not in [encode_code(code) for code in codes]
+    assert sorted(set(codes)) == codes and len(codes) == 5
+    assert [item["points"] for item in inserted] == codes
+
+
+@pytest.mark.parametrize("count", [0, -1, "5", 10 ** 9])
+def test_mint_rejects_bad_counts(count):
+    with pytest.raises(ValueError):
+        points_util.mint_points_codes(count, 10, "2030-01-01")
+
+
+@pytest.mark.parametrize("codes", [["48390215abcd"], ["48390215ABCD", "48390215ABCD"]])
+def test_insert_rejects_codes_scans_would_reject(codes):
+    with pytest.raises(ValueError):
+        points_util.insert_points_data([{"points": code, "points_value": 10, "expiry_date": "2030-01-01"} for code in codes])
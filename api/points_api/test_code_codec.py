@@ -0,0 +1,87 @@
+import os
+import random
+import re
+import pytest
+from api.points_api.utils.code_codec import encode_code, decode_code, MAX_PACKED
+
+MIGRATION = os.path.join(os.path.dirname(__file__), "..", "..", "migrations", "0008_compact_points_codes.sql")
+
+EDGE_CODES = ["00000000AAAA", "00000000AAAB", "00000001AAAA", "48390215ABCD", "99999999ZZZY", "99999999ZZZZ"]
+
+
+def random_codes(count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [f"{rng.randrange(10 ** 8):08d}" + "".join(chr(65 + rng.randrange(26)) for _ in range(4))
+            for _ in range(count)]
+
+
+@pytest.mark.parametrize("code", EDGE_CODES + random_codes(200, seed=1))
+def test_round_trip(code):
+    encoded = encode_code(code)
+
+    assert decode_code(encoded) == code
+    assert encoded % 97 == 1
+    assert 0 <= encoded < 2 ** 63
+
+
+def test_encoding_sorts_like_the_code_text():
+    codes = sorted(set(EDGE_CODES + random_codes(500, seed=2)))
+
+    assert [encode_code(code) for code in codes] == sorted(encode_code(code) for code in codes)
+
+
+@pytest.mark.parametrize("code", ["", "4839021ABCD", "48390215abcd", "48390215ABCDE", "A8390215ABCD", " 48390215ABCD", 48390215, None])
+def test_encode_rejects_malformed_codes(code):
+    with pytest.raises(ValueError):
+        encode_code(code)
+
+
+def test_decode_rejects_numbers_that_were_not_encoded():
+    encoded = encode_code("48390215ABCD")
+
+    # Any change of less than 97 breaks the MOD 97-10 check digits
+    for delta in (1, 2, 10, 96, -1):
+        with pytest.raises(ValueError):
+            decode_code(encoded + delta)
+
+
+@pytest.mark.parametrize("encoded", [-96, MAX_PACKED * 100 + 1, "4839021500000098", 1.0, None])
+def test_decode_rejects_out_of_range_values(encoded):
+    with pytest.raises(ValueError):
+        decode_code(encoded)
+
+
+def sql_functions() -> list[str]:
+    """The encode/decode functions of the migration, created in pg_temp so no schema is needed."""
+    with open(MIGRATION) as migration:
+        up = migration.read().split("-- migrate:down")[0]
+    functions = re.findall(r"CREATE FUNCTION \w+_points_code\(.*?\$\$ LANGUAGE sql IMMUTABLE;", up, re.S)
+    assert len(functions) == 2
+    return [function.replace("CREATE FUNCTION ", "CREATE FUNCTION pg_temp.") for function in functions]
+
+
+def test_sql_functions_match_the_python_codec(database):
+    codes = EDGE_CODES + random_codes(1000, seed=3)
+    with database.cursor() as cursor:
+        for function in sql_functions():
+            cursor.execute(function)
+        cursor.execute("""
+            SELECT code, pg_temp.encode_points_code(code), pg_temp.decode_points_code(pg_temp.encode_points_code(code))
+            FROM unnest(%s::text[]) AS code
+        """, (codes,))
+        rows = cursor.fetchall()
+
+    assert [(code, encode_code(code), code) for code in codes] == rows
+
+
+def test_sql_functions_return_null_for_invalid_input(database):
+    encoded = encode_code("48390215ABCD")
+    with database.cursor() as cursor:
+        for function in sql_functions():
+            cursor.execute(function)
+        cursor.execute("""
+            SELECT pg_temp.encode_points_code('48390215abcd'), pg_temp.encode_points_code('4839021ABCD'),
+                   pg_temp.decode_points_code(%s), pg_temp.decode_points_code(-96)
+        """, (encoded + 1,))
+
+        assert cursor.fetchone() == (None, None, None, None)
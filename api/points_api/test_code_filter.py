@@ -0,0 +1,159 @@
+import random
+import time
+import pytest
+from api.points_api.utils import code_filter as code_filter_module
+from api.points_api.utils.code_filter import BloomFilter, CodeFilter
+
+
+def random_codes(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return rng.sample(range(10 ** 12), count)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    codes = random_codes(20000, seed=1)
+    bloom = BloomFilter(len(codes), 0.01)
+    for code in codes:
+        bloom.add(code)
+
+    assert all(code in bloom for code in codes)
+    assert bloom.count == len(codes)
+
+
+def test_bloom_filter_false_positive_rate_near_target():
+    members = random_codes(20000, seed=2)
+    bloom = BloomFilter(len(members), 0.01)
+    for code in members:
+        bloom.add(code)
+
+    others = set(random_codes(20000, seed=3)) - set(members)
+    false_positives = sum(code in bloom for code in others)
+    assert false_positives / len(others) < 0.03
+    assert bloom.false_positive_rate() == pytest.approx(0.01, rel=0.5)
+
+
+def test_empty_bloom_filter_contains_nothing():
+    bloom = BloomFilter(100, 0.01)
+    assert not any(code in bloom for code in range(1000))
+
+
+@pytest.mark.parametrize("capacity, error_rate", [(0, 0.01), (-1, 0.01), (100, 0), (100, 1)])
+def test_bloom_filter_rejects_invalid_sizes(capacity, error_rate):
+    with pytest.raises(ValueError):
+        BloomFilter(capacity, error_rate)
+
+
+@pytest.fixture
+def code_filter(monkeypatch):
+    """A built CodeFilter over codes 1-100 at mint generation 7, without a database."""
+    code_filter = CodeFilter(0.01, 1000, 3600)
+    bloom = BloomFilter(1000, 0.01)
+    for code in range(1, 101):
+        bloom.add(code)
+    code_filter._filter = bloom
+    code_filter._generation = 7
+    code_filter._built_at = time.monotonic()
+    code_filter.builds = 0
+
+    def start_build():
+        code_filter.builds += 1
+        return True
+
+    monkeypatch.setattr(code_filter, "start_build", start_build)
+    monkeypatch.setattr(code_filter, "_current_generation", lambda: 7)
+    return code_filter
+
+
+def test_partition_reports_misses_while_generation_unchanged(code_filter):
+    candidates, unknown = code_filter.partition([5, 50, 10 ** 9 + 1])
+
+    assert 5 in candidates and 50 in candidates
+    assert unknown == [10 ** 9 + 1]
+    assert code_filter.builds == 0
+
+
+def test_partition_sends_misses_to_database_after_a_mint_elsewhere(code_filter, monkeypatch):
+    # Another worker or a SQL load inserted codes after the filter was built
+    monkeypatch.setattr(code_filter, "_current_generation", lambda: 8)
+
+    codes = [5, 10 ** 9 + 1]
+    assert code_filter.partition(codes) == (codes, [])
+    assert code_filter.builds == 1
+
+
+def test_partition_trusts_nothing_when_generation_unreadable(code_filter, monkeypatch):
+    def unavailable():
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(code_filter, "_current_generation", unavailable)
+    codes = [5, 10 ** 9 + 1]
+    assert code_filter.partition(codes) == (codes, [])
+
+
+def test_partition_treats_everything_as_candidate_before_first_build(code_filter):
+    code_filter._filter = None
+
+    codes = [5, 10 ** 9 + 1]
+    assert code_filter.partition(codes) == (codes, [])
+    assert code_filter.builds == 1
+
+
+def test_partition_rebuilds_a_stale_filter(code_filter):
+    code_filter._built_at = time.monotonic() - 7200
+
+    code_filter.partition([5])
+    assert code_filter.builds == 1
+
+
+def test_added_codes_are_members(code_filter):
+    code_filter.add([10 ** 9 + 1])
+
+    assert code_filter.partition([10 ** 9 + 1]) == ([10 ** 9 + 1], [])
+
+
+def test_codes_added_during_a_build_are_kept_for_the_new_filter(code_filter):
+    code_filter._building = True
+    code_filter.add([10 ** 9 + 1])
+
+    assert code_filter._pending == [10 ** 9 + 1]
+
+
+@pytest.fixture
+def generation_reads(code_filter, monkeypatch):
+    """Mint generations returned by successive reads, with the reads counted."""
+    reads = {"count": 0, "values": [7]}
+
+    def current_generation():
+        reads["count"] += 1
+        return reads["values"][min(reads["count"], len(reads["values"])) - 1]
+
+    monkeypatch.setattr(code_filter, "_current_generation", current_generation)
+    code_filter.generation_ttl = 60
+    return reads
+
+
+def test_partition_reads_the_generation_once_per_ttl(code_filter, generation_reads):
+    for _ in range(5):
+        assert code_filter.partition([10 ** 9 + 1]) == ([], [10 ** 9 + 1])
+
+    assert generation_reads["count"] == 1
+
+
+def test_partition_rereads_the_generation_after_the_ttl(code_filter, generation_reads):
+    generation_reads["values"] = [7, 8]
+    code_filter.partition([10 ** 9 + 1])
+    code_filter._read_at -= 61
+
+    codes = [5, 10 ** 9 + 1]
+    assert code_filter.partition(codes) == (codes, [])
+    assert generation_reads["count"] == 2
+    assert code_filter.builds == 1
+
+
+def test_partition_reuses_the_generation_read_by_a_build(code_filter, generation_reads, monkeypatch):
+    monkeypatch.setattr(code_filter_module, "execute_query", lambda query, fetch_results=False: [(100,)])
+    monkeypatch.setattr(code_filter_module, "stream_query", lambda query: iter([(code,) for code in range(1, 101)]))
+
+    code_filter._build()
+    assert code_filter.partition([10 ** 9 + 1]) == ([], [10 ** 9 + 1])
+    assert generation_reads["count"] == 1
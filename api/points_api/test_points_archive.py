@@ -0,0 +1,81 @@
+import pytest
+from api.points_api import queris
+from api.points_api.utils import points_util
+from api.points_api.utils.code_codec import encode_code
+
+
+class ArchiveCalls(list):
+    """Statements run by archive_points(); each archive batch moves the next count in moved."""
+
+    def __init__(self):
+        super().__init__()
+        self.moved = []
+
+    def __call__(self, query, params=None, fetch_results=False):
+        self.append((query, params))
+        if query == queris.archive_points_query():
+            return [(self.moved.pop(0),)]
+        return [(0,)]
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = ArchiveCalls()
+    monkeypatch.setattr(points_util, "execute_query_for_points", calls)
+    return calls
+
+
+def test_archive_points_creates_partitions_before_archiving(calls):
+    calls.moved = [0]
+    points_util.archive_points(batch_size=10, max_batches=5)
+
+    assert calls[0][0] == queris.ensure_points_partitions_query()
+    assert all(query == queris.archive_points_query() for query, _ in calls[1:])
+
+
+def test_archive_points_stops_after_a_short_batch(calls):
+    calls.moved = [10, 10, 3, 10]
+
+    assert points_util.archive_points(batch_size=10, max_batches=5) == 23
+    assert len(calls) == 4
+
+
+def test_archive_points_is_capped_at_max_batches(calls):
+    calls.moved = [10] * 5
+
+    assert points_util.archive_points(batch_size=10, max_batches=3) == 30
+    assert len(calls) == 4
+
+
+LIVE, SCANNED, EXPIRED, UNKNOWN = (encode_code(code) for code in ("99990001LIVE", "99990001SCAN", "99990001EXPD", "99990001NONE"))
+
+
+def insert_code(cursor, code, scanned, expiry):
+    cursor.execute(
+        "INSERT INTO points (points_code, scanned, points_value, expiry_date) VALUES (%s, %s, 10, CURRENT_DATE + %s)",
+        (code, scanned, expiry)
+    )
+
+
+def test_archiver_moves_dead_codes_and_validation_still_classifies_them(database, user):
+    cursor = database.cursor()
+    cursor.execute("SELECT ensure_points_partitions(CURRENT_DATE + 60)")
+    insert_code(cursor, LIVE, False, 30)
+    insert_code(cursor, SCANNED, True, 30)
+    insert_code(cursor, EXPIRED, False, -1)
+    codes = [LIVE, SCANNED, EXPIRED, UNKNOWN]
+
+    cursor.execute("SELECT archive_points(100000)")
+    cursor.execute("SELECT points_code FROM points WHERE points_code = ANY(%s)", (codes,))
+    assert cursor.fetchall() == [(LIVE,)]
+    cursor.execute("SELECT points_code FROM points_archive WHERE points_code = ANY(%s) ORDER BY points_code", (codes,))
+    assert cursor.fetchall() == [(EXPIRED,), (SCANNED,)]
+
+    cursor.execute(queris.get_pin_validate_query(), {"codes": codes, "user_id": user})
+    statuses = {points_code: status for points_code, status, _ in cursor.fetchall()}
+    assert statuses == {
+        LIVE: "success",
+        SCANNED: "already_scanned",
+        EXPIRED: "expired",
+        UNKNOWN: "not_in_system"
+    }
@@ -0,0 +1,62 @@
+from api.points_api import queris
+from api.points_api.utils.code_codec import encode_code
+
+
+def balance(cursor, user_id):
+    cursor.execute("SELECT points FROM user_points WHERE user_id = %s", (user_id,))
+    return cursor.fetchone()[0]
+
+
+def ledger(cursor, user_id):
+    cursor.execute("SELECT entry_type, points, source FROM points_ledger WHERE user_id = %s ORDER BY id", (user_id,))
+    return cursor.fetchall()
+
+
+def test_credit_and_debit_entries_maintain_the_balance(database, user):
+    cursor = database.cursor()
+    cursor.execute(queris.credit_points_query(), {"user_id": user, "points": 50, "source": "test"})
+    cursor.execute(queris.debit_points_query(), {"user_id": user, "points": 20, "source": "scheme:1"})
+
+    assert balance(cursor, user) == 30
+    assert ledger(cursor, user) == [("credit", 50, "test"), ("debit", -20, "scheme:1")]
+
+
+def test_debit_larger_than_the_balance_is_not_recorded(database, user):
+    cursor = database.cursor()
+    cursor.execute(queris.credit_points_query(), {"user_id": user, "points": 10, "source": "test"})
+    cursor.execute(queris.debit_points_query(), {"user_id": user, "points": 11, "source": "scheme:1"})
+
+    assert cursor.rowcount == 0
+    assert balance(cursor, user) == 10
+
+
+def test_credit_for_an_unknown_user_is_not_recorded(database):
+    cursor = database.cursor()
+    cursor.execute(queris.credit_points_query(), {"user_id": -1, "points": 10, "source": "test"})
+
+    assert cursor.rowcount == 0
+
+
+def test_batch_of_entries_is_applied_once(database, user):
+    cursor = database.cursor()
+    cursor.execute(
+        "INSERT INTO points_ledger (user_id, entry_type, points, source) VALUES (%s, 'credit', 5, 'a'), (%s, 'credit', 7, 'b')",
+        (user, user)
+    )
+
+    assert balance(cursor, user) == 12
+
+
+def test_validation_credits_each_scanned_code_once(database, user):
+    cursor = database.cursor()
+    cursor.execute("SELECT ensure_points_partitions(CURRENT_DATE + 60)")
+    code = encode_code("99990001LEDG")
+    cursor.execute(
+        "INSERT INTO points (points_code, scanned, points_value, expiry_date) VALUES (%s, false, 15, CURRENT_DATE + 30)", (code,)
+    )
+
+    for _ in range(2):
+        cursor.execute(queris.get_pin_validate_query(), {"codes": [code], "user_id": user})
+
+    assert balance(cursor, user) == 15
+    assert ledger(cursor, user) == [("credit", 15, "99990001LEDG")]
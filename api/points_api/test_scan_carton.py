@@ -0,0 +1,183 @@
+import json
+import pytest
+from flask import Flask
+from api.rate_limiter import limiter
+from api.user_cache import UserCache
+from api.points_api import routes
+from api.points_api.utils import points_util
+from api.points_api.utils.code_codec import decode_code, generate_codes, CHECK_DIGIT, DUPLICATE, MALFORMED
+from api.points_api.utils.points_util import execute_pin_validation, new_scan_summary, scan_codes
+
+
+OK1, OK2, OK3 = "00000001OKAY", "00000002OKAY", "00000003OKAY"
+DUP1, NONE1 = "00000001DUPE", "00000001NONE"
+
+
+class Scans:
+    """Stands in for the pin validation statement: *OKAY codes are credited 10 points, *DUPE were scanned before."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, query, params=None, fetch_results=False):
+        self.statements.append([decode_code(code) for code in params["codes"]])
+        results = []
+        for code in params["codes"]:
+            if decode_code(code).endswith("OKAY"):
+                results.append((code, "success", 10))
+            elif decode_code(code).endswith("DUPE"):
+                results.append((code, "already_scanned", 10))
+            else:
+                results.append((code, "not_in_system", 0))
+        return results
+
+
+@pytest.fixture
+def scans(monkeypatch):
+    scans = Scans()
+    monkeypatch.setattr(points_util, "execute_query_for_points", scans)
+    monkeypatch.setattr(points_util, "resolve_user_id", lambda email: 1)
+    monkeypatch.setattr(points_util, "code_filter", None)
+    monkeypatch.setattr(points_util, "scan_monitor", None)
+    monkeypatch.setattr(points_util, "user_cache", UserCache(maxsize=100, ttl=60))
+    return scans
+
+
+def test_scan_codes_runs_one_statement_per_chunk(scans):
+    summary = new_scan_summary()
+    codes = (code for code in [OK1, DUP1, OK2, NONE1, OK3])
+
+    chunks = list(scan_codes(codes, "a@example.com", 2, summary))
+
+    assert scans.statements == [[OK1, DUP1], [OK2, NONE1], [OK3]]
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert summary == {"success_pins": 3, "already_scanned": 1, "not_in_system": 1, "expired": 0, "invalid": 0, "total_points": 30}
+
+
+def test_scan_codes_reports_invalid_entries_without_the_database(scans):
+    summary = new_scan_summary()
+
+    (results,) = scan_codes([OK1, "", 7, None], "a@example.com", 10, summary)
+
+    assert scans.statements == [[OK1]]
+    assert results == [(OK1, "success", 10, None), ("", "invalid", 0, MALFORMED), (7, "invalid", 0, MALFORMED), (None, "invalid", 0, MALFORMED)]
+    assert summary["invalid"] == 3
+
+
+def test_codes_repeated_in_a_batch_are_rejected_across_chunks(scans):
+    chunks = list(scan_codes([OK1, "48390215abcd", OK1, OK2], "a@example.com", 2, new_scan_summary()))
+
+    assert scans.statements == [[OK1], [OK2]]
+    assert chunks == [
+        [(OK1, "success", 10, None), ("48390215abcd", "invalid", 0, MALFORMED)],
+        [(OK2, "success", 10, None), (OK1, "invalid", 0, DUPLICATE)]
+    ]
+
+
+def test_check_digit_is_only_enforced_when_enabled(scans, monkeypatch):
+    (minted,) = generate_codes(1)
+    # Another digit in the check position
+    mistyped = minted[:7] + str((int(minted[7]) + 1) % 10) + minted[8:]
+
+    list(scan_codes([mistyped], "a@example.com", 10, new_scan_summary()))
+    assert scans.statements == [[mistyped]]
+
+    monkeypatch.setattr(points_util, "POINTS_CODE_CHECK_DIGIT", True)
+    (results,) = scan_codes([minted, mistyped], "a@example.com", 10, new_scan_summary())
+    assert scans.statements[1:] == [[minted]]
+    assert results[1] == (mistyped, "invalid", 0, CHECK_DIGIT)
+
+
+def test_balance_is_invalidated_after_each_credited_chunk(scans):
+    cache = points_util.user_cache
+    cache.put("points", "a@example.com", 5, cache.generation("a@example.com"))
+    chunks = scan_codes([DUP1, OK1], "a@example.com", 1, new_scan_summary())
+
+    next(chunks)
+    assert cache.get("points", "a@example.com") == 5
+    next(chunks)
+    assert cache.get("points", "a@example.com") is None
+
+
+def test_pin_validation_counts_and_rejected_codes(scans):
+    assert execute_pin_validation([OK1, OK2, DUP1, NONE1, OK1], "a@example.com") == {
+        "success_pins": 2, "already_scanned": 1, "not_in_system": 1, "expired": 0, "invalid": 1, "total_points": 20,
+        "rejected": [{"points_code": OK1, "reason": DUPLICATE}]
+    }
+    assert scans.statements == [[OK1, OK2, DUP1, NONE1]]
+
+
+@pytest.fixture
+def client(monkeypatch, scans):
+    from api.blueprints import points
+    monkeypatch.setattr(limiter, "enabled", False)
+    monkeypatch.setattr(routes, "scan_monitor", None)
+    monkeypatch.setattr(routes, "CARTON_SCAN_CHUNK_SIZE", 2)
+    monkeypatch.setattr(routes, "CARTON_SCAN_MAX_CODES", 4)
+    app = Flask(__name__)
+    app.register_blueprint(points, url_prefix="/points")
+    return app.test_client()
+
+
+def test_carton_as_json_document(client, scans):
+    response = client.post("/points/scan_carton", json={"email": "a@example.com", "points": [OK1, DUP1, OK2]})
+
+    assert response.status_code == 200
+    assert response.headers["X-Accel-Buffering"] == "no"
+    body = response.get_json()
+    assert [result["status"] for result in body["results"]] == ["success", "already_scanned", "success"]
+    assert body["summary"]["total_points"] == 20
+    assert "error" not in body
+    assert scans.statements == [[OK1, DUP1], [OK2]]
+
+
+def test_carton_as_ndjson(client):
+    lines = f'"{OK1}"\n\n{{"points_code": "{OK2}"}}\nnot json\n"{NONE1}"\n'.encode()
+    response = client.post("/points/scan_carton?email=a@example.com", data=lines, content_type="application/x-ndjson")
+
+    assert response.mimetype == "application/x-ndjson"
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(record["points_code"], record["status"], record.get("reason")) for record in records[:-1]] == [
+        (OK1, "success", None), (OK2, "success", None), (NONE1, "not_in_system", None), ({"line": "not json"}, "invalid", MALFORMED)
+    ]
+    assert records[-1] == {"summary": {"success_pins": 2, "already_scanned": 0, "not_in_system": 1, "expired": 0, "invalid": 1, "total_points": 20}}
+
+
+def test_ndjson_carton_stops_at_the_code_limit(client, scans):
+    lines = b"".join(b'"0000000%dOKAY"\n' % number for number in range(6))
+    response = client.post("/points/scan_carton?email=a@example.com", data=lines, content_type="application/x-ndjson")
+
+    trailer = json.loads(response.get_data(as_text=True).splitlines()[-1])
+    assert trailer["summary"]["success_pins"] == 4
+    assert trailer["error"] == "At most 4 codes per carton, the rest were not read"
+
+
+def test_carton_reports_an_interrupted_scan(client, monkeypatch):
+    calls = []
+
+    def fail_second_chunk(query, params=None, fetch_results=False):
+        calls.append(params["codes"])
+        if len(calls) > 1:
+            raise Exception("Query execution failed: connection lost")
+        return [(code, "success", 10) for code in params["codes"]]
+    monkeypatch.setattr(points_util, "execute_query_for_points", fail_second_chunk)
+
+    body = client.post("/points/scan_carton", json={"email": "a@example.com", "points": [OK1, OK2, OK3]}).get_json()
+
+    assert len(body["results"]) == 2
+    assert body["summary"]["success_pins"] == 2
+    assert body["error"] == "Scan interrupted, only the codes reported were processed"
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"email": "a@example.com", "points": []}, "Points must be a non-empty list of codes"),
+    ({"email": "a@example.com", "points": OK1}, "Points must be a non-empty list of codes"),
+    ({"email": "a@example.com", "points": [OK1] * 5}, "At most 4 codes per carton"),
+    ({"email": "not an email", "points": [OK1]}, "Valid email required"),
+])
+def test_carton_rejects_bad_requests(client, scans, body, message):
+    response = client.post("/points/scan_carton", json=body)
+
+    assert response.status_code == 400
+    assert response.get_json()["message"] == message
+    assert scans.statements == []
@@ -0,0 +1,103 @@
+import pytest
+from api.points_api.utils import scan_monitor as scan_monitor_module
+from api.points_api.utils.scan_monitor import ScanMonitor, ScanWindow
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(1_000_000.0)
+    monkeypatch.setattr(scan_monitor_module.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def monitor(clock):
+    return ScanMonitor(
+        window_seconds=60,
+        max_scans=100,
+        min_scans=10,
+        max_not_in_system_ratio=0.5,
+        max_already_scanned_ratio=0.5,
+        throttle_seconds=900,
+        max_users=1000
+    )
+
+
+def scans(success=0, not_in_system=0, already_scanned=0, expired=0, invalid=0) -> dict:
+    return {
+        "success_pins": success,
+        "not_in_system": not_in_system,
+        "already_scanned": already_scanned,
+        "expired": expired,
+        "invalid": invalid
+    }
+
+
+def test_window_drops_seconds_that_slide_out():
+    window = ScanWindow(10)
+    window.record(100, 5, 1, 0)
+    window.record(105, 3, 0, 2)
+    assert window.totals == [8, 1, 2]
+
+    window.record(110, 1, 0, 0)
+    assert window.totals == [4, 0, 2]
+
+    window.record(200, 1, 0, 0)
+    assert window.totals == [1, 0, 0]
+
+
+def test_normal_scanning_is_not_flagged(monitor, clock):
+    for _ in range(10):
+        monitor.record("user@example.com", scans(success=9, already_scanned=1))
+        clock.now += 1
+
+    assert not monitor.is_throttled("user@example.com")
+    assert monitor.suspicious_users() == []
+
+
+def test_scan_rate_over_the_limit_is_flagged(monitor, clock):
+    for _ in range(11):
+        monitor.record("fast@example.com", scans(success=10))
+        clock.now += 1
+
+    assert monitor.is_throttled("fast@example.com")
+    assert monitor.suspicious_users()[0]["reasons"] == ["scan_rate"]
+
+
+def test_guessing_codes_is_flagged(monitor):
+    monitor.record("guess@example.com", scans(success=2, not_in_system=18))
+
+    flagged = monitor.suspicious_users()
+    assert [details["email"] for details in flagged] == ["guess@example.com"]
+    assert flagged[0]["reasons"] == ["not_in_system_ratio"]
+    assert flagged[0]["score"] == pytest.approx(1.8)
+
+
+def test_ratios_are_ignored_below_min_scans(monitor):
+    monitor.record("few@example.com", scans(not_in_system=5))
+
+    assert not monitor.is_throttled("few@example.com")
+
+
+def test_suspicious_users_are_ranked_by_score(monitor):
+    monitor.record("a@example.com", scans(success=8, already_scanned=12))
+    monitor.record("b@example.com", scans(not_in_system=20))
+
+    assert [details["email"] for details in monitor.suspicious_users()] == ["b@example.com", "a@example.com"]
+    assert len(monitor.suspicious_users(limit=1)) == 1
+
+
+def test_clear_lifts_the_throttle(monitor):
+    monitor.record("guess@example.com", scans(not_in_system=20))
+
+    assert monitor.clear("guess@example.com")
+    assert not monitor.is_throttled("guess@example.com")
+    assert not monitor.clear("guess@example.com")
@@ -0,0 +1,208 @@
+import logging
+import json
+import uuid
+from typing import Optional
+from api.points_api.queris import claim_scan_batch_query, start_scan_batch_query, get_scan_batch_query, complete_scan_batch_query, fail_scan_batch_query
+from api.points_api.utils.points_util import execute_pin_validation
+from api.database import execute_query, execute_query_for_points
+from api.config import SCAN_BATCH_STALE_MINUTES, SCAN_BATCH_JOB_PRIORITY
+from api.job_runner import job_runner
+from psycopg2 import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_batch_id(batch_id) -> Optional[str]:
+    """
+    Normalizes a client supplied batch id into its canonical UUID string.
+
+    Args:
+        batch_id: The idempotency key sent by the client.
+
+    Returns:
+        Optional[str]: The canonical UUID string, or None if batch_id is not a valid UUID.
+    """
+    if not batch_id or not isinstance(batch_id, str):
+        return None
+    try:
+        return str(uuid.UUID(batch_id.strip()))
+    except ValueError:
+        return None
+
+def claim_scan_batch(batch_id: str, email: str, codes: Optional[list] = None) -> bool:
+    """
+    Claims a scan batch so that only one request processes it.
+
+    Args:
+        batch_id (str): The batch idempotency key.
+        email (str): The user's email address.
+        codes (list, optional): The codes to keep for asynchronous processing. When given the
+            batch is queued as 'pending', otherwise it is processed in the caller as 'processing'.
+
+    Returns:
+        bool: True if the caller owns the batch, False if it was already submitted.
+
+    Raises:
+        DatabaseError: If a database error occurs during query execution.
+        RuntimeError: For other unexpected errors.
+    """
+    try:
+        query = claim_scan_batch_query()
+        params = {
+            "batch_id": batch_id,
+            "email": email,
+            "status": "pending" if codes is not None else "processing",
+            "codes": json.dumps(codes) if codes is not None else None,
+            "stale_minutes": SCAN_BATCH_STALE_MINUTES
+        }
+        response = execute_query_for_points(query, params, fetch_results=True)
+
+        return bool(response)
+    except DatabaseError as dber:
+        raise DatabaseError(f"Database error: {str(dber)}")
+    except Exception as e:
+        raise RuntimeError(f"Error claiming scan batch: {str(e)}")
+
+def get_scan_batch(batch_id: str) -> Optional[dict]:
+    """
+    Retrieves the recorded state of a scan batch.
+
+    Args:
+        batch_id (str): The batch idempotency key.
+
+    Returns:
+        Optional[dict]: The batch id, email, status, result and timestamps, or None if not found.
+
+    Raises:
+        DatabaseError: If a database error occurs during query execution.
+        RuntimeError: For other unexpected errors.
+    """
+    try:
+        query = get_scan_batch_query()
+        params = {"batch_id": batch_id}
+        response = execute_query(query, params, fetch_results=True)
+
+        if not response or response == []:
+            return None
+        row = response[0]
+        return {
+            "batch_id": str(row[0]),
+            "email": row[1],
+            "status": row[2],
+            "result": row[3],
+            "created": row[4],
+            "updated": row[5]
+        }
+    except DatabaseError as dber:
+        raise DatabaseError(f"Database error: {str(dber)}")
+    except Exception as e:
+        raise RuntimeError(f"Error retrieving scan batch: {str(e)}")
+
+def complete_scan_batch(batch_id: str, result: dict) -> bool:
+    """
+    Records the outcome of a processed scan batch for later replays. A batch already completed
+    by its scan statement is left as it is.
+
+    Args:
+        batch_id (str): The batch idempotency key.
+        result (dict): The validation summary returned to the client.
+
+    Returns:
+        bool: True if the batch was updated, False otherwise.
+    """
+    try:
+        query = complete_scan_batch_query()
+        params = {"batch_id": batch_id, "result": json.dumps(result)}
+        response = execute_query(query, params)
+
+        return response > 0
+    except DatabaseError as dber:
+        raise DatabaseError(f"Database error: {str(dber)}")
+    except Exception as e:
+        raise RuntimeError(f"Error completing scan batch: {str(e)}")
+
+def fail_scan_batch(batch_id: str, error: str) -> bool:
+    """
+    Marks a scan batch as failed so that a retry of the same batch id can reclaim it. A completed
+    batch stays completed, its credits are committed.
+
+    Args:
+        batch_id (str): The batch idempotency key.
+        error (str): The error message to keep with the batch.
+
+    Returns:
+        bool: True if the batch was updated, False otherwise.
+    """
+    try:
+        query = fail_scan_batch_query()
+        params = {"batch_id": batch_id, "result": json.dumps({"error": error})}
+        response = execute_query(query, params)
+
+        return response > 0
+    except DatabaseError as dber:
+        raise DatabaseError(f"Database error: {str(dber)}")
+    except Exception as e:
+        raise RuntimeError(f"Error failing scan batch: {str(e)}")
+
+def process_scan_batch(batch_id: str, email: str, codes: list) -> dict:
+    """
+    Validates a batch of codes, credits the resulting points to the user and completes the batch.
+
+    The scan statement completes the batch in the same transaction as the credits, so a batch
+    whose scan committed is never reclaimed and re-run, even if the process dies right after.
+    complete_scan_batch() only records batches whose codes never reached the database.
+
+    Args:
+        batch_id (str): The batch idempotency key, claimed by the caller.
+        email (str): The user's email address.
+        codes (list): The scanned points codes.
+
+    Returns:
+        dict: The validation summary from execute_pin_validation.
+
+    Raises:
+        RuntimeError: If the codes could not be validated.
+    """
+    response = execute_pin_validation(codes, email, batch_id)
+    if not response:
+        raise RuntimeError("Unable to process")
+    complete_scan_batch(batch_id, response)
+    return response
+
+@job_runner.handler("scan_batch")
+def _run_pending_batch_job(payload: dict) -> None:
+    _run_pending_batch(payload["batch_id"])
+
+def _run_pending_batch(batch_id: str) -> None:
+    try:
+        response = execute_query_for_points(start_scan_batch_query(), {"batch_id": batch_id}, fetch_results=True)
+        if not response:
+            return
+        email, codes = response[0]
+
+        process_scan_batch(batch_id, email, codes)
+    except Exception as e:
+        logger.exception(f"Error processing scan batch {batch_id}: {str(e)}")
+        try:
+            fail_scan_batch(batch_id, str(e))
+        except Exception as fe:
+            logger.exception(f"Error marking scan batch {batch_id} as failed: {str(fe)}")
+
+def submit_scan_batch(batch_id: str, email: str, codes: list) -> bool:
+    """
+    Queues a large scan batch for asynchronous validation on the job runner. Without a
+    background poller in this process the batch is validated before this returns.
+
+    Args:
+        batch_id (str): The batch idempotency key.
+        email (str): The user's email address.
+        codes (list): The scanned points codes.
+
+    Returns:
+        bool: True if the batch was queued, False if the batch id was already submitted.
+    """
+    if not claim_scan_batch(batch_id, email, codes):
+        return False
+    # A failed run marks the batch failed for the client to resubmit, so the job is never retried
+    job_runner.dispatch("scan_batch", {"batch_id": batch_id}, priority=SCAN_BATCH_JOB_PRIORITY, max_attempts=1)
+    return True
@@ -0,0 +1,214 @@
+import logging
+import hashlib
+import math
+import threading
+import time
+from typing import Iterable, Optional
+from api.points_api.queris import count_points_codes_query, get_all_points_codes_query, get_points_mint_generation_query
+from api.database import execute_query, stream_query
+from api.config import CODE_FILTER_ENABLED, CODE_FILTER_ERROR_RATE, CODE_FILTER_MIN_CAPACITY, CODE_FILTER_REFRESH_SECONDS, CODE_FILTER_GENERATION_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter over encoded points codes (see code_codec.encode_code()).
+
+    Membership tests can return false positives at roughly the configured error rate
+    but never false negatives, so a code reported as absent was never added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        if capacity <= 0:
+            raise ValueError("capacity must be a positive integer")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, code: int):
+        digest = hashlib.blake2b(code.to_bytes(8, "little"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, code: int) -> None:
+        positions = self._positions(code)
+        with self._lock:
+            for pos in positions:
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += 1
+
+    def __contains__(self, code: int) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(code))
+
+    @property
+    def memory_size(self) -> int:
+        """Size of the bit array in bytes."""
+        return len(self._bits)
+
+    def false_positive_rate(self) -> float:
+        """Expected false positive rate for the number of codes added so far."""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class CodeFilter:
+    """
+    Process wide Bloom filter over every issued points code.
+
+    The filter is built from a streaming scan of the points table in a background thread
+    and rebuilt every CODE_FILTER_REFRESH_SECONDS. It remembers the points_mint_generation
+    read before the scan; a code missing from the filter is only reported as unknown while
+    the database still has that generation. Once another worker, a script or a migration
+    inserts codes, misses go to the database until a rebuild catches up.
+    The generation is read at most once per generation_ttl seconds, so codes minted elsewhere
+    can be reported as unknown for that long.
+    Until the first build completes every code is treated as a possible member.
+    """
+
+    def __init__(self, error_rate: float, min_capacity: int, refresh_seconds: int, generation_ttl: float = 0):
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self.refresh_seconds = refresh_seconds
+        self.generation_ttl = generation_ttl
+        self._filter: Optional[BloomFilter] = None
+        self._built_at = 0.0
+        self._generation: Optional[int] = None
+        # Last points_mint_generation read and the monotonic time it was read at
+        self._read_generation: Optional[int] = None
+        self._read_at = 0.0
+        self._building = False
+        self._pending = []
+        self._lock = threading.Lock()
+        self._generation_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def start_build(self) -> bool:
+        """Starts a background rebuild unless one is already running."""
+        with self._lock:
+            if self._building:
+                return False
+            self._building = True
+            self._pending = []
+        threading.Thread(target=self._build, name="code-filter-build", daemon=True).start()
+        return True
+
+    def _build(self) -> None:
+        try:
+            # Read before the scan, so codes inserted during it leave the filter behind the counter
+            read_at = time.monotonic()
+            generation = self._current_generation()
+            total = execute_query(count_points_codes_query(), fetch_results=True)[0][0]
+            bloom = BloomFilter(max(self.min_capacity, int(total) * 2), self.error_rate)
+            for (points_code,) in stream_query(get_all_points_codes_query()):
+                bloom.add(points_code)
+
+            with self._lock:
+                # Codes minted while the scan was running may be missing from the snapshot
+                for points_code in self._pending:
+                    bloom.add(points_code)
+                self._filter = bloom
+                self._generation = generation
+                self._built_at = time.monotonic()
+                if read_at >= self._read_at:
+                    self._read_generation, self._read_at = generation, read_at
+        except Exception as e:
+            logger.exception(f"Error building points code filter: {str(e)}")
+        finally:
+            with self._lock:
+                self._building = False
+                self._pending = []
+
+    def _current_generation(self) -> int:
+        return execute_query(get_points_mint_generation_query(), fetch_results=True)[0][0]
+
+    def _mint_generation(self) -> int:
+        """The mint generation, read from the database once per generation_ttl seconds at most."""
+        if self._read_generation is not None and time.monotonic() - self._read_at < self.generation_ttl:
+            return self._read_generation
+        # One request reads it, the others wait and reuse the value
+        with self._generation_lock:
+            if self._read_generation is not None and time.monotonic() - self._read_at < self.generation_ttl:
+                return self._read_generation
+            read_at = time.monotonic()
+            generation = self._current_generation()
+            with self._lock:
+                self._read_generation, self._read_at = generation, read_at
+            return generation
+
+    def _refresh_if_stale(self) -> None:
+        if not self._building and (not self.ready or time.monotonic() - self._built_at > self.refresh_seconds):
+            self.start_build()
+
+    def add(self, codes: Iterable[int]) -> None:
+        """Adds newly minted codes, encoded, to the live filter."""
+        with self._lock:
+            bloom = self._filter
+            for points_code in codes:
+                if bloom is not None:
+                    bloom.add(points_code)
+                if self._building:
+                    self._pending.append(points_code)
+
+    def partition(self, codes: list) -> tuple[list, list]:
+        """
+        Splits encoded codes into (candidates, unknown).
+
+        Unknown codes are definitely not in the points table; candidates still need a database lookup.
+        Misses are only unknown while no codes were inserted since the filter was built, as of
+        a mint generation read at most generation_ttl seconds ago.
+        """
+        self._refresh_if_stale()
+        with self._lock:
+            bloom, built_generation = self._filter, self._generation
+        if bloom is None:
+            return codes, []
+
+        candidates, unknown = [], []
+        for points_code in codes:
+            (candidates if points_code in bloom else unknown).append(points_code)
+        if not unknown:
+            return candidates, unknown
+
+        try:
+            current = self._mint_generation()
+        except Exception as e:
+            logger.error(f"Error reading points mint generation, skipping code filter: {str(e)}")
+            return codes, []
+        if current != built_generation:
+            self.start_build()
+            return codes, []
+        return candidates, unknown
+
+    def stats(self) -> dict:
+        bloom = self._filter
+        if bloom is None:
+            return {"ready": False, "building": self._building}
+        return {
+            "ready": True,
+            "building": self._building,
+            "codes": bloom.count,
+            "capacity": bloom.capacity,
+            "num_bits": bloom.num_bits,
+            "num_hashes": bloom.num_hashes,
+            "memory_bytes": bloom.memory_size,
+            "target_error_rate": bloom.error_rate,
+            "false_positive_rate": bloom.false_positive_rate(),
+            "generation": self._generation,
+            "age_seconds": int(time.monotonic() - self._built_at)
+        }
+
+
+code_filter = CodeFilter(CODE_FILTER_ERROR_RATE, CODE_FILTER_MIN_CAPACITY, CODE_FILTER_REFRESH_SECONDS,
+                         CODE_FILTER_GENERATION_TTL_SECONDS) if CODE_FILTER_ENABLED else None
@@ -1,11 +1,22 @@
 # import sys
 # import os
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-from api.points_api.queris import get_points_query, update_user_point_query, insert_points_data_query, get_pin_validate_query
+from api.points_api.queris import get_points_query, credit_points_query, debit_points_query, get_points_history_query, insert_points_data_query, get_pin_validate_query, get_pin_validate_batch_query, ensure_points_partitions_query, archive_points_query, get_existing_points_codes_query
+from api.points_api.utils.code_filter import code_filter
+from api.points_api.utils.code_codec import encode_code, code_rejection, generate_codes, CHECK_DIGIT, DUPLICATE, MALFORMED
+from api.points_api.utils.scan_monitor import scan_monitor
 from api.database import execute_query, execute_query_for_points
+from api.user_cache import user_cache
+from api.user_ids import resolve_user_id
+from api.tracing import tracer
+from api.config import ARCHIVE_BATCH_SIZE, ARCHIVE_MAX_BATCHES, ARCHIVE_PARTITION_AHEAD_DAYS, POINTS_CODE_CHECK_DIGIT, MINT_MAX_CODES
 from psycopg2 import DatabaseError
+from datetime import date, timedelta
+from typing import Iterable, Iterator, Optional
+import json
 
 
+@tracer.wrap()
 def get_user_points(email: str) -> int:
     """
     Retrieves the points for a given user email.
@@ -23,16 +34,27 @@ def get_user_points(email: str) -> int:
     try:
         if not email or not isinstance(email, str):
             raise ValueError("Invalid or empty email provided")
+        
+        cached = user_cache.get("points", email)
+        if cached is not None:
+            return cached
+        generation = user_cache.generation(email)
+        
+        user_id = resolve_user_id(email)
+        if user_id is None:
+            return 0
             
         query = get_points_query()
-        params = {"email": email}
+        params = {"user_id": user_id}
         response = execute_query(query=query, params=params, fetch_results=True)
         
         if not response or response == []:
             return 0
             
         points = response[0][0]
-        return int(points) if points is not None else 0
+        points = int(points) if points is not None else 0
+        user_cache.put("points", email, points, generation)
+        return points
         
     except ValueError as ve:
         raise ValueError(f"error {ve}")
@@ -41,13 +63,15 @@ def get_user_points(email: str) -> int:
     except Exception as e:
         raise RuntimeError(f"Error retrieving user points: {e}")
 
-def add_user_points(email: str, point: int) -> bool:
+@tracer.wrap()
+def add_user_points(email: str, point: int, source: Optional[str] = None) -> bool:
     """
-    Adds points to a user's existing points.
+    Adds points to a user's existing points by appending a credit entry to the points ledger.
     
     Args:
         email (str): The user's email address.
         point (int): The number of points to add.
+        source (str, optional): What the points were earned for (e.g. a points code).
         
     Returns:
         bool: True if points were added successfully, False otherwise.
@@ -61,29 +85,38 @@ def add_user_points(email: str, point: int) -> bool:
             raise ValueError("Invalid or empty email provided")
         if not isinstance(point, int) or point < 0:
             raise ValueError("Points must be a non-negative integer")
+        
+        user_id = resolve_user_id(email)
+        if user_id is None:
+            return False
             
-        query = update_user_point_query()
-        old_points = get_user_points(email)
-        updated_points = old_points + point
-        params = {"email": email, "points": updated_points}
+        query = credit_points_query()
+        params = {"user_id": user_id, "points": point, "source": source}
         response = execute_query(query=query, params=params)
+        user_cache.invalidate(email)
         
         return response > 0
         
     except DatabaseError as de:
-        raise DatabaseError(f"Database error {str(e)}")
+        raise DatabaseError(f"Database error {str(de)}")
     except ValueError as ve:
-        raise ValueError(f"Value error {str(e)}")
+        raise ValueError(f"Value error {str(ve)}")
     except Exception as e:
         raise RuntimeError(f"Error adding user points: {e}")
 
-def redeem_user_points(email: str, points: int) -> bool:
+@tracer.wrap()
+def redeem_user_points(email: str, points: int, source: Optional[str] = None) -> bool:
     """
     Redeems points from a user's account if sufficient points are available.
     
+    The balance check and the debit entry are a single conditional insert into the points
+    ledger that locks the balance row, so concurrent redemptions cannot overdraw the account
+    and the one that no longer fits returns False.
+    
     Args:
         email (str): The user's email address.
         points (int): The number of points to redeem.
+        source (str, optional): What the points were redeemed for (e.g. a scheme).
         
     Returns:
         bool: True if points were redeemed successfully, False otherwise.
@@ -98,13 +131,14 @@ def redeem_user_points(email: str, points: int) -> bool:
         if not isinstance(points, int) or points < 0:
             return False
         
-        total_points = get_user_points(email)
-        if points > total_points:
+        user_id = resolve_user_id(email)
+        if user_id is None:
             return False
             
-        query = update_user_point_query()
-        params = {"email": email, "points": total_points - points}
+        query = debit_points_query()
+        params = {"user_id": user_id, "points": points, "source": source}
         response = execute_query(query=query, params=params)
+        user_cache.invalidate(email)
         
         return response > 0
     except DatabaseError as de:
@@ -116,18 +150,352 @@ def redeem_user_points(email: str, points: int) -> bool:
     except Exception as e:
         raise RuntimeError(f"Error redeeming user points: {e}")
 
-def execute_pin_validation(pin_data:list) -> dict:
+@tracer.wrap()
+def get_points_history(email: str, limit: int = 50) -> list[dict]:
+    """
+    Retrieves the most recent points ledger entries of a user.
+    
+    Args:
+        email (str): The user's email address.
+        limit (int): The maximum number of entries to return.
+        
+    Returns:
+        list[dict]: Ledger entries, newest first, with id, type, points, source and created.
+        
+    Raises:
+        ValueError: If email is empty or invalid.
+        Exception: For unexpected database errors.
+    """
     try:
-        result = {
-            "success_pins": [],
-            "already_scanned": [],
-            "not_in_system": [],
-            "expired": [],
-            "invalid": [],
-            "total_value": 0
-        }
+        if not email or not isinstance(email, str):
+            raise ValueError("Invalid or empty email provided")
+        
+        user_id = resolve_user_id(email)
+        if user_id is None:
+            return []
+        
+        query = get_points_history_query()
+        params = {"user_id": user_id, "limit": limit}
+        response = execute_query(query=query, params=params, fetch_results=True)
+        
+        return [{
+            "id": row[0],
+            "type": row[1],
+            "points": row[2],
+            "source": row[3] if row[3] else "NA",
+            "created": row[4]
+        } for row in response or []]
+    
+    except ValueError as ve:
+        raise ValueError(f"error {ve}")
+    except DatabaseError as de:
+        raise DatabaseError(f"Database error {str(de)}")
+    except Exception as e:
+        raise RuntimeError(f"Error retrieving points history: {e}")
+
+def insert_points_data(points_data: list[dict]) -> int:
+    """
+    Mints new points codes and registers them with the in-memory code filter.
+    
+    Args:
+        points_data (list[dict]): Codes to insert, each with 'points', 'points_value',
+            'expiry_date' and optionally 'status' (defaults to 'not_scanned').
+        
+    Returns:
+        int: The number of codes inserted.
+        
+    Raises:
+        ValueError: If points_data is empty, a code is malformed (not 8 digits followed by 4 capital
+                    letters, or a wrong check digit with POINTS_CODE_CHECK_DIGIT on), listed twice
+                    or already issued.
+        Exception: For unexpected database errors, including a code issued by a concurrent mint,
+                   which the points_code_unique trigger rejects.
+    """
+    try:
+        if not points_data or not isinstance(points_data, list):
+            raise ValueError("points_data must be a non-empty list")
+        
+        params_list = []
+        seen = set()
+        for item in points_data:
+            if not isinstance(item, dict) or not item.get("points") or not isinstance(item.get("points"), str):
+                raise ValueError("Each code must contain a 'points' code string")
+            # Codes that scans would reject must not be minted
+            reason = code_rejection(item["points"], POINTS_CODE_CHECK_DIGIT)
+            if reason is not None:
+                raise ValueError(f"{item['points']}: {'wrong check digit' if reason == CHECK_DIGIT else 'not 8 digits followed by 4 capital letters'}")
+            if item["points"] in seen:
+                raise ValueError(f"{item['points']}: listed twice")
+            seen.add(item["points"])
+            if not isinstance(item.get("points_value"), int) or item.get("points_value") <= 0:
+                raise ValueError("points_value must be a positive integer")
+            if not item.get("expiry_date"):
+                raise ValueError("expiry_date is required")
+            if item.get("status", "not_scanned") not in ("scanned", "not_scanned"):
+                raise ValueError("status must be 'scanned' or 'not_scanned'")
+            params_list.append({
+                "points": encode_code(item["points"]),
+                "scanned": item.get("status") == "scanned",
+                "points_value": item["points_value"],
+                "expiry_date": item["expiry_date"]
+            })
+        
+        # The primary key includes expiry_date, so a code issued before with another expiry would not conflict
+        codes = [params["points"] for params in params_list]
+        existing = execute_query(get_existing_points_codes_query(), {"codes": codes}, fetch_results=True)
+        if existing:
+            taken = {row[0] for row in existing}
+            listed = [item["points"] for item in points_data if encode_code(item["points"]) in taken]
+            raise ValueError(f"already issued: {', '.join(listed[:10])}{' ...' if len(listed) > 10 else ''}")
+        
+        # Codes past the last monthly partition would otherwise land in points_default
+        until_date = max(str(params["expiry_date"]) for params in params_list)
+        execute_query_for_points(ensure_points_partitions_query(), {"until_date": until_date}, fetch_results=True)
+        
+        inserted = execute_query_for_points(insert_points_data_query(), {
+            "codes": codes,
+            "scanned": [params["scanned"] for params in params_list],
+            "points_values": [params["points_value"] for params in params_list],
+            "expiry_dates": [params["expiry_date"] for params in params_list]
+        })
+        if code_filter is not None:
+            code_filter.add(params["points"] for params in params_list)
+        return inserted
+    
+    except ValueError as ve:
+        raise ValueError(f"Validation error: {ve}")
+    except DatabaseError as de:
+        raise DatabaseError(f"Database error: {str(de)}")
+    except Exception as e:
+        raise RuntimeError(f"Error inserting points data: {e}")
+
+def mint_points_codes(count: int, points_value: int, expiry_date: str) -> list[str]:
+    """
+    Generates count new codes with a valid check digit and inserts them.
+    
+    Args:
+        count (int): Number of codes to mint, at most MINT_MAX_CODES.
+        points_value (int): Points each code is worth.
+        expiry_date (str): Expiry date of the codes.
+        
+    Returns:
+        list: The minted codes.
+        
+    Raises:
+        ValueError: If count is out of range or points_value/expiry_date are invalid.
+        Exception: For unexpected database errors.
+    """
+    try:
+        if not isinstance(count, int) or not 0 < count <= MINT_MAX_CODES:
+            raise ValueError(f"Validation error: count must be between 1 and {MINT_MAX_CODES}")
         
-        points_codes = []
+        codes = set(generate_codes(count))
+        # Random codes rarely repeat an issued one, draw those again until none do
+        while True:
+            existing = execute_query(get_existing_points_codes_query(), {"codes": [encode_code(code) for code in codes]}, fetch_results=True)
+            if not existing:
+                break
+            taken = {row[0] for row in existing}
+            codes = {code for code in codes if encode_code(code) not in taken}
+            while len(codes) < count:
+                codes.update(generate_codes(count - len(codes)))
+        
+        codes = sorted(codes)
+        insert_points_data([{"points": code, "points_value": points_value, "expiry_date": expiry_date} for code in codes])
+        return codes
+    
+    except ValueError:
+        # insert_points_data() already reports it as a validation error
+        raise
+    except DatabaseError as de:
+        raise DatabaseError(f"Database error: {str(de)}")
+    except Exception as e:
+        raise RuntimeError(f"Error minting points codes: {e}")
+
+def archive_points(batch_size: int = ARCHIVE_BATCH_SIZE, max_batches: int = ARCHIVE_MAX_BATCHES) -> int:
+    """
+    Moves scanned and expired codes out of the live points partitions into points_archive.
+    
+    Each batch runs in its own transaction so the archiver never holds long locks on the
+    scan path. Partitions for the coming months are created before archiving.
+    
+    Args:
+        batch_size (int): Maximum number of codes moved per transaction.
+        max_batches (int): Maximum number of batches per call.
+        
+    Returns:
+        int: The number of codes archived.
+        
+    Raises:
+        Exception: For unexpected database errors.
+    """
+    try:
+        until_date = (date.today() + timedelta(days=ARCHIVE_PARTITION_AHEAD_DAYS)).isoformat()
+        execute_query_for_points(ensure_points_partitions_query(), {"until_date": until_date}, fetch_results=True)
+        
+        archived = 0
+        for _ in range(max_batches):
+            response = execute_query_for_points(archive_points_query(), {"batch_size": batch_size}, fetch_results=True)
+            moved = response[0][0] if response else 0
+            archived += moved
+            if moved < batch_size:
+                break
+        return archived
+    
+    except DatabaseError as de:
+        raise DatabaseError(f"Database error: {str(de)}")
+    except Exception as e:
+        raise RuntimeError(f"Error archiving points: {e}")
+
+def new_scan_summary() -> dict:
+    """Counts per scan outcome, as filled in by scan_codes()."""
+    return {
+        "success_pins": 0,
+        "already_scanned": 0,
+        "not_in_system": 0,
+        "expired": 0,
+        "invalid": 0,
+        "total_points": 0
+    }
+
+
+def summarize_scan_results(results: list[tuple]) -> dict:
+    """Counts of new_scan_summary() for (points_code, status, points_value, reason) results."""
+    summary = new_scan_summary()
+    for _, status, points_value, _ in results:
+        if status == "success":
+            summary["success_pins"] += 1
+            summary["total_points"] += int(points_value or 0)
+        else:
+            summary[status] += 1
+    return summary
+
+
+@tracer.wrap()
+def _scan_chunk(points_codes: list, user_id: Optional[int], batch_id: Optional[str] = None,
+                rejected: list = ()) -> list[tuple]:
+    # Codes are well formed and distinct here, and looked up encoded
+    code_texts = {encode_code(points_code): points_code for points_code in points_codes}
+    encoded, unknown_codes = list(code_texts), []
+    
+    # Codes the filter has never seen cannot be in the points table
+    if code_filter is not None:
+        encoded, unknown_codes = code_filter.partition(encoded)
+    unknown_results = [(code_texts[code], "not_in_system", 0, None) for code in unknown_codes]
+    
+    if not encoded:
+        return unknown_results
+    
+    # Unknown users get no row in user_points, so none of their codes are scanned
+    query, params = get_pin_validate_query(), {"codes": encoded, "user_id": user_id}
+    if batch_id is not None:
+        # The batch is completed by the statement that scans its codes
+        query = get_pin_validate_batch_query()
+        params["batch_id"] = batch_id
+        params["recorded"] = json.dumps({
+            **summarize_scan_results(list(rejected) + unknown_results),
+            "rejected": [{"points_code": code, "reason": reason} for code, _, _, reason in rejected]
+        })
+    rows = execute_query_for_points(query, params=params, fetch_results=True)
+    query_results = [(code_texts[code], status, points_value, None) for code, status, points_value in rows]
+    return query_results + unknown_results
+
+
+def prevalidate_codes(codes: list, seen: set) -> tuple[list, list]:
+    """
+    Rejects codes that cannot be scanned without a lookup: entries that are not well formed
+    codes, codes with a wrong check digit (with POINTS_CODE_CHECK_DIGIT on) and codes already
+    in seen, the codes accepted earlier in the same batch. Accepted codes are added to seen.
+    
+    Returns:
+        tuple: (accepted codes, [(code, "invalid", 0, reason), ...]).
+    """
+    accepted, rejected = [], []
+    for points_code in codes:
+        reason = code_rejection(points_code, POINTS_CODE_CHECK_DIGIT)
+        if reason is None and points_code in seen:
+            reason = DUPLICATE
+        if reason is None:
+            seen.add(points_code)
+            accepted.append(points_code)
+        else:
+            rejected.append((points_code, "invalid", 0, reason))
+    return accepted, rejected
+
+
+def scan_codes(codes: Iterable, email: str, chunk_size: int, summary: dict,
+               batch_id: Optional[str] = None) -> Iterator[list[tuple]]:
+    """
+    Scans codes chunk_size at a time and credits the successful ones to the user, one
+    statement per chunk, so only a chunk of codes and results is held at once.
+    
+    Codes are checked by prevalidate_codes() first; rejected ones never reach the database
+    and are reported invalid with the reason.
+    
+    Args:
+        codes (Iterable): The scanned points codes.
+        email (str): The user's email address to credit.
+        chunk_size (int): Codes per statement.
+        summary (dict): Counts from new_scan_summary(), updated after every chunk.
+        batch_id (str, optional): Idempotent scan batch completed by the statement that scans
+            its codes, which must fit in one chunk.
+        
+    Yields:
+        list: (points_code, status, points_value, reason) for each code of a chunk, once the
+              chunk is committed; reason is MALFORMED, CHECK_DIGIT or DUPLICATE for rejected
+              codes and None otherwise.
+    """
+    user_id = resolve_user_id(email)
+    seen = set()
+    try:
+        for chunk in _chunks(codes, chunk_size):
+            accepted, rejected = prevalidate_codes(chunk, seen)
+            results = (_scan_chunk(accepted, user_id, batch_id, rejected) if accepted else []) + rejected
+            
+            chunk_summary = summarize_scan_results(results)
+            for key, count in chunk_summary.items():
+                summary[key] += count
+            if scan_monitor is not None:
+                # Codes that cannot have been minted are as suspicious as unknown ones
+                guessed = sum(1 for *_, reason in rejected if reason in (MALFORMED, CHECK_DIGIT))
+                scan_monitor.record(email, {**chunk_summary, "invalid": chunk_summary["invalid"] - guessed,
+                                            "not_in_system": chunk_summary["not_in_system"] + guessed})
+            if chunk_summary["success_pins"]:
+                # Dropped per chunk, a reader must not cache a balance older than a committed chunk
+                user_cache.invalidate(email)
+            yield results
+    except DatabaseError as de:
+        raise DatabaseError(f"error {str(de)}")
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@tracer.wrap()
+def execute_pin_validation(pin_data:list, email: str, batch_id: Optional[str] = None) -> dict:
+    """
+    Scans a batch of points codes and credits the successful ones to the user.
+    
+    Args:
+        pin_data (list): The scanned points codes.
+        email (str): The user's email address to credit.
+        batch_id (str, optional): Idempotent scan batch to complete with the result in the
+            same statement as the scan.
+        
+    Returns:
+        dict: Counts per outcome, the total points credited and the codes rejected before
+              any lookup with their reason. A batch whose codes never reach the database is
+              left for the caller to complete.
+    """
+    try:
         if not isinstance(pin_data, list):
             raise ValueError("pin_data must be a list")
             
@@ -136,55 +504,25 @@ def execute_pin_validation(pin_data:list) -> dict:
                 raise ValueError("Each element in pin_data must be a string")
             if not points_code:
                 raise ValueError("Points code cannot be empty")
-            points_codes.append(points_code)
-        
-        if not points_codes:
-            return {
-                "success_pins": 0,
-                "already_scanned": 0,
-                "not_in_system": 0,
-                "expired": 0,
-                "total_points": 0
-            }
-        
-        PIN_VALIDATION_QUERY = get_pin_validate_query()
-        
-        query_results = execute_query_for_points(
-            PIN_VALIDATION_QUERY,
-            params=(points_codes,),
-            fetch_results=True
-        )
-        
-        for points_code, status, points_value in query_results:
-            pin_info = {
-                "points_code": points_code,
-                "points_value": points_value
-            }
-            
-            if status == "success":
-                result["success_pins"].append(pin_info)
-            elif status == "already_scanned":
-                result["already_scanned"].append(pin_info)
-            elif status == "not_in_system":
-                result["not_in_system"].append(pin_info)
-            elif status == "expired":
-                result["expired"].append(pin_info)
-            elif status == "invalid":
-                result["invalid"].append(pin_info)
-        
-        result["total_value"] = sum(pin["points_value"] for pin in result["success_pins"])
-        
-        final_result = {
-            "success_pins": len(result["success_pins"]),
-            "already_scanned": len(result["already_scanned"]),
-            "not_in_system": len(result["not_in_system"]),
-            "expired": len(result["expired"]),
-            "total_points": int(result["total_value"])
-        }
         
-        return final_result
+        summary = new_scan_summary()
+        rejected = []
+        if pin_data:
+            # The whole batch goes in one statement
+            for results in scan_codes(pin_data, email, len(pin_data), summary, batch_id):
+                rejected += [{"points_code": code, "reason": reason} for code, _, _, reason in results if reason]
+        
+        return {
+            "success_pins": summary["success_pins"],
+            "already_scanned": summary["already_scanned"],
+            "not_in_system": summary["not_in_system"],
+            "expired": summary["expired"],
+            "invalid": summary["invalid"],
+            "total_points": summary["total_points"],
+            "rejected": rejected
+        }
     except DatabaseError as de:
-        raise DatabaseError(f"error {str(e)}")
+        raise DatabaseError(f"error {str(de)}")
     except Exception as e:
         raise RuntimeError(f"error {str(e)}")
 
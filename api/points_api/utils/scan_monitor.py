@@ -0,0 +1,141 @@
+import threading
+import time
+from array import array
+from typing import Optional
+from cachetools import TTLCache
+from api.config import SCAN_MONITOR_ENABLED, SCAN_MONITOR_WINDOW_SECONDS, SCAN_MONITOR_MAX_SCANS, SCAN_MONITOR_MIN_SCANS, SCAN_MONITOR_MAX_NOT_IN_SYSTEM_RATIO, SCAN_MONITOR_MAX_ALREADY_SCANNED_RATIO, SCAN_MONITOR_THROTTLE_SECONDS, SCAN_MONITOR_MAX_USERS
+
+
+class ScanWindow:
+    """
+    Sliding window of scan counters for one user, kept as per-second ring buffers.
+
+    Recording advances the ring by the seconds elapsed since the previous scan, which is
+    bounded by the window size, so every update is O(1) in the number of scans.
+    """
+    __slots__ = ("size", "scans", "not_in_system", "already_scanned", "totals", "last_second")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.scans = array("I", bytes(4 * size))
+        self.not_in_system = array("I", bytes(4 * size))
+        self.already_scanned = array("I", bytes(4 * size))
+        self.totals = [0, 0, 0]
+        self.last_second = 0
+
+    def _advance(self, second: int) -> None:
+        elapsed = second - self.last_second
+        if elapsed <= 0:
+            return
+        if elapsed >= self.size:
+            for ring in (self.scans, self.not_in_system, self.already_scanned):
+                for i in range(self.size):
+                    ring[i] = 0
+            self.totals = [0, 0, 0]
+        else:
+            for s in range(self.last_second + 1, second + 1):
+                slot = s % self.size
+                for i, ring in enumerate((self.scans, self.not_in_system, self.already_scanned)):
+                    self.totals[i] -= ring[slot]
+                    ring[slot] = 0
+        self.last_second = second
+
+    def record(self, second: int, scans: int, not_in_system: int, already_scanned: int) -> None:
+        self._advance(second)
+        slot = second % self.size
+        self.scans[slot] += scans
+        self.not_in_system[slot] += not_in_system
+        self.already_scanned[slot] += already_scanned
+        self.totals[0] += scans
+        self.totals[1] += not_in_system
+        self.totals[2] += already_scanned
+
+
+class ScanMonitor:
+    """
+    Per-process velocity and fraud detector fed with the outcome of every scan batch.
+
+    Users above the scan rate limit, or with too many not_in_system / already_scanned codes
+    in the window, are flagged and throttled for SCAN_MONITOR_THROTTLE_SECONDS.
+    """
+
+    def __init__(self, window_seconds: int, max_scans: int, min_scans: int, max_not_in_system_ratio: float,
+                 max_already_scanned_ratio: float, throttle_seconds: int, max_users: int):
+        self.window_seconds = window_seconds
+        self.max_scans = max_scans
+        self.min_scans = min_scans
+        self.max_not_in_system_ratio = max_not_in_system_ratio
+        self.max_already_scanned_ratio = max_already_scanned_ratio
+        self.throttle_seconds = throttle_seconds
+        self._windows = TTLCache(maxsize=max_users, ttl=window_seconds)
+        self._flagged = TTLCache(maxsize=max_users, ttl=throttle_seconds)
+        self._lock = threading.Lock()
+
+    def _score(self, scans: int, not_in_system: int, already_scanned: int) -> tuple[float, list]:
+        reasons = []
+        score = scans / self.max_scans
+        if scans > self.max_scans:
+            reasons.append("scan_rate")
+        if scans >= self.min_scans:
+            not_in_system_ratio = not_in_system / scans
+            already_scanned_ratio = already_scanned / scans
+            score = max(score, not_in_system_ratio / self.max_not_in_system_ratio, already_scanned_ratio / self.max_already_scanned_ratio)
+            if not_in_system_ratio > self.max_not_in_system_ratio:
+                reasons.append("not_in_system_ratio")
+            if already_scanned_ratio > self.max_already_scanned_ratio:
+                reasons.append("already_scanned_ratio")
+        return score, reasons
+
+    def record(self, email: str, result: dict) -> None:
+        """Adds the outcome of one execute_pin_validation call to the user's window."""
+        not_in_system = result.get("not_in_system", 0)
+        already_scanned = result.get("already_scanned", 0)
+        scans = result.get("success_pins", 0) + result.get("expired", 0) + result.get("invalid", 0) + not_in_system + already_scanned
+        now = time.time()
+
+        with self._lock:
+            window = self._windows.get(email)
+            if window is None:
+                window = ScanWindow(self.window_seconds)
+            window.record(int(now), scans, not_in_system, already_scanned)
+            self._windows[email] = window
+
+            score, reasons = self._score(*window.totals)
+            if reasons:
+                self._flagged[email] = {
+                    "email": email,
+                    "score": round(score, 3),
+                    "reasons": reasons,
+                    "scans": window.totals[0],
+                    "not_in_system": window.totals[1],
+                    "already_scanned": window.totals[2],
+                    "flagged_at": now,
+                    "throttled_until": now + self.throttle_seconds
+                }
+
+    def is_throttled(self, email: str) -> bool:
+        return email in self._flagged
+
+    def clear(self, email: str) -> bool:
+        """Removes a user's flag and counters, e.g. after an admin reviewed the account."""
+        with self._lock:
+            self._windows.pop(email, None)
+            return self._flagged.pop(email, None) is not None
+
+    def suspicious_users(self, limit: Optional[int] = None) -> list[dict]:
+        """Flagged users ordered by descending score."""
+        with self._lock:
+            flagged = list(self._flagged.values())
+        flagged.sort(key=lambda details: details["score"], reverse=True)
+        return flagged[:limit] if limit else flagged
+
+
+scan_monitor = ScanMonitor(
+    SCAN_MONITOR_WINDOW_SECONDS,
+    SCAN_MONITOR_MAX_SCANS,
+    SCAN_MONITOR_MIN_SCANS,
+    SCAN_MONITOR_MAX_NOT_IN_SYSTEM_RATIO,
+    SCAN_MONITOR_MAX_ALREADY_SCANNED_RATIO,
+    SCAN_MONITOR_THROTTLE_SECONDS,
+    SCAN_MONITOR_MAX_USERS
+) if SCAN_MONITOR_ENABLED else None
@@ -0,0 +1,128 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+from flask import Flask, g, request
+from api.config import PROFILER_ENABLED, PROFILER_MAX_SECONDS, PROFILER_REQUEST_STATS_LIMIT
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules whose functions a thread sits in while it waits for work. Stacks ending in them
+# are left out by default so the profile shows threads that were running.
+IDLE_MODULES = ("threading.py", "queue.py", "selectors.py", "socketserver.py", "socket.py", "ssl.py", "concurrent/futures/thread.py")
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(ROOT_DIR):
+        filename = os.path.relpath(filename, ROOT_DIR)
+    else:
+        filename = "/".join(filename.split(os.sep)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread in the process at a fixed interval and counts them
+    as folded stacks ("outer;inner;leaf count" lines), the input flamegraph.pl, speedscope
+    and inferno read. Nothing is installed in the interpreter: sampling runs only while
+    profile() is called, on the calling thread, so there is no cost between profiles.
+    """
+
+    def __init__(self, enabled: bool, max_seconds: float):
+        self.enabled = enabled
+        self.max_seconds = max_seconds
+        self._running = threading.Lock()
+
+    def profile(self, seconds: float, interval: float, include_idle: bool = False) -> Optional[dict]:
+        """
+        Samples for `seconds`, every `interval` seconds.
+
+        Returns:
+            dict: samples (stacks seen), duration and the count per folded stack, or None if
+                  another profile is running.
+
+        Raises:
+            ValueError: If profiling is disabled or the window is out of range.
+        """
+        if not self.enabled:
+            raise ValueError("Profiling is disabled")
+        if not 0 < seconds <= self.max_seconds:
+            raise ValueError(f"seconds must be between 0 and {self.max_seconds}")
+        if not 0.001 <= interval <= 1:
+            raise ValueError("interval_ms must be between 1 and 1000")
+        if not self._running.acquire(blocking=False):
+            return None
+
+        try:
+            own_thread = threading.get_ident()
+            stacks = Counter()
+            samples = 0
+            started = time.monotonic()
+            deadline = started + seconds
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    if not include_idle and frame.f_code.co_filename.endswith(IDLE_MODULES):
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame.f_code))
+                        frame = frame.f_back
+                    stacks[";".join(reversed(labels))] += 1
+                    samples += 1
+                time.sleep(interval)
+            return {"samples": samples, "seconds": round(time.monotonic() - started, 3), "stacks": stacks}
+        finally:
+            self._running.release()
+
+    @staticmethod
+    def folded(stacks: Counter) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+profiler = SamplingProfiler(PROFILER_ENABLED, PROFILER_MAX_SECONDS)
+
+
+def init_profiling(app: Flask) -> None:
+    """
+    Lets admins profile a single request with ?profile=1: the request runs under cProfile
+    and the response is replaced by its stats, sorted by ?profile_sort= (default
+    cumulative). Nothing is registered unless PROFILER_ENABLED is set.
+    """
+    if not PROFILER_ENABLED:
+        return
+    from api.decoraters import has_admin_key
+
+    @app.before_request
+    def start_request_profile():
+        if request.args.get("profile") != "1" or not has_admin_key():
+            return None
+        import cProfile
+        g.request_profile = cProfile.Profile()
+        g.request_profile.enable()
+        return None
+
+    @app.after_request
+    def return_request_profile(response):
+        request_profile = g.pop("request_profile", None)
+        if request_profile is None:
+            return response
+        request_profile.disable()
+
+        import io
+        import pstats
+        output = io.StringIO()
+        sort = request.args.get("profile_sort", "cumulative")
+        try:
+            stats = pstats.Stats(request_profile, stream=output).sort_stats(sort)
+        except KeyError:
+            stats = pstats.Stats(request_profile, stream=output).sort_stats("cumulative")
+        stats.print_stats(PROFILER_REQUEST_STATS_LIMIT)
+
+        profiled = app.response_class(output.getvalue(), status=200, mimetype="text/plain")
+        profiled.headers["X-Profiled-Status"] = str(response.status_code)
+        return profiled
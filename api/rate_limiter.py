@@ -0,0 +1,183 @@
+import logging
+import math
+import threading
+import time
+from typing import Optional
+from flask import Blueprint, jsonify, request
+from cachetools import TTLCache
+from api.config import RATE_LIMIT_ENABLED, RATE_LIMIT_REDIS_URL, RATE_LIMIT_MAX_KEYS
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(rate: str) -> tuple[int, int]:
+    """
+    Parses a rate such as "5/minute" or "10/hour" into (capacity, period in seconds).
+
+    Raises:
+        ValueError: If the rate is malformed.
+    """
+    try:
+        count, period = rate.strip().split("/")
+        capacity, seconds = int(count), PERIODS[period.strip().lower()]
+    except (AttributeError, KeyError, ValueError):
+        raise ValueError(f"Invalid rate limit '{rate}', expected '<count>/<second|minute|hour|day>'")
+    if capacity <= 0:
+        raise ValueError(f"Invalid rate limit '{rate}', count must be positive")
+    return capacity, seconds
+
+
+class MemoryBackend:
+    """
+    Token buckets kept in this process. A bucket is dropped once it would have refilled
+    completely, so idle clients cost no memory.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, period: int) -> float:
+        """Takes one token from the bucket. Returns 0 if allowed, otherwise seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            buckets = self._buckets.get(period)
+            if buckets is None:
+                buckets = self._buckets[period] = TTLCache(maxsize=self.max_keys, ttl=period)
+
+            tokens, updated = buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * capacity / period)
+            if tokens < 1:
+                buckets[key] = (tokens, now)
+                return (1 - tokens) * period / capacity
+            buckets[key] = (tokens - 1, now)
+            return 0.0
+
+
+class RedisBackend:
+    """
+    Token buckets shared by every worker through Redis. The refill and take run as one
+    Lua script so concurrent workers cannot both spend the last token.
+    """
+
+    TAKE_SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local period = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * capacity / period)
+    local retry_after = 0
+    if tokens < 1 then
+        retry_after = (1 - tokens) * period / capacity
+    else
+        tokens = tokens - 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(period))
+    return tostring(retry_after)
+    """
+
+    def __init__(self, url: str, fallback: MemoryBackend):
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._take = self._client.register_script(self.TAKE_SCRIPT)
+        self._fallback = fallback
+
+    def take(self, key: str, capacity: int, period: int) -> float:
+        try:
+            return float(self._take(keys=[f"rate_limit:{key}"], args=[capacity, period, time.time()]))
+        except Exception as e:
+            # Keep limiting per process while Redis is unreachable
+            logger.warning(f"Rate limit backend error, using local buckets: {str(e)}", extra={"event": "rate_limit_backend_error"})
+            return self._fallback.take(key, capacity, period)
+
+
+class RateLimiter:
+    """
+    Per blueprint rate limits checked in a before_request hook, so rejected requests
+    never reach the database or the mail server.
+
+    Each limit is keyed by "ip" (the client address), "email" (the email in the JSON body
+    or URL) or "route" (all clients together), and applies to one endpoint or to the whole blueprint.
+    """
+
+    def __init__(self, backend=None, enabled: bool = True):
+        self.backend = backend or MemoryBackend(RATE_LIMIT_MAX_KEYS)
+        self.enabled = enabled
+        self._limits = {}
+
+    def limit(self, blueprint: Blueprint, rate: str, key: str = "ip", endpoint: Optional[str] = None) -> None:
+        """
+        Registers a limit on a blueprint.
+
+        Args:
+            blueprint (Blueprint): The blueprint whose requests are limited.
+            rate (str): The allowed rate, e.g. "5/minute".
+            key (str): What the bucket is keyed by: "ip", "email" or "route".
+            endpoint (str, optional): The view function name; the whole blueprint when omitted.
+        """
+        if key not in ("ip", "email", "route"):
+            raise ValueError(f"Invalid rate limit key '{key}'")
+        capacity, period = parse_rate(rate)
+
+        if blueprint.name not in self._limits:
+            self._limits[blueprint.name] = []
+            blueprint.before_request(self._check)
+        self._limits[blueprint.name].append((endpoint, key, capacity, period))
+
+    def _key_value(self, key: str) -> Optional[str]:
+        if key == "route":
+            return "all"
+        if key == "ip":
+            # Vercel puts the client address first in X-Forwarded-For
+            return request.access_route[0] if request.access_route else request.remote_addr
+        email = (request.view_args or {}).get("email") or request.args.get("email")
+        if not email:
+            data = request.get_json(silent=True)
+            email = data.get("email") if isinstance(data, dict) else None
+        return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+    def _check(self):
+        if not self.enabled or request.method == "OPTIONS" or not request.endpoint:
+            return None
+
+        blueprint_name, _, endpoint = request.endpoint.partition(".")
+        retry_after = 0.0
+        for limit_endpoint, key, capacity, period in self._limits.get(blueprint_name, []):
+            if limit_endpoint is not None and limit_endpoint != endpoint:
+                continue
+            value = self._key_value(key)
+            if value is None:
+                continue
+            bucket = f"{blueprint_name}:{limit_endpoint or '*'}:{key}:{value}:{capacity}/{period}"
+            retry_after = max(retry_after, self.backend.take(bucket, capacity, period))
+
+        if retry_after > 0:
+            logger.info(f"Rate limited {request.method} {request.path}", extra={"event": "rate_limited", "retry_after": round(retry_after, 1)})
+            response = jsonify({"message": "Too many requests, please try later"})
+            response.status_code = 429
+            response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+            return response
+        return None
+
+
+def _create_backend():
+    local = MemoryBackend(RATE_LIMIT_MAX_KEYS)
+    if not RATE_LIMIT_REDIS_URL:
+        return local
+    if redis is None:
+        logger.warning("RATE_LIMIT_REDIS_URL is set but the redis package is not installed, using local buckets")
+        return local
+    return RedisBackend(RATE_LIMIT_REDIS_URL, local)
+
+
+limiter = RateLimiter(_create_backend(), RATE_LIMIT_ENABLED)
@@ -0,0 +1,18 @@
+def replica_lag_query() -> str:
+    """
+    Returns a SQL query for how many seconds a replica is behind its primary.
+
+    A replica that has replayed everything it received is not behind, however long ago the
+    last transaction was; a server that is not in recovery is a primary and never is. The
+    lag is NULL while a replica that has not replayed any transaction yet is catching up.
+
+    Returns:
+        str: A SQL query string returning the lag in seconds as a single value.
+    """
+    return """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END;
+    """
@@ -0,0 +1,189 @@
+import hashlib
+import threading
+import time
+from functools import wraps
+from typing import Callable, Optional
+from cachetools import LRUCache
+from flask import current_app, request
+from api.config import RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_ENTRY_BYTES
+
+# Rough per-entry bookkeeping on top of the body and the key
+ENTRY_OVERHEAD_BYTES = 256
+
+
+class CachedResponse:
+    """A rendered 200 response with the data versions it was built from."""
+
+    __slots__ = ("body", "content_type", "etag", "versions", "created", "size", "refreshing")
+
+    def __init__(self, body: bytes, content_type: str, versions: tuple, key_size: int):
+        self.body = body
+        self.content_type = content_type
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.versions = versions
+        self.created = time.monotonic()
+        self.size = len(body) + key_size + ENTRY_OVERHEAD_BYTES
+        self.refreshing = False
+
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+
+class _ResponseLRU(LRUCache):
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize=maxsize, getsizeof=lambda entry: entry.size)
+        self.evictions = 0
+
+    def popitem(self):
+        self.evictions += 1
+        return super().popitem()
+
+
+class ResponseCache:
+    """
+    In-process cache of rendered GET responses, least recently used first out once the
+    bodies add up to max_bytes. Routes declare the data they are built from ("schemes",
+    "users"); writes bump those versions, and an entry built from an older version is
+    never served again. Versions are per process like the user cache, so other workers
+    pick a change up when their entry's max-age runs out.
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int, enabled: bool = True):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self._entries = _ResponseLRU(max_bytes)
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "stale_hits": 0, "misses": 0, "not_modified": 0, "stores": 0, "too_large": 0}
+
+    def bump(self, name: str) -> None:
+        """Marks the data behind name as changed. Call after every write to it."""
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+    def versions(self, names: tuple) -> tuple:
+        """Token to take before rendering a response, to be passed back to put()."""
+        with self._lock:
+            return tuple(self._versions.get(name, 0) for name in names)
+
+    def get(self, key: tuple, versions: tuple, max_age: int, stale_seconds: int) -> Optional[CachedResponse]:
+        """
+        Returns the entry to serve, or None when the caller has to render the response.
+        Past max_age, one caller re-renders while the others are served the old entry
+        for up to stale_seconds more.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.versions != versions:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.metrics["misses"] += 1
+                return None
+            age = entry.age()
+            if age < max_age:
+                self.metrics["hits"] += 1
+                return entry
+            if age < max_age + stale_seconds:
+                if entry.refreshing:
+                    self.metrics["stale_hits"] += 1
+                    return entry
+                entry.refreshing = True
+            self.metrics["misses"] += 1
+            return None
+
+    def release(self, key: tuple) -> None:
+        """Lets another caller refresh the entry after a render that was not stored."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refreshing = False
+
+    def put(self, key: tuple, entry: CachedResponse, names: tuple) -> bool:
+        """Stores entry unless it is too large or one of names changed while it was rendered."""
+        with self._lock:
+            if entry.size > self.max_entry_bytes:
+                self.metrics["too_large"] += 1
+                return False
+            if tuple(self._versions.get(name, 0) for name in names) != entry.versions:
+                return False
+            self._entries[key] = entry
+            self.metrics["stores"] += 1
+            return True
+
+    def record(self, metric: str) -> None:
+        with self._lock:
+            self.metrics[metric] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.metrics["hits"] + self.metrics["stale_hits"]
+            misses = self.metrics["misses"]
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._entries.currsize,
+                "max_bytes": self.max_bytes,
+                "evictions": self._entries.evictions,
+                "versions": dict(self._versions),
+                "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                **self.metrics,
+            }
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_ENTRY_BYTES, RESPONSE_CACHE_ENABLED)
+
+
+def cached_response(depends_on: tuple, max_age: int, stale_while_revalidate: int = 0, private: bool = False) -> Callable:
+    """
+    Serves a GET route's 200 responses from response_cache and answers If-None-Match
+    with 304. Responses carry a strong ETag of the body, so a client or CDN revalidating
+    after a write that did not change the output still gets a 304, and Cache-Control
+    with max_age and stale_while_revalidate. The key is the path, the query string and
+    the request body, as some routes read their arguments from a JSON body.
+    """
+    cache_control = f"{'private' if private else 'public'}, max-age={max_age}"
+    if stale_while_revalidate:
+        cache_control += f", stale-while-revalidate={stale_while_revalidate}"
+
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not response_cache.enabled or request.method not in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+
+            body = request.get_data()
+            key = (request.path, tuple(sorted(request.args.items(multi=True))), body)
+            versions = response_cache.versions(depends_on)
+            entry = response_cache.get(key, versions, max_age, stale_while_revalidate)
+            response = None
+            if entry is None:
+                stored = False
+                try:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    entry = CachedResponse(response.get_data(), response.content_type, versions,
+                                           len(request.path) + len(body))
+                    stored = response_cache.put(key, entry, depends_on)
+                finally:
+                    if not stored:
+                        response_cache.release(key)
+                state = "MISS"
+            else:
+                state = "HIT" if entry.age() < max_age else "STALE"
+
+            if request.if_none_match.contains_weak(entry.etag):
+                response_cache.record("not_modified")
+                response = current_app.response_class(status=304)
+            elif response is None:
+                response = current_app.response_class(entry.body, content_type=entry.content_type)
+            response.set_etag(entry.etag)
+            response.headers["Cache-Control"] = cache_control
+            response.headers["X-Cache"] = state
+            if state != "MISS":
+                response.headers["Age"] = str(int(entry.age()))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,61 @@
+import logging
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """
+    Runs registered tasks at fixed intervals on a single daemon thread.
+
+    Meant for long running deployments; on Vercel the same work is triggered by the
+    cron entries in vercel.json instead, since functions do not outlive their request.
+    """
+
+    def __init__(self):
+        self._tasks = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def every(self, seconds: int, func: Callable[[], object], name: str) -> None:
+        """Registers func to run every `seconds`, first after one interval has passed."""
+        if seconds <= 0:
+            raise ValueError("Interval must be a positive number of seconds")
+        with self._lock:
+            self._tasks.append({"name": name, "func": func, "interval": seconds, "next_run": time.monotonic() + seconds})
+
+    def start(self) -> bool:
+        """Starts the scheduler thread unless it is already running or has nothing to run."""
+        with self._lock:
+            if not self._tasks or (self._thread is not None and self._thread.is_alive()):
+                return False
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            now = time.monotonic()
+            with self._lock:
+                due = [task for task in self._tasks if task["next_run"] <= now]
+                for task in due:
+                    task["next_run"] = now + task["interval"]
+                next_run = min(task["next_run"] for task in self._tasks)
+
+            for task in due:
+                try:
+                    task["func"]()
+                except Exception as e:
+                    logger.exception(f"Error running scheduled task {task['name']}: {str(e)}")
+
+            self._stop.wait(max(0.0, next_run - time.monotonic()))
+
+
+scheduler = Scheduler()
@@ -0,0 +1,125 @@
+import argparse
+import os
+import platform
+import subprocess
+import sys
+from typing import Optional
+from api.config import STARTUP_IMPORT_BUDGET_MS
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(API_DIR)
+REPORT_FILE = os.path.join(ROOT_DIR, "startup_report.txt")
+
+
+def _import_times(code: str) -> list[tuple[int, str, int]]:
+    """
+    Runs code in a fresh interpreter under -X importtime.
+
+    Returns:
+        list: (depth, module, cumulative microseconds) per import, in the order Python
+              reports them, which puts every module after the modules it imported.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([API_DIR, ROOT_DIR])
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=API_DIR, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing the app failed: {result.stderr.strip().splitlines()[-1]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        imports.append((depth, name.strip(), int(cumulative)))
+    return imports
+
+
+def _measure(prefix: Optional[str], routes_module: Optional[str] = None) -> dict:
+    """Import cost of app.py and, for a prefix, of building the app that serves it."""
+    code = "import app"
+    if prefix is not None:
+        # importlib.import_module() is not timed by -X importtime, so the routes module
+        # is imported with a statement before the app for the prefix is built
+        code += f"; import {routes_module}; app.app.app_for({prefix!r})"
+    imports = _import_times(code)
+    position = next(index for index, (depth, name, _) in enumerate(imports) if depth == 0 and name == "app")
+
+    children, start = [], position
+    while start > 0 and imports[start - 1][0] > 0:
+        start -= 1
+        if imports[start][0] == 1:
+            children.append(imports[start])
+    lazy = imports[position + 1:]
+    return {
+        "import_us": imports[position][2],
+        "children": sorted(children, key=lambda item: -item[2]),
+        "lazy_us": sum(cumulative for depth, _, cumulative in lazy if depth == 0),
+        # The routes module is the only top level import; list what it pulls in
+        "lazy": sorted((item for item in lazy if item[0] == 1), key=lambda item: -item[2])
+    }
+
+
+def build_report(runs: int = 5, top: int = 10) -> tuple[str, bool]:
+    """
+    Measures a cold start: importing app.py, then building the app for each blueprint
+    prefix as its first request would. Every figure is the median of runs fresh
+    interpreters.
+
+    Returns:
+        tuple: The report text and whether the slowest cold start is within
+               STARTUP_IMPORT_BUDGET_MS.
+    """
+    from api.app import BLUEPRINTS
+
+    def median(prefix):
+        samples = [_measure(prefix, prefix and BLUEPRINTS[prefix][1]) for _ in range(runs)]
+        samples.sort(key=lambda sample: sample["import_us"] + sample["lazy_us"])
+        return samples[len(samples) // 2]
+
+    base = median(None)
+    lines = [
+        f"Cold start import report (python -X importtime, median of {runs} runs)",
+        f"Python {platform.python_version()} on {platform.system()} {platform.machine()}, "
+        f"bytecode cache {'off, sources are compiled on every import' if os.environ.get('PYTHONDONTWRITEBYTECODE') else 'on'}",
+        f"Budget: {STARTUP_IMPORT_BUDGET_MS} ms for importing app.py plus the first request to any prefix",
+        "",
+        f"import app: {base['import_us'] / 1000:.1f} ms",
+    ]
+    lines += [f"  {cumulative / 1000:8.1f} ms  {name}" for _, name, cumulative in base["children"][:top]]
+
+    slowest = 0
+    for prefix in BLUEPRINTS:
+        measured = median(prefix)
+        total_ms = (measured["import_us"] + measured["lazy_us"]) / 1000
+        slowest = max(slowest, total_ms)
+        lines += ["", f"first request to {prefix}: +{measured['lazy_us'] / 1000:.1f} ms imports, {total_ms:.1f} ms cold start"]
+        lines += [f"  {cumulative / 1000:8.1f} ms  {name}" for _, name, cumulative in measured["lazy"][:top]]
+
+    within_budget = slowest <= STARTUP_IMPORT_BUDGET_MS
+    lines += ["", f"Slowest cold start: {slowest:.1f} ms ({'within' if within_budget else 'OVER'} the {STARTUP_IMPORT_BUDGET_MS} ms budget)"]
+    return "\n".join(lines) + "\n", within_budget
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Report the import cost of a cold start and check it against STARTUP_IMPORT_BUDGET_MS.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters measured per figure")
+    parser.add_argument("--write", action="store_true", help=f"Also save the report to {os.path.basename(REPORT_FILE)}")
+    args = parser.parse_args(argv)
+
+    try:
+        report, within_budget = build_report(args.runs)
+    except Exception as e:
+        print(f"Startup report failed: {str(e)}")
+        return 1
+
+    print(report, end="")
+    if args.write:
+        with open(REPORT_FILE, "w") as report_file:
+            report_file.write(report)
+    return 0 if within_budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import importlib.util
+import os
+import pytest
+from api import app as app_module, scheduler as scheduler_module
+from api.points_api.utils import code_filter as code_filter_module
+from api.scheduler import Scheduler
+
+CONFIG = os.path.join(os.path.dirname(__file__), "config.py")
+
+
+def load_config(monkeypatch, **env):
+    """A separate copy of config.py read with env set, so api.config is left alone."""
+    for name, value in env.items():
+        if value is None:
+            monkeypatch.delenv(name, raising=False)
+        else:
+            monkeypatch.setenv(name, value)
+    spec = importlib.util.spec_from_file_location("config_probe", CONFIG)
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    return config
+
+
+@pytest.mark.parametrize("vercel, interval", [(None, 3600), ("1", 0)])
+def test_leaderboard_refresh_is_on_by_default_off_vercel(monkeypatch, vercel, interval):
+    config = load_config(monkeypatch, VERCEL=vercel, LEADERBOARD_REFRESH_INTERVAL_SECONDS=None)
+
+    assert config.LEADERBOARD_REFRESH_INTERVAL_SECONDS == interval
+
+
+def test_leaderboard_refresh_interval_can_be_set(monkeypatch):
+    config = load_config(monkeypatch, VERCEL="1", LEADERBOARD_REFRESH_INTERVAL_SECONDS="600")
+
+    assert config.LEADERBOARD_REFRESH_INTERVAL_SECONDS == 600
+
+
+@pytest.mark.parametrize("vercel, interval", [(None, 86400), ("1", 0)])
+def test_scheme_sweep_is_on_by_default_off_vercel(monkeypatch, vercel, interval):
+    config = load_config(monkeypatch, VERCEL=vercel, SCHEME_SWEEP_INTERVAL_SECONDS=None)
+
+    assert config.SCHEME_SWEEP_INTERVAL_SECONDS == interval
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    """A scheduler that records its tasks instead of starting a thread."""
+    scheduler = Scheduler()
+    monkeypatch.setattr(scheduler, "start", lambda: False)
+    monkeypatch.setattr(scheduler_module, "scheduler", scheduler)
+    monkeypatch.setattr(code_filter_module, "code_filter", None)
+    monkeypatch.setattr(app_module, "JOB_RUNNER_ENABLED", False)
+    monkeypatch.setattr(app_module, "SCHEME_SWEEP_INTERVAL_SECONDS", 0)
+    return scheduler
+
+
+def scheduled(scheduler) -> dict:
+    return {task["name"]: task["interval"] for task in scheduler._tasks}
+
+
+def test_background_work_refreshes_leaderboards(monkeypatch, scheduler):
+    monkeypatch.setattr(app_module, "LEADERBOARD_REFRESH_INTERVAL_SECONDS", 3600)
+
+    app_module.start_background_work()
+    assert scheduled(scheduler) == {"refresh_leaderboards": 3600}
+
+
+def test_background_work_sweeps_expired_schemes(monkeypatch, scheduler):
+    monkeypatch.setattr(app_module, "LEADERBOARD_REFRESH_INTERVAL_SECONDS", 0)
+    monkeypatch.setattr(app_module, "SCHEME_SWEEP_INTERVAL_SECONDS", 86400)
+
+    app_module.start_background_work()
+    assert scheduled(scheduler) == {"expire_schemes": 86400}
+
+
+def test_background_work_without_intervals_schedules_nothing(monkeypatch, scheduler):
+    monkeypatch.setattr(app_module, "LEADERBOARD_REFRESH_INTERVAL_SECONDS", 0)
+
+    app_module.start_background_work()
+    assert scheduled(scheduler) == {}
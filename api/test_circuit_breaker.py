@@ -0,0 +1,159 @@
+import pytest
+from flask import Flask, jsonify
+import api.circuit_breaker as circuit_breaker
+from api.circuit_breaker import CircuitBreaker, CircuitOpenError, init_circuit_breakers, CLOSED, OPEN, HALF_OPEN
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces time.monotonic with a clock the test moves by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    settings = {"enabled": True, "window_seconds": 10, "min_failures": 3, "failure_ratio": 0.5,
+                "open_seconds": 30, "half_open_probes": 1}
+    settings.update(overrides)
+    return CircuitBreaker("db", **settings)
+
+
+def fail(breaker: CircuitBreaker, times: int = 1) -> None:
+    for _ in range(times):
+        breaker.record(True, RuntimeError("connection refused"))
+
+
+def test_stays_closed_below_min_failures(clock):
+    breaker = make_breaker()
+    fail(breaker, 2)
+
+    assert breaker.state == CLOSED
+    breaker.allow()
+
+
+def test_stays_closed_below_failure_ratio(clock):
+    breaker = make_breaker()
+    for _ in range(10):
+        breaker.record(False)
+    fail(breaker, 3)
+
+    assert breaker.state == CLOSED
+
+
+def test_opens_and_rejects_calls(clock):
+    breaker = make_breaker()
+    fail(breaker, 3)
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.allow()
+    assert error.value.retry_after == pytest.approx(30)
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_failures_leave_the_window(clock):
+    breaker = make_breaker()
+    fail(breaker, 2)
+    clock[0] += 11
+    fail(breaker, 1)
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_success_closes(clock):
+    breaker = make_breaker()
+    fail(breaker, 3)
+    clock[0] += 30
+
+    breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only half_open_probes calls get through while the probe is in flight
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CLOSED
+    breaker.allow()
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = make_breaker()
+    fail(breaker, 3)
+    clock[0] += 30
+
+    breaker.allow()
+    fail(breaker)
+    assert breaker.state == OPEN
+    assert breaker.retry_after() == pytest.approx(30)
+
+
+def test_call_counts_only_outage_errors(clock):
+    breaker = make_breaker()
+
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            with breaker.call(is_failure=lambda error: not isinstance(error, ValueError)):
+                raise ValueError("bad input")
+    assert breaker.state == CLOSED
+    assert breaker.stats()["failures"] == 0
+
+    # The bad input calls count as successes, so it takes 5 of 10 calls failing
+    for _ in range(5):
+        with pytest.raises(ConnectionError):
+            with breaker.call():
+                raise ConnectionError("timeout")
+    assert breaker.state == OPEN
+
+
+def test_disabled_breaker_never_opens(clock):
+    breaker = make_breaker(enabled=False)
+    fail(breaker, 10)
+
+    assert breaker.state == CLOSED
+    breaker.allow()
+
+
+@pytest.fixture
+def app(clock):
+    breaker = make_breaker()
+    app = Flask(__name__)
+    init_circuit_breakers(app)
+
+    @app.route("/open")
+    def open_circuit():
+        fail(breaker, 3)
+        breaker.allow()
+        return jsonify({"message": "unreachable"})
+
+    @app.route("/caught")
+    def caught():
+        # Routes catch the error and answer 500; the hook turns that into a 503
+        try:
+            with breaker.call():
+                raise ConnectionError("timeout")
+        except ConnectionError:
+            return jsonify({"message": "Internal server error"}), 500
+
+    @app.route("/bad_input")
+    def bad_input():
+        return jsonify({"message": "bad input"}), 400
+
+    return app
+
+
+def test_open_circuit_answers_503_with_retry_after(app):
+    response = app.test_client().get("/open")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+
+
+def test_dependency_failure_turns_500_into_503(app):
+    response = app.test_client().get("/caught")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_other_responses_are_left_alone(app):
+    assert app.test_client().get("/bad_input").status_code == 400
@@ -0,0 +1,208 @@
+import contextvars
+import pytest
+from flask import Flask, request
+from psycopg2 import OperationalError
+from api import database
+from api.database import ReadOnlyQuery, ReplicaRouter, on_primary
+
+
+class Lags:
+    """Stands in for ReplicaRouter.fetch: each replica's lag, or the error its query raises."""
+
+    def __init__(self, lags: dict):
+        self.lags = lags
+        self.checks = []
+
+    def __call__(self, replica, query, params=None):
+        self.checks.append(replica.dsn)
+        lag = self.lags[replica.dsn]
+        if isinstance(lag, Exception):
+            raise lag
+        return [(lag,)]
+
+
+@pytest.fixture(autouse=True)
+def primary_until(monkeypatch):
+    # note_write() outside a request would otherwise keep later tests on the primary
+    monkeypatch.setattr(database, "_primary_until", contextvars.ContextVar("primary_until", default=0.0))
+
+
+def make_router(lags: dict, sticky_seconds: float = 15) -> ReplicaRouter:
+    router = ReplicaRouter(list(lags), max_lag_seconds=5, check_seconds=60, sticky_seconds=sticky_seconds, max_sessions=100)
+    router.fetch = Lags(lags)
+    return router
+
+
+def test_reads_go_to_usable_replicas_in_turn():
+    router = make_router({"host=r1": 0, "host=r2": 1.5})
+
+    assert [router.route().dsn for _ in range(4)] == ["host=r1", "host=r2", "host=r1", "host=r2"]
+    assert [replica.reads for replica in router.replicas] == [2, 2]
+
+
+def test_lag_is_checked_at_most_every_check_seconds():
+    router = make_router({"host=r1": 0})
+
+    for _ in range(3):
+        router.route()
+    assert router.fetch.checks == ["host=r1"]
+
+    router.replicas[0].checked_at -= 61
+    router.route()
+    assert router.fetch.checks == ["host=r1", "host=r1"]
+
+
+@pytest.mark.parametrize("lag", [30, None, OperationalError("could not connect")])
+def test_lagging_or_failing_replicas_are_skipped(lag):
+    router = make_router({"host=r1": lag, "host=r2": 0})
+
+    assert [router.route().dsn for _ in range(3)] == ["host=r2"] * 3
+    assert not router.replicas[0].usable
+
+
+def test_reads_fall_back_to_the_primary_without_a_usable_replica():
+    router = make_router({"host=r1": 30})
+
+    assert router.route() is None
+    assert router.primary_reads["no_replica"] == 1
+
+    router.fetch.lags["host=r1"] = 0
+    router.replicas[0].checked_at -= 61
+    assert router.route() is router.replicas[0]
+
+
+def test_failed_replica_stays_out_until_its_next_check():
+    router = make_router({"host=r1": 0})
+    replica = router.route()
+
+    router.mark_failed(replica, OperationalError("server closed the connection\nunexpectedly"))
+
+    assert router.route() is None
+    assert router.status()["replicas"][0]["error"] == "server closed the connection unexpectedly"
+    assert router.primary_reads == {"sticky": 0, "no_replica": 1, "replica_failed": 1}
+
+
+def test_writer_reads_its_writes_from_the_primary():
+    router = make_router({"host=r1": 0})
+    app = Flask(__name__)
+
+    with app.test_request_context("/user/get_points?email=A@example.com"):
+        router.note_write()
+        assert router.route() is None
+    with app.test_request_context("/user/get_points?email=a@example.com"):
+        assert router.route() is None
+    with app.test_request_context(json={"email": "b@example.com"}):
+        assert router.route() is router.replicas[0]
+    with app.test_request_context():
+        request.user = "a@example.com"
+        assert router.route() is None
+
+    assert router.primary_reads["sticky"] == 3
+    assert router.status()["sticky_sessions"] == 1
+
+
+def test_clients_without_an_email_are_told_apart_by_address():
+    router = make_router({"host=r1": 0})
+    app = Flask(__name__)
+
+    with app.test_request_context(environ_base={"REMOTE_ADDR": "10.0.0.1"}):
+        router.note_write()
+        assert router.route() is None
+    with app.test_request_context(environ_base={"REMOTE_ADDR": "10.0.0.2"}):
+        assert router.route() is router.replicas[0]
+
+
+def test_writes_outside_a_request_stick_to_the_primary():
+    router = make_router({"host=r1": 0})
+
+    router.note_write()
+    assert router.route() is None
+
+    database._primary_until.set(0.0)
+    assert router.route() is router.replicas[0]
+
+
+def test_no_stickiness_when_disabled():
+    router = make_router({"host=r1": 0}, sticky_seconds=0)
+
+    router.note_write()
+    with Flask(__name__).test_request_context("/?email=a@example.com"):
+        router.note_write()
+        assert router.route() is router.replicas[0]
+
+
+def test_on_primary_block():
+    router = make_router({"host=r1": 0})
+
+    with on_primary():
+        assert router.route() is None
+    assert router.route() is router.replicas[0]
+
+
+class Connection:
+    """A primary connection whose cursor returns rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+        self.closed = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+
+    def fetchall(self):
+        return self.rows
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def primary(monkeypatch):
+    connection = Connection([("primary",)])
+    monkeypatch.setattr(database, "get_connection", lambda: connection)
+    monkeypatch.setattr(database, "release_connection", lambda connection: None)
+    return connection
+
+
+def test_execute_query_reads_marked_queries_from_a_replica(monkeypatch, primary):
+    router = make_router({"host=r1": 0})
+    monkeypatch.setattr(database, "replica_router", router)
+    router.route()
+    monkeypatch.setattr(router, "fetch", lambda replica, query, params=None: [("replica",)])
+
+    assert database.execute_query(ReadOnlyQuery("SELECT 1;"), fetch_results=True) == [("replica",)]
+    assert database.execute_query("SELECT 1;", fetch_results=True) == [("primary",)]
+    assert primary.executed == ["SELECT 1;"]
+
+
+def test_execute_query_falls_back_to_the_primary_when_the_replica_fails(monkeypatch, primary):
+    router = make_router({"host=r1": 0})
+    monkeypatch.setattr(database, "replica_router", router)
+    router.route()
+
+    def fail(replica, query, params=None):
+        raise OperationalError("canceling statement due to conflict with recovery")
+    monkeypatch.setattr(router, "fetch", fail)
+
+    assert database.execute_query(ReadOnlyQuery("SELECT 1;"), fetch_results=True) == [("primary",)]
+    assert not router.replicas[0].usable
+    assert router.primary_reads["replica_failed"] == 1
+
+
+def test_read_only_marks_query_functions():
+    @database.read_only
+    def some_query() -> str:
+        return "SELECT 1;"
+
+    assert isinstance(some_query(), ReadOnlyQuery)
+    assert some_query.__name__ == "some_query"
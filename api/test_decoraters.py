@@ -0,0 +1,35 @@
+import pytest
+from flask import Flask
+from api import decoraters
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(decoraters, "ADMIN_KEY", "admin-key")
+    monkeypatch.setattr(decoraters, "CRON_SECRET", "cron-secret")
+    app = Flask(__name__)
+
+    @app.route("/protected")
+    @decoraters.admin_required
+    def protected():
+        return "ok"
+
+    return app.test_client()
+
+
+@pytest.mark.parametrize("headers, status", [
+    ({}, 401),
+    ({"X-Admin-Key": "wrong"}, 403),
+    ({"X-Admin-Key": "admin-key"}, 200),
+    ({"Authorization": "Bearer cron-secret"}, 200),
+    ({"Authorization": "Bearer wrong"}, 401),
+])
+def test_admin_required(client, headers, status):
+    assert client.get("/protected", headers=headers).status_code == status
+
+
+def test_admin_required_without_admin_key_configured(client, monkeypatch):
+    monkeypatch.setattr(decoraters, "ADMIN_KEY", None)
+
+    assert client.get("/protected", headers={"X-Admin-Key": "admin-key"}).status_code == 503
+    assert client.get("/protected", headers={"Authorization": "Bearer cron-secret"}).status_code == 200
@@ -0,0 +1,156 @@
+import json
+import pytest
+from api import job_runner as job_runner_module
+from api.job_runner import JobRunner
+from api.job_queries import claim_jobs_query, complete_job_query, fail_job_query, enqueue_job_query
+
+
+class FakeQueue:
+    """Stands in for the jobs table: hands out the queued job tuples and records completions and failures."""
+
+    def __init__(self, jobs=()):
+        self.jobs = list(jobs)
+        self.completed = []
+        self.failed = []
+
+    def execute_query(self, query, params=None, fetch_results=False):
+        if query == complete_job_query():
+            self.completed.append(params["id"])
+        elif query == fail_job_query():
+            self.failed.append(params)
+        return 1
+
+    def execute_query_for_points(self, query, params=None, fetch_results=False):
+        if query == claim_jobs_query():
+            claimed, self.jobs = self.jobs[:params["limit"]], self.jobs[params["limit"]:]
+            return claimed
+        if query == enqueue_job_query():
+            return [(42,)]
+        raise AssertionError(f"unexpected query {query}")
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = FakeQueue()
+    monkeypatch.setattr(job_runner_module, "execute_query", queue.execute_query)
+    monkeypatch.setattr(job_runner_module, "execute_query_for_points", queue.execute_query_for_points)
+    monkeypatch.setattr(job_runner_module, "JOB_RETRY_BASE_SECONDS", 30)
+    return queue
+
+
+@pytest.fixture
+def runner():
+    runner = JobRunner(workers=2, poll_seconds=60)
+    runner.calls = []
+
+    @runner.handler("echo")
+    def echo(payload):
+        runner.calls.append(payload)
+
+    @runner.handler("broken")
+    def broken(payload):
+        raise RuntimeError("smtp down")
+
+    return runner
+
+
+def test_successful_job_is_completed(queue, runner):
+    assert runner._execute((1, "echo", {"x": 1}, 1, 5))
+
+    assert runner.calls == [{"x": 1}]
+    assert queue.completed == [1]
+    assert queue.failed == []
+
+
+@pytest.mark.parametrize("attempts, retry_seconds", [(1, 30), (2, 60), (4, 240), (12, 3600)])
+def test_failed_job_is_retried_with_exponential_backoff(queue, runner, attempts, retry_seconds):
+    assert not runner._execute((1, "broken", {}, attempts, 20))
+
+    assert queue.completed == []
+    assert queue.failed == [{"id": 1, "error": "smtp down", "retry_seconds": retry_seconds}]
+
+
+def test_job_without_handler_is_failed(queue, runner):
+    assert not runner._execute((1, "unknown", {}, 1, 5))
+
+    assert "No handler registered" in queue.failed[0]["error"]
+
+
+def test_enqueue_requires_a_handler(queue, runner):
+    with pytest.raises(ValueError):
+        runner.enqueue("unknown")
+
+    assert runner.enqueue("echo", {"x": 1}) == 42
+
+
+def test_run_pending_drains_the_queue(queue, runner):
+    queue.jobs = [(1, "echo", {}, 1, 5), (2, "broken", {}, 1, 5), (3, "echo", {}, 1, 5)]
+
+    assert runner.run_pending() == {"succeeded": 2, "failed": 1}
+    assert queue.completed == [1, 3]
+
+
+def test_run_pending_stops_at_the_limit(queue, runner):
+    queue.jobs = [(job_id, "echo", {}, 1, 5) for job_id in range(5)]
+
+    assert runner.run_pending(limit=3) == {"succeeded": 3, "failed": 0}
+    assert len(queue.jobs) == 2
+
+
+def enqueue(cursor, job_type, priority=100, max_attempts=5, delay_seconds=0):
+    params = {"job_type": job_type, "payload": json.dumps({}), "priority": priority,
+              "max_attempts": max_attempts, "delay_seconds": delay_seconds}
+    cursor.execute(enqueue_job_query(), params)
+    return cursor.fetchone()[0]
+
+
+def claim(cursor, limit=10):
+    cursor.execute(claim_jobs_query(), {"limit": limit, "stale_seconds": 300})
+    return [row[0] for row in cursor.fetchall()]
+
+
+@pytest.fixture
+def jobs(database):
+    cursor = database.cursor()
+    # Leave other queued jobs in the test database out of the claims
+    cursor.execute("UPDATE jobs SET status = 'done' WHERE status IN ('queued', 'running')")
+    return cursor
+
+
+def test_claim_takes_lowest_priority_value_first_and_skips_delayed_jobs(jobs):
+    low = enqueue(jobs, "echo", priority=200)
+    high = enqueue(jobs, "echo", priority=10)
+    enqueue(jobs, "echo", priority=1, delay_seconds=600)
+
+    assert claim(jobs, limit=1) == [high]
+    assert claim(jobs) == [low]
+    assert claim(jobs) == []
+
+
+def test_failed_attempts_are_requeued_until_max_attempts(jobs):
+    job_id = enqueue(jobs, "broken", max_attempts=2)
+
+    for expected_status in ("queued", "failed"):
+        assert claim(jobs) == [job_id]
+        jobs.execute(fail_job_query(), {"id": job_id, "error": "smtp down", "retry_seconds": 0})
+        jobs.execute("SELECT status, attempts, last_error FROM jobs WHERE id = %s", (job_id,))
+        status, attempts, last_error = jobs.fetchone()
+        assert status == expected_status and last_error == "smtp down"
+    assert attempts == 2
+    assert claim(jobs) == []
+
+
+def test_retry_waits_for_the_backoff(jobs):
+    job_id = enqueue(jobs, "broken")
+    claim(jobs)
+    jobs.execute(fail_job_query(), {"id": job_id, "error": "smtp down", "retry_seconds": 60})
+
+    assert claim(jobs) == []
+
+
+def test_stale_running_job_is_claimed_again(jobs):
+    job_id = enqueue(jobs, "echo")
+    claim(jobs)
+    jobs.execute("UPDATE jobs SET locked_at = CURRENT_TIMESTAMP - INTERVAL '1 hour' WHERE id = %s", (job_id,))
+
+    assert claim(jobs) == [job_id]
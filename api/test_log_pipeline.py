@@ -0,0 +1,146 @@
+import json
+import logging
+import queue
+import pytest
+from flask import Flask
+from api import log_pipeline
+from api.log_pipeline import JsonFormatter, NonBlockingQueueHandler, RequestContextFilter, SamplingFilter, parse_sample_rates
+
+
+def make_record(msg="hello", **extra) -> logging.LogRecord:
+    record = logging.makeLogRecord({"name": "test", "levelno": logging.INFO, "levelname": "INFO", "msg": msg})
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates("request=0.5, rate_limited=2,slow=-1") == {"request": 0.5, "rate_limited": 1.0, "slow": 0.0}
+    assert parse_sample_rates("") == {}
+    with pytest.raises(ValueError):
+        parse_sample_rates("request=often")
+
+
+@pytest.fixture
+def dice(monkeypatch):
+    """Controls the random number SamplingFilter compares with the rate."""
+    class Dice:
+        value = 0.5
+    monkeypatch.setattr(log_pipeline.random, "random", lambda: Dice.value)
+    return Dice
+
+
+def test_records_without_a_sampled_event_are_kept(dice):
+    sampling = SamplingFilter({"request": 0.01})
+    dice.value = 0.99
+
+    assert sampling.filter(make_record())
+    assert sampling.filter(make_record(event="login"))
+
+
+def test_sampled_events_keep_a_share_and_carry_the_rate(dice):
+    sampling = SamplingFilter({"request": 0.1})
+
+    dice.value = 0.05
+    kept = make_record(event="request")
+    assert sampling.filter(kept)
+    assert kept.sample_rate == 0.1
+
+    dice.value = 0.5
+    assert not sampling.filter(make_record(event="request"))
+
+
+def test_record_rate_overrides_the_event_rate(dice):
+    dice.value = 0.99
+
+    assert SamplingFilter({"request": 0.01}).filter(make_record(event="request", sample_rate=1.0))
+
+
+def test_json_formatter_adds_extra_fields():
+    entry = json.loads(JsonFormatter().format(make_record("GET /", event="request", status=200)))
+
+    assert entry["message"] == "GET /"
+    assert entry["level"] == "INFO"
+    assert (entry["event"], entry["status"]) == ("request", 200)
+
+
+def test_full_queue_drops_records_and_reports_the_count():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+    for msg in ("first", "second", "third"):
+        handler.enqueue(make_record(msg))
+    assert handler.dropped == 1
+
+    handler.queue.get_nowait()
+    handler.queue.get_nowait()
+    handler.enqueue(make_record("fourth"))
+    assert handler.queue.get_nowait().getMessage() == "fourth"
+    assert handler.queue.get_nowait().getMessage() == "1 log records dropped, the log queue was full"
+    assert handler.dropped == 0
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.addFilter(RequestContextFilter())
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    log_pipeline.init_request_logging(app)
+    route_logger = logging.getLogger("test.routes")
+
+    @app.route("/ok")
+    def ok():
+        route_logger.info("in route")
+        return "ok"
+
+    @app.route("/broken")
+    def broken():
+        return "broken", 500
+
+    collect = Collect()
+    for name in ("test.routes", log_pipeline.__name__):
+        logging.getLogger(name).addHandler(collect)
+        logging.getLogger(name).setLevel(logging.INFO)
+    app.records = collect.records
+    yield app
+    for name in ("test.routes", log_pipeline.__name__):
+        logging.getLogger(name).removeHandler(collect)
+
+
+def test_valid_request_id_is_kept_and_logged(app):
+    response = app.test_client().get("/ok", headers={"X-Request-ID": "abc-123"})
+
+    assert response.headers["X-Request-ID"] == "abc-123"
+    route_record, request_record = app.records
+    assert route_record.request_id == request_record.request_id == "abc-123"
+    assert (route_record.method, route_record.path) == ("GET", "/ok")
+    assert (request_record.event, request_record.status) == ("request", 200)
+    assert request_record.levelno == logging.INFO
+
+
+def test_invalid_request_id_is_replaced(app):
+    response = app.test_client().get("/ok", headers={"X-Request-ID": "not a valid id; " * 10})
+
+    request_id = response.headers["X-Request-ID"]
+    assert len(request_id) == 32 and request_id == app.records[0].request_id
+
+
+def test_server_errors_are_always_logged(app):
+    app.test_client().get("/broken")
+
+    record = app.records[-1]
+    assert record.levelno == logging.WARNING
+    assert record.sample_rate == 1.0
+
+
+def test_slow_requests_are_always_logged(app, monkeypatch):
+    monkeypatch.setattr(log_pipeline, "LOG_SLOW_REQUEST_MS", 0)
+    app.test_client().get("/ok")
+
+    assert app.records[-1].levelno == logging.WARNING
@@ -0,0 +1,120 @@
+import os
+import pytest
+from api import migrate
+
+PROBE_MIGRATIONS = {
+    "0001_create_probe.sql": "-- migrate:up\nCREATE TABLE probe (id INT PRIMARY KEY);\n\n-- migrate:down\nDROP TABLE probe;\n",
+    "0002_probe_name.sql": "-- A comment before the sections\n\n-- migrate:up\nALTER TABLE probe ADD COLUMN name TEXT;\n\n-- migrate:down\nALTER TABLE probe DROP COLUMN name;\n",
+}
+
+
+def write_migrations(directory, files: dict) -> str:
+    for filename, body in files.items():
+        with open(os.path.join(directory, filename), "w") as f:
+            f.write(body)
+    return str(directory)
+
+
+def test_load_migrations_orders_and_splits_sections(tmp_path):
+    write_migrations(tmp_path, {**PROBE_MIGRATIONS, "README.txt": "not a migration", "0003_up_only.sql": "-- migrate:up\nSELECT 1;"})
+
+    migrations = migrate.load_migrations(str(tmp_path))
+    assert [migration["filename"] for migration in migrations] == ["0001_create_probe.sql", "0002_probe_name.sql", "0003_up_only.sql"]
+    assert migrations[1]["up"] == "ALTER TABLE probe ADD COLUMN name TEXT;"
+    assert migrations[1]["down"] == "ALTER TABLE probe DROP COLUMN name;"
+    assert migrations[2]["down"] is None
+
+
+@pytest.mark.parametrize("files", [
+    {"0001_no_up.sql": "-- migrate:down\nSELECT 1;"},
+    {"0001_one.sql": "-- migrate:up\nSELECT 1;", "0001_two.sql": "-- migrate:up\nSELECT 2;"},
+])
+def test_load_migrations_rejects_bad_files(tmp_path, files):
+    write_migrations(tmp_path, files)
+
+    with pytest.raises(ValueError):
+        migrate.load_migrations(str(tmp_path))
+
+
+def test_repository_migrations_can_be_rolled_back():
+    migrations = migrate.load_migrations()
+
+    assert [migration["version"] for migration in migrations] == list(range(1, len(migrations) + 1))
+    assert all(migration["down"] for migration in migrations)
+
+
+@pytest.fixture
+def probe_schema(database, tmp_path, monkeypatch):
+    """Points the migration tool at an empty schema and the probe migrations in tmp_path."""
+    psycopg2 = pytest.importorskip("psycopg2")
+    url = os.getenv("TEST_DATABASE_URL")
+    database.autocommit = True
+    with database.cursor() as cursor:
+        cursor.execute("DROP SCHEMA IF EXISTS pytest_migrate CASCADE; CREATE SCHEMA pytest_migrate;")
+
+    directory = write_migrations(tmp_path, PROBE_MIGRATIONS)
+    load_migrations = migrate.load_migrations
+    monkeypatch.setattr(migrate, "load_migrations", lambda: load_migrations(directory))
+    monkeypatch.setattr(migrate, "get_connection", lambda: psycopg2.connect(url, options="-c search_path=pytest_migrate"))
+    try:
+        yield tmp_path
+    finally:
+        with database.cursor() as cursor:
+            cursor.execute("DROP SCHEMA pytest_migrate CASCADE;")
+
+
+def columns(database) -> list:
+    with database.cursor() as cursor:
+        cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = 'pytest_migrate' AND table_name = 'probe' ORDER BY ordinal_position")
+        return [row[0] for row in cursor.fetchall()]
+
+
+def applied_versions() -> list:
+    return [row["version"] for row in migrate.status() if row["applied_at"]]
+
+
+def test_up_down_and_target(probe_schema, database):
+    assert migrate.migrate_up(1) == ["0001_create_probe.sql"]
+    assert columns(database) == ["id"]
+    assert migrate.migrate_up() == ["0002_probe_name.sql"]
+    assert migrate.migrate_up() == []
+    assert columns(database) == ["id", "name"]
+    assert applied_versions() == [1, 2]
+
+    assert migrate.migrate_down() == ["0002_probe_name.sql"]
+    assert columns(database) == ["id"]
+    assert applied_versions() == [1]
+
+    assert migrate.migrate_down(5) == ["0001_create_probe.sql"]
+    assert columns(database) == []
+    assert migrate.migrate_down() == []
+
+
+def test_failing_migration_leaves_the_previous_version(probe_schema, database):
+    write_migrations(probe_schema, {"0003_broken.sql": "-- migrate:up\nALTER TABLE probe ADD COLUMN name TEXT;\n"})
+
+    with pytest.raises(Exception):
+        migrate.migrate_up()
+    assert applied_versions() == [1, 2]
+    assert columns(database) == ["id", "name"]
+
+
+def test_baseline_marks_without_running(probe_schema, database):
+    assert migrate.baseline(1) == ["0001_create_probe.sql"]
+
+    assert applied_versions() == [1]
+    assert columns(database) == []
+
+
+def test_check_reports_sequential_scans_and_broken_queries(probe_schema, monkeypatch):
+    migrate.migrate_up()
+    monkeypatch.setattr(migrate, "registered_queries", lambda: [
+        ("probe.by_id", "SELECT name FROM probe WHERE id = %(id)s", {"id": 1}, ()),
+        ("probe.by_name", "SELECT id FROM probe WHERE name = %(name)s", {"name": "x"}, ()),
+        ("probe.all", "SELECT id FROM probe", {}, ("probe",)),
+        ("probe.missing_column", "SELECT missing FROM probe", {}, ()),
+    ])
+
+    problems = migrate.check_query_plans()
+    assert [(problem["query"], problem.get("table")) for problem in problems] == [("probe.by_name", "probe"), ("probe.missing_column", None)]
+    assert "missing" in problems[1]["error"]
@@ -0,0 +1,122 @@
+import threading
+import pytest
+from collections import Counter
+from flask import Flask
+from api import decoraters, profiler as profiler_module
+from api.profiler import SamplingProfiler
+
+
+def busy_loop(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,), daemon=True)
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+@pytest.fixture
+def idle_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait, daemon=True)
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+def test_profile_counts_stacks_of_running_threads(busy_thread, idle_thread):
+    result = SamplingProfiler(True, 10).profile(0.2, 0.002)
+
+    assert result["samples"] > 0
+    assert any(";busy_loop (api/test_profiler.py:" in stack for stack in result["stacks"])
+    assert not any("wait (" in stack.rsplit(";", 1)[-1] for stack in result["stacks"])
+
+
+def test_profile_can_include_idle_threads(idle_thread):
+    result = SamplingProfiler(True, 10).profile(0.05, 0.005, include_idle=True)
+
+    assert any(stack.rsplit(";", 1)[-1].startswith("wait (") for stack in result["stacks"])
+
+
+@pytest.mark.parametrize("enabled, seconds, interval", [(False, 1, 0.005), (True, 0, 0.005), (True, 11, 0.005), (True, 1, 0.0001), (True, 1, 2)])
+def test_profile_rejects_bad_windows(enabled, seconds, interval):
+    with pytest.raises(ValueError):
+        SamplingProfiler(enabled, 10).profile(seconds, interval)
+
+
+def test_one_profile_at_a_time():
+    profiler = SamplingProfiler(True, 10)
+    with profiler._running:
+        assert profiler.profile(0.01, 0.005) is None
+
+
+def test_folded_output_is_sorted_by_count():
+    stacks = Counter({"main;a": 1, "main;b;c": 3})
+
+    assert SamplingProfiler.folded(stacks) == "main;b;c 3\nmain;a 1\n"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(profiler_module, "PROFILER_ENABLED", True)
+    monkeypatch.setattr(decoraters, "ADMIN_KEY", "admin-key")
+    app = Flask(__name__)
+    profiler_module.init_profiling(app)
+
+    @app.route("/work")
+    def work():
+        return "done", 201
+
+    return app.test_client()
+
+
+def test_request_profile_needs_the_admin_key(client):
+    for headers in ({}, {"X-Admin-Key": "wrong"}):
+        response = client.get("/work?profile=1", headers=headers)
+        assert (response.status_code, response.get_data(as_text=True)) == (201, "done")
+
+    response = client.get("/work?profile=1&profile_sort=tottime", headers={"X-Admin-Key": "admin-key"})
+    assert response.status_code == 200
+    assert response.headers["X-Profiled-Status"] == "201"
+    assert "function calls" in response.get_data(as_text=True)
+
+
+def test_request_profile_is_off_unless_enabled(monkeypatch):
+    monkeypatch.setattr(profiler_module, "PROFILER_ENABLED", False)
+    monkeypatch.setattr(decoraters, "ADMIN_KEY", "admin-key")
+    app = Flask(__name__)
+    profiler_module.init_profiling(app)
+    app.add_url_rule("/work", "work", lambda: "done")
+
+    response = app.test_client().get("/work?profile=1", headers={"X-Admin-Key": "admin-key"})
+    assert response.get_data(as_text=True) == "done"
+
+
+@pytest.fixture
+def admin_client(monkeypatch):
+    from api.blueprints import admin
+    from api.admin_api import routes
+    monkeypatch.setattr(decoraters, "ADMIN_KEY", "admin-key")
+    monkeypatch.setattr(routes, "profiler", SamplingProfiler(True, 10))
+    app = Flask(__name__)
+    app.register_blueprint(admin, url_prefix="/admin")
+    return app.test_client()
+
+
+def test_admin_profile_route(admin_client, busy_thread):
+    assert admin_client.get("/admin/profile?seconds=0.05").status_code == 401
+
+    headers = {"X-Admin-Key": "admin-key"}
+    response = admin_client.get("/admin/profile?seconds=0.1&interval_ms=2", headers=headers)
+    assert response.status_code == 200
+    assert int(response.headers["X-Profile-Samples"]) > 0
+    assert "busy_loop (" in response.get_data(as_text=True)
+
+    assert admin_client.get("/admin/profile?seconds=600", headers=headers).status_code == 400
@@ -0,0 +1,109 @@
+import pytest
+from flask import Blueprint, Flask, jsonify
+import api.rate_limiter as rate_limiter
+from api.rate_limiter import MemoryBackend, RateLimiter, parse_rate
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces time.monotonic with a clock the test moves by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("rate, expected", [("5/minute", (5, 60)), (" 10 / Hour ", (10, 3600)), ("1/second", (1, 1)), ("2/day", (2, 86400))])
+def test_parse_rate(rate, expected):
+    assert parse_rate(rate) == expected
+
+
+@pytest.mark.parametrize("rate", ["5", "5/week", "x/minute", "0/minute", "-1/minute", None])
+def test_parse_rate_rejects_malformed_rates(rate):
+    with pytest.raises(ValueError):
+        parse_rate(rate)
+
+
+def test_bucket_allows_capacity_then_reports_retry_after(clock):
+    backend = MemoryBackend(100)
+
+    assert [backend.take("k", 3, 60) for _ in range(3)] == [0.0, 0.0, 0.0]
+    # One token comes back every period / capacity seconds
+    assert backend.take("k", 3, 60) == pytest.approx(20.0)
+
+
+def test_bucket_refills_over_time(clock):
+    backend = MemoryBackend(100)
+    for _ in range(3):
+        backend.take("k", 3, 60)
+
+    clock[0] += 10
+    assert backend.take("k", 3, 60) == pytest.approx(10.0)
+    clock[0] += 10
+    assert backend.take("k", 3, 60) == 0.0
+    assert backend.take("k", 3, 60) > 0
+
+
+def test_buckets_are_per_key(clock):
+    backend = MemoryBackend(100)
+    backend.take("a", 1, 60)
+
+    assert backend.take("a", 1, 60) > 0
+    assert backend.take("b", 1, 60) == 0.0
+
+
+def make_app(limiter: RateLimiter, **limit) -> Flask:
+    bp = Blueprint("limited", __name__)
+
+    @bp.route("/ping", methods=["GET", "POST"])
+    def ping():
+        return jsonify({"message": "pong"})
+
+    @bp.route("/other")
+    def other():
+        return jsonify({"message": "other"})
+
+    limiter.limit(bp, **limit)
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    return app
+
+
+def test_limited_route_answers_429_with_retry_after(clock):
+    app = make_app(RateLimiter(MemoryBackend(100)), rate="2/minute", endpoint="ping")
+    client = app.test_client()
+
+    assert [client.get("/ping").status_code for _ in range(2)] == [200, 200]
+    response = client.get("/ping")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+    # Other endpoints of the blueprint are not limited
+    assert client.get("/other").status_code == 200
+
+
+def test_ip_limits_are_per_client(clock):
+    client = make_app(RateLimiter(MemoryBackend(100)), rate="1/minute").test_client()
+
+    assert client.get("/ping", headers={"X-Forwarded-For": "10.0.0.1"}).status_code == 200
+    assert client.get("/ping", headers={"X-Forwarded-For": "10.0.0.1"}).status_code == 429
+    assert client.get("/ping", headers={"X-Forwarded-For": "10.0.0.2"}).status_code == 200
+
+
+def test_email_limits_read_the_json_body(clock):
+    client = make_app(RateLimiter(MemoryBackend(100)), rate="1/minute", key="email").test_client()
+
+    assert client.post("/ping", json={"email": "A@x.com"}).status_code == 200
+    assert client.post("/ping", json={"email": " a@x.com "}).status_code == 429
+    assert client.post("/ping", json={"email": "b@x.com"}).status_code == 200
+    # Requests without an email are not counted against any bucket
+    assert client.post("/ping", json={}).status_code == 200
+
+
+def test_disabled_limiter_lets_everything_through(clock):
+    client = make_app(RateLimiter(MemoryBackend(100), enabled=False), rate="1/minute").test_client()
+
+    assert [client.get("/ping").status_code for _ in range(3)] == [200, 200, 200]
+
+
+def test_invalid_key_is_rejected():
+    with pytest.raises(ValueError):
+        make_app(RateLimiter(MemoryBackend(100)), rate="1/minute", key="user")
@@ -0,0 +1,198 @@
+import pytest
+from flask import Flask, jsonify, request
+from api import response_cache as response_cache_module
+from api.response_cache import CachedResponse, ResponseCache, cached_response
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(max_bytes=100000, max_entry_bytes=10000)
+    monkeypatch.setattr(response_cache_module, "response_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def app(cache):
+    app = Flask(__name__)
+    app.renders = 0
+    app.body = {"schemes": ["a"]}
+
+    @app.route("/schemes", methods=["GET", "POST"])
+    @cached_response(("schemes",), max_age=60, stale_while_revalidate=30)
+    def schemes():
+        app.renders += 1
+        if request.args.get("fail"):
+            return jsonify({"message": "Internal server error"}), 500
+        return jsonify({**app.body, "page": request.args.get("page")})
+
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def age(cache, seconds):
+    """Makes every cached entry seconds older."""
+    for entry in cache._entries.values():
+        entry.created -= seconds
+
+
+def test_second_request_is_a_hit(app, client):
+    first = client.get("/schemes")
+    second = client.get("/schemes")
+
+    assert app.renders == 1
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "HIT")
+    assert second.get_json() == first.get_json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert second.headers["Cache-Control"] == "public, max-age=60, stale-while-revalidate=30"
+    assert second.headers["Age"] == "0"
+
+
+def test_query_string_is_part_of_the_key(app, client):
+    client.get("/schemes?page=1")
+    client.get("/schemes?page=2")
+    client.get("/schemes?page=1")
+
+    assert app.renders == 2
+
+
+def test_matching_etag_gets_304(cache, client):
+    etag = client.get("/schemes").headers["ETag"]
+
+    response = client.get("/schemes", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.get_data() == b""
+    assert response.headers["ETag"] == etag
+    assert cache.metrics["not_modified"] == 1
+
+    assert client.get("/schemes", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_bump_invalidates_entries_built_from_older_versions(app, cache, client):
+    etag = client.get("/schemes").headers["ETag"]
+
+    cache.bump("schemes")
+    response = client.get("/schemes", headers={"If-None-Match": etag})
+    # Re-rendered, and the unchanged body keeps its ETag
+    assert app.renders == 2
+    assert response.status_code == 304
+
+    app.body = {"schemes": ["a", "b"]}
+    cache.bump("schemes")
+    response = client.get("/schemes", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_other_versions_do_not_invalidate(app, cache, client):
+    client.get("/schemes")
+    cache.bump("users")
+    client.get("/schemes")
+
+    assert app.renders == 1
+
+
+def test_stale_entry_served_while_one_caller_refreshes(app, cache, client):
+    client.get("/schemes")
+    age(cache, 70)
+
+    # The first caller past max_age refreshes, the others get the old entry meanwhile
+    key = next(iter(cache._entries))
+    versions = cache.versions(("schemes",))
+    assert cache.get(key, versions, 60, 30) is None
+    response = client.get("/schemes")
+    assert response.headers["X-Cache"] == "STALE"
+    assert int(response.headers["Age"]) >= 70
+    assert app.renders == 1
+    assert cache.metrics["stale_hits"] == 1
+
+
+def test_stale_entry_is_refreshed_by_the_next_caller(app, cache, client):
+    client.get("/schemes")
+    age(cache, 70)
+
+    assert client.get("/schemes").headers["X-Cache"] == "MISS"
+    assert client.get("/schemes").headers["X-Cache"] == "HIT"
+    assert app.renders == 2
+
+
+def test_entry_past_the_stale_window_is_rendered_again(app, cache, client):
+    client.get("/schemes")
+    age(cache, 100)
+
+    assert client.get("/schemes").headers["X-Cache"] == "MISS"
+    assert app.renders == 2
+
+
+def test_refresh_that_is_not_stored_lets_another_caller_refresh(app, cache, client):
+    client.get("/schemes")
+    age(cache, 70)
+    key = next(iter(cache._entries))
+
+    # The refresh renders while the data changes, so its response is not stored
+    cache._entries[key].refreshing = True
+    cache.release(key)
+
+    assert cache._entries[key].refreshing is False
+    assert cache.get(key, cache.versions(("schemes",)), 60, 30) is None
+
+
+def test_response_rendered_during_a_write_is_not_stored(cache):
+    versions = cache.versions(("schemes",))
+    entry = CachedResponse(b"{}", "application/json", versions, 10)
+    cache.bump("schemes")
+
+    assert not cache.put(("/schemes", (), b""), entry, ("schemes",))
+    assert cache.stats()["entries"] == 0
+
+
+def test_errors_and_other_methods_are_not_cached(app, client):
+    assert client.get("/schemes?fail=1").status_code == 500
+    client.get("/schemes?fail=1")
+    client.post("/schemes")
+    client.post("/schemes")
+
+    assert app.renders == 4
+    assert "X-Cache" not in client.post("/schemes").headers
+
+
+def test_large_entries_are_not_stored(cache):
+    entry = CachedResponse(b"x" * 20000, "application/json", (0,), 10)
+
+    assert not cache.put(("/big", (), b""), entry, ("schemes",))
+    assert cache.metrics["too_large"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    cache = ResponseCache(max_bytes=3000, max_entry_bytes=3000)
+    for path in ("/a", "/b", "/c"):
+        cache.put((path, (), b""), CachedResponse(b"x" * 700, "application/json", (), 2), ())
+    cache.get(("/a", (), b""), (), 60, 0)
+    cache.put(("/d", (), b""), CachedResponse(b"x" * 700, "application/json", (), 2), ())
+
+    assert cache.get(("/b", (), b""), (), 60, 0) is None
+    assert cache.get(("/a", (), b""), (), 60, 0) is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= 3000
+
+
+def test_disabled_cache_renders_every_time(app, cache, client):
+    cache.enabled = False
+    client.get("/schemes")
+    response = client.get("/schemes")
+
+    assert app.renders == 2
+    assert "ETag" not in response.headers
+
+
+def test_stats_hit_ratio(cache, client):
+    client.get("/schemes")
+    client.get("/schemes")
+    client.get("/schemes")
+
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits"], stats["stores"]) == (1, 2, 1)
+    assert stats["hit_ratio"] == pytest.approx(2 / 3, abs=1e-4)
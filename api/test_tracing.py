@@ -0,0 +1,142 @@
+import pytest
+from flask import Flask, jsonify
+from api import decoraters, tracing
+from api.points_api.queris import get_points_query
+from api.tracing import CLIENT, SERVER, OtlpFileExporter, Tracer
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def tracer():
+    return Tracer(enabled=True, sample_rate=1.0, buffer_size=10, max_spans=5)
+
+
+def test_unsampled_requests_record_nothing():
+    tracer = Tracer(enabled=True, sample_rate=0.0, buffer_size=10, max_spans=5)
+
+    assert tracer.start_trace("GET /") is None
+    with tracer.span("child") as span:
+        assert span is None
+    assert tracer.wrap()(lambda: 42)() == 42
+    assert tracer.recent() == []
+
+
+def test_disabled_tracer_ignores_traceparent():
+    tracer = Tracer(enabled=False, sample_rate=1.0, buffer_size=10, max_spans=5)
+
+    assert tracer.start_trace("GET /", traceparent=f"00-{TRACE_ID}-{PARENT_ID}-01") is None
+
+
+def test_spans_nest_under_the_current_span(tracer):
+    @tracer.wrap()
+    def load_points():
+        with tracer.span("db.query", CLIENT, **{"db.query": "get_points_query"}):
+            pass
+
+    root = tracer.start_trace("GET /points", SERVER)
+    load_points()
+    tracer.finish_trace(root)
+
+    trace = tracer.recent()[0]
+    names = [(span["name"], span["parent_id"]) for span in trace["spans"]]
+    util_id = trace["spans"][1]["span_id"]
+    assert names == [("GET /points", None), ("load_points", root.span_id), ("db.query", util_id)]
+    assert trace["spans"][2]["attributes"] == {"db.query": "get_points_query"}
+    assert tracing._current_span.get() is None
+
+
+def test_errors_are_recorded_and_raised(tracer):
+    with pytest.raises(KeyError):
+        with tracer.trace("job"):
+            with tracer.span("step"):
+                raise KeyError("missing")
+
+    spans = tracer.recent()[0]["spans"]
+    assert all("KeyError" in span["error"] for span in spans)
+
+
+def test_sampled_traceparent_continues_the_callers_trace():
+    tracer = Tracer(enabled=True, sample_rate=0.0, buffer_size=10, max_spans=5)
+
+    root = tracer.start_trace("GET /", traceparent=f"00-{TRACE_ID}-{PARENT_ID}-01")
+    assert (root.trace.trace_id, root.parent_id) == (TRACE_ID, PARENT_ID)
+    tracer.finish_trace(root)
+    assert tracer.start_trace("GET /", traceparent=f"00-{TRACE_ID}-{PARENT_ID}-00") is None
+
+
+def test_spans_over_the_limit_are_counted_not_kept(tracer):
+    with tracer.trace("batch"):
+        for _ in range(10):
+            with tracer.span("db.query"):
+                pass
+
+    trace = tracer.recent()[0]
+    assert len(trace["spans"]) == 5
+    assert trace["dropped_spans"] == 6
+
+
+def test_recent_filters_and_limits(tracer):
+    for name in ("first", "second", "third"):
+        tracer.finish_trace(tracer.start_trace(name))
+
+    assert [trace["name"] for trace in tracer.recent(limit=2)] == ["third", "second"]
+    assert tracer.recent(min_ms=60000) == []
+
+
+def test_otlp_encoding(tracer):
+    root = tracer.start_trace("GET /", SERVER, **{"http.status_code": 200, "sampled": True})
+    with pytest.raises(ValueError):
+        with tracer.span("child"):
+            raise ValueError("bad")
+    tracer.finish_trace(root)
+
+    spans = OtlpFileExporter("unused").encode(root.trace)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert spans[0]["kind"] == SERVER and "parentSpanId" not in spans[0]
+    assert spans[0]["attributes"] == [
+        {"key": "http.status_code", "value": {"intValue": "200"}},
+        {"key": "sampled", "value": {"boolValue": True}}
+    ]
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+    assert spans[1]["status"]["code"] == 2
+
+
+def test_query_name_finds_the_query_function():
+    assert tracing.query_name(get_points_query()) == "get_points_query"
+    assert tracing.query_name("SELECT 'built elsewhere'") == "unregistered"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(tracing, "tracer", Tracer(enabled=True, sample_rate=0.0, buffer_size=10, max_spans=50))
+    monkeypatch.setattr(decoraters, "ADMIN_KEY", "admin-key")
+    app = Flask(__name__)
+    tracing.init_tracing(app)
+
+    @app.route("/ping")
+    def ping():
+        return jsonify({"message": "pong"})
+
+    return app.test_client()
+
+
+def test_requests_with_a_sampled_traceparent_are_traced(client):
+    untraced = client.get("/ping")
+    traced = client.get("/ping", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+
+    assert "X-Trace-Id" not in untraced.headers
+    assert traced.headers["X-Trace-Id"] == TRACE_ID
+    trace = tracing.tracer.recent()[0]
+    assert [span["name"] for span in trace["spans"]] == ["GET /ping", "json.encode"]
+    assert trace["spans"][0]["attributes"]["http.status_code"] == 200
+
+
+def test_debug_traces_requires_the_admin_key(client):
+    client.get("/ping", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+
+    assert client.get("/debug/traces").status_code == 401
+    response = client.get("/debug/traces", headers={"X-Admin-Key": "admin-key"})
+    assert response.status_code == 200
+    assert response.get_json()["traces"][0]["trace_id"] == TRACE_ID
+    assert client.get("/debug/traces?limit=x", headers={"X-Admin-Key": "admin-key"}).status_code == 400
@@ -0,0 +1,86 @@
+import pytest
+from api.user_cache import UserCache
+from api.points_api.utils import points_util
+
+
+@pytest.fixture
+def cache():
+    return UserCache(maxsize=100, ttl=60)
+
+
+def test_put_then_get(cache):
+    cache.put("points", "a@example.com", 10, cache.generation("a@example.com"))
+
+    assert cache.get("points", "a@example.com") == 10
+    assert cache.get("profile", "a@example.com") is None
+
+
+def test_invalidate_drops_every_kind(cache):
+    generation = cache.generation("a@example.com")
+    cache.put("points", "a@example.com", 10, generation)
+    cache.put("profile", "a@example.com", {"name": "A"}, generation)
+
+    cache.invalidate(" a@example.com ")
+
+    assert cache.get("points", "a@example.com") is None
+    assert cache.get("profile", "a@example.com") is None
+
+
+def test_read_started_before_an_invalidation_is_not_stored(cache):
+    generation = cache.generation("a@example.com")
+    cache.invalidate("a@example.com")
+
+    cache.put("points", "a@example.com", 10, generation)
+    assert cache.get("points", "a@example.com") is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = UserCache(maxsize=100, ttl=60, enabled=False)
+    cache.put("points", "a@example.com", 10, 0)
+
+    assert cache.get("points", "a@example.com") is None
+
+
+def test_stats_count_hits_and_misses(cache):
+    cache.get("points", "a@example.com")
+    cache.put("points", "a@example.com", 10, 0)
+    cache.get("points", "a@example.com")
+
+    stats = cache.stats()
+    assert stats["points"] == {"entries": 1, "hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+
+class FakeDatabase:
+    def __init__(self, balance: int):
+        self.balance = balance
+        self.reads = 0
+
+    def __call__(self, query, params=None, fetch_results=False):
+        if fetch_results:
+            self.reads += 1
+            return [(self.balance,)]
+        self.balance -= params["points"]
+        return 1
+
+
+@pytest.fixture
+def fake_database(monkeypatch):
+    database = FakeDatabase(100)
+    monkeypatch.setattr(points_util, "execute_query", database)
+    monkeypatch.setattr(points_util, "resolve_user_id", lambda email: 1)
+    monkeypatch.setattr(points_util, "user_cache", UserCache(maxsize=100, ttl=60))
+    return database
+
+
+def test_balance_reads_go_through_the_cache(fake_database):
+    assert points_util.get_user_points("a@example.com") == 100
+    assert points_util.get_user_points("a@example.com") == 100
+    assert fake_database.reads == 1
+
+
+def test_redeem_invalidates_the_cached_balance(fake_database):
+    points_util.get_user_points("a@example.com")
+    assert points_util.redeem_user_points("a@example.com", 30)
+
+    assert points_util.get_user_points("a@example.com") == 70
+    assert fake_database.reads == 2
@@ -0,0 +1,73 @@
+import pytest
+from cachetools import TTLCache
+from flask import Flask, request
+from api import user_ids
+
+
+class Lookups:
+    def __init__(self, ids: dict):
+        self.ids = ids
+        self.count = 0
+
+    def __call__(self, query, params=None, fetch_results=False):
+        self.count += 1
+        user_id = self.ids.get(params["email"])
+        return [(user_id,)] if user_id else []
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    lookups = Lookups({"a@example.com": 7})
+    monkeypatch.setattr(user_ids, "execute_query", lookups)
+    monkeypatch.setattr(user_ids, "_user_ids", TTLCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(user_ids, "USER_CACHE_ENABLED", True)
+    return lookups
+
+
+def test_resolved_ids_are_cached(lookups):
+    assert user_ids.resolve_user_id("a@example.com") == 7
+    assert user_ids.resolve_user_id(" a@example.com ") == 7
+    assert lookups.count == 1
+
+
+def test_unknown_emails_are_not_cached(lookups):
+    assert user_ids.resolve_user_id("nobody@example.com") is None
+    assert user_ids.resolve_user_id("nobody@example.com") is None
+    assert lookups.count == 2
+
+
+def test_forget_user_id(lookups):
+    user_ids.resolve_user_id("a@example.com")
+    user_ids.forget_user_id("a@example.com")
+    user_ids.resolve_user_id("a@example.com")
+
+    assert lookups.count == 2
+
+
+@pytest.mark.parametrize("value", [None, "", 7])
+def test_invalid_emails_resolve_to_none(lookups, value):
+    assert user_ids.resolve_user_id(value) is None
+    assert lookups.count == 0
+
+
+def test_token_uid_claim_is_used_for_the_token_owner(lookups):
+    with Flask(__name__).test_request_context():
+        request.user, request.user_id = "a@example.com", 7
+
+        assert user_ids.resolve_user_id("a@example.com") == 7
+        assert lookups.count == 0
+        user_ids.resolve_user_id("b@example.com")
+        assert lookups.count == 1
+
+
+def test_ids_are_resolved_once_per_request_without_the_cache(lookups, monkeypatch):
+    monkeypatch.setattr(user_ids, "USER_CACHE_ENABLED", False)
+
+    with Flask(__name__).test_request_context():
+        assert user_ids.resolve_user_id("a@example.com") == 7
+        assert user_ids.resolve_user_id("a@example.com") == 7
+    assert lookups.count == 1
+
+    with Flask(__name__).test_request_context():
+        user_ids.resolve_user_id("a@example.com")
+    assert lookups.count == 2
@@ -0,0 +1,373 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+from flask import Flask, g, jsonify, request
+from api.config import TRACING_ENABLED, TRACE_SAMPLE_RATE, TRACE_BUFFER_SIZE, TRACE_MAX_SPANS, TRACE_OTLP_FILE
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+logger = logging.getLogger(__name__)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Trace:
+    """The spans of one request or job, in the order they started."""
+
+    __slots__ = ("trace_id", "spans", "dropped_spans")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans = []
+        self.dropped_spans = 0
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error", "_token")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], kind: int, attributes: dict):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+        self._token = None
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        root_start = self.trace.spans[0].start_ns
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "offset_ms": round((self.start_ns - root_start) / 1e6, 3),
+            "duration_ms": round(((self.end_ns or time.time_ns()) - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpFileExporter:
+    """
+    Appends finished traces to a file in the OTLP JSON format, one ExportTraceServiceRequest
+    per line, the layout the OpenTelemetry collector's file exporter and otlpjsonfile
+    receiver use. Writes happen on a background thread.
+    """
+
+    def __init__(self, path: str, service_name: str = "craft-connect"):
+        self.path = path
+        self.service_name = service_name
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write, name="trace-exporter", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            pass
+
+    def encode(self, trace: Trace) -> dict:
+        spans = []
+        for span in trace.spans:
+            encoded = {
+                "traceId": trace.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": span.kind,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 0}
+            }
+            if span.parent_id:
+                encoded["parentSpanId"] = span.parent_id
+            spans.append(encoded)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}]
+        }]}
+
+    def _write(self) -> None:
+        try:
+            with open(self.path, "a") as trace_file:
+                while True:
+                    trace = self._queue.get()
+                    trace_file.write(json.dumps(self.encode(trace), default=str) + "\n")
+                    if self._queue.empty():
+                        trace_file.flush()
+        except OSError as e:
+            logger.warning(f"Trace export to {self.path} disabled: {str(e)}")
+
+
+class Tracer:
+    """
+    In-process tracer. A sampled request or job opens a trace; spans started while it runs
+    nest under the current span through a context variable, so utils and database calls
+    are traced without passing anything around. Finished traces are kept in a ring buffer
+    of the last buffer_size traces and handed to the exporter, if there is one.
+
+    Outside a sampled trace span() does nothing, so unsampled requests only pay for a
+    context variable lookup per instrumented call.
+    """
+
+    def __init__(self, enabled: bool, sample_rate: float, buffer_size: int, max_spans: int,
+                 exporter: Optional[OtlpFileExporter] = None):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.max_spans = max_spans
+        self.exporter = exporter
+        self._traces = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+
+    def start_trace(self, name: str, kind: int = INTERNAL, traceparent: Optional[str] = None, **attributes) -> Optional[Span]:
+        """
+        Opens a trace with a root span and makes it current, if the trace is sampled. A W3C
+        traceparent with the sampled flag forces sampling and continues the caller's trace.
+
+        Returns:
+            Span: The root span, to be passed to finish_trace(), or None when not sampled.
+        """
+        if not self.enabled:
+            return None
+        trace_id = parent_id = None
+        match = TRACEPARENT.match((traceparent or "").strip().lower())
+        if match and int(match.group(3), 16) & 1:
+            trace_id, parent_id = match.group(1), match.group(2)
+        elif random.random() >= self.sample_rate:
+            return None
+
+        span = Span(Trace(trace_id or os.urandom(16).hex()), name, parent_id, kind, attributes)
+        span.trace.spans.append(span)
+        span._token = _current_span.set(span)
+        return span
+
+    def finish_trace(self, span: Optional[Span], error: Optional[BaseException] = None) -> None:
+        """Closes a root span from start_trace() and stores its trace."""
+        if span is None:
+            return
+        span.end_ns = time.time_ns()
+        if error is not None and span.error is None:
+            span.error = repr(error)
+        if span._token is not None:
+            try:
+                _current_span.reset(span._token)
+            except ValueError:
+                # Finished from another context; the span is not current there
+                _current_span.set(None)
+            span._token = None
+        with self._lock:
+            self._traces.append(span.trace)
+        if self.exporter is not None:
+            self.exporter.export(span.trace)
+
+    @contextmanager
+    def trace(self, name: str, kind: int = INTERNAL, **attributes):
+        """
+        Runs the block as the root span of a new trace, for work outside requests. Inside a
+        trace the block becomes a child span instead.
+        """
+        if _current_span.get() is not None:
+            with self.span(name, kind, **attributes) as span:
+                yield span
+            return
+        span = self.start_trace(name, kind, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.finish_trace(span, e)
+            raise
+        self.finish_trace(span)
+
+    @contextmanager
+    def span(self, name: str, kind: int = INTERNAL, **attributes):
+        """Runs the block as a child of the current span. Yields None outside a sampled trace."""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+
+        trace = parent.trace
+        if len(trace.spans) >= self.max_spans:
+            trace.dropped_spans += 1
+            yield None
+            return
+        span = Span(trace, name, parent.span_id, kind, attributes)
+        trace.spans.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+
+    def set_attribute(self, key: str, value) -> None:
+        """Sets an attribute on the current span, if there is one."""
+        span = _current_span.get()
+        if span is not None:
+            span.set(key, value)
+
+    def wrap(self, name: Optional[str] = None, kind: int = INTERNAL) -> Callable:
+        """Decorator that runs the function in a span, named after the function by default."""
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return func(*args, **kwargs)
+                with self.span(name or func.__name__, kind):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def recent(self, limit: int = 50, min_ms: float = 0) -> list[dict]:
+        """The most recent traces, newest first, that took at least min_ms."""
+        with self._lock:
+            traces = list(self._traces)
+        result = []
+        for trace in reversed(traces):
+            root = trace.spans[0]
+            duration_ms = ((root.end_ns or time.time_ns()) - root.start_ns) / 1e6
+            if duration_ms < min_ms:
+                continue
+            result.append({
+                "trace_id": trace.trace_id,
+                "name": root.name,
+                "duration_ms": round(duration_ms, 3),
+                "dropped_spans": trace.dropped_spans,
+                "spans": [span.to_dict() for span in trace.spans]
+            })
+            if len(result) >= limit:
+                break
+        return result
+
+
+tracer = Tracer(TRACING_ENABLED, TRACE_SAMPLE_RATE, TRACE_BUFFER_SIZE, TRACE_MAX_SPANS,
+                OtlpFileExporter(TRACE_OTLP_FILE) if TRACE_OTLP_FILE else None)
+
+
+# SQL text -> name of the queries.py function that returns it
+_query_names = {}
+_indexed_modules = set()
+_index_lock = threading.Lock()
+
+
+def query_name(sql: str) -> str:
+    """
+    Names a SQL string after the query function that returned it, e.g. "get_points_query".
+    Query functions take no arguments and return constant SQL, so the loaded query
+    modules are indexed by calling them.
+    """
+    name = _query_names.get(sql)
+    if name is not None:
+        return name
+    import inspect
+    with _index_lock:
+        for module_name, module in list(sys.modules.items()):
+            if module_name in _indexed_modules or not module_name.startswith("api.") or not module_name.endswith(("queries", "queris")):
+                continue
+            _indexed_modules.add(module_name)
+            for attribute, func in vars(module).items():
+                if inspect.isfunction(func) and func.__module__ == module_name and not inspect.signature(func).parameters:
+                    try:
+                        _query_names.setdefault(func(), attribute)
+                    except Exception:
+                        continue
+        # Remember SQL built elsewhere so it is not looked up again
+        return _query_names.setdefault(sql, "unregistered")
+
+
+def traced_query(func: Callable) -> Callable:
+    """Decorator for the database executors: runs the call in a "db.query" span named after the query."""
+    @functools.wraps(func)
+    def wrapper(query, *args, **kwargs):
+        if _current_span.get() is None:
+            return func(query, *args, **kwargs)
+        caller = sys._getframe(1).f_code.co_name
+        with tracer.span("db.query", CLIENT, **{"db.query": query_name(query), "db.executor": func.__name__, "code.caller": caller}):
+            return func(query, *args, **kwargs)
+    return wrapper
+
+
+def init_tracing(app: Flask) -> None:
+    """
+    Traces a sample of the app's requests (TRACE_SAMPLE_RATE, or a sampled W3C traceparent
+    header), encodes JSON responses in a span and adds the /debug/traces view. Sampled
+    responses carry the trace id in X-Trace-Id.
+    """
+    if not tracer.enabled:
+        return
+    from flask.json.provider import DefaultJSONProvider
+    from api.decoraters import admin_required
+
+    class TracedJSONProvider(DefaultJSONProvider):
+        def response(self, *args, **kwargs):
+            with tracer.span("json.encode"):
+                return super().response(*args, **kwargs)
+
+    app.json = TracedJSONProvider(app)
+
+    @app.before_request
+    def start_request_trace():
+        rule = request.url_rule.rule if request.url_rule else request.path
+        g.trace_span = tracer.start_trace(f"{request.method} {rule}", SERVER, request.headers.get("traceparent"),
+                                          **{"http.method": request.method, "http.route": rule})
+
+    @app.after_request
+    def tag_request_trace(response):
+        span = g.get("trace_span")
+        if span is not None:
+            span.set("http.status_code", response.status_code)
+            response.headers["X-Trace-Id"] = span.trace.trace_id
+        return response
+
+    @app.teardown_request
+    def finish_request_trace(error):
+        tracer.finish_trace(g.pop("trace_span", None), error)
+
+    @admin_required
+    def debug_traces():
+        """Recent sampled traces, newest first. Query parameters: limit (default 50) and min_ms."""
+        try:
+            limit = min(int(request.args.get("limit", 50)), TRACE_BUFFER_SIZE)
+            min_ms = float(request.args.get("min_ms", 0))
+        except ValueError:
+            return jsonify({"message": "limit and min_ms must be numbers"}), 400
+        return jsonify({"sample_rate": tracer.sample_rate, "traces": tracer.recent(limit, min_ms)}), 200
+
+    app.add_url_rule("/debug/traces", "debug_traces", debug_traces, methods=["GET"])
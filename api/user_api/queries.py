@@ -1,3 +1,5 @@
+from api.database import read_only
+
 def get_users_detail_query() -> str:
     """
     Returns a SQL query to retrieve detailed information for a specific user by email.
@@ -11,55 +13,108 @@ def get_users_detail_query() -> str:
     return """
         SELECT u.id, u.name, up.points, u.email
         FROM users u
-        LEFT JOIN user_points up ON u.email = up.email
+        LEFT JOIN user_points up ON up.user_id = u.id
         WHERE u.email = %(email)s;
     """
 
+@read_only
 def get_top_users_query() -> str:
     """
-    Returns a SQL query to retrieve the top users based on their points.
+    Returns a SQL query to retrieve the top users of a leaderboard period.
 
-    The query selects the user's ID, name, email, and points by joining the `users` and `user_points` tables.
-    Results are ordered by points in descending order and limited by the provided limit parameter.
+    The query reads the ranked `leaderboard_snapshot` (migrations/0009_leaderboards.sql) for the period,
+    "all" ranking current balances and "week" / "month" the points earned since the period started,
+    and joins `users` for the name and email. Results are ordered by rank and limited by the limit parameter.
 
     Returns:
-        str: A SQL query string with a placeholder for the limit parameter (%(limit)s).
+        str: A SQL query string with placeholders for the period (%(period)s) and limit (%(limit)s) parameters.
     """
     return """
-        SELECT u.id, u.name, u.email, up.points
-        FROM users u
-        LEFT JOIN user_points up ON u.email = up.email
-        ORDER BY up.points DESC
+        SELECT u.id, u.name, u.email, l.points, l.rank
+        FROM leaderboard_snapshot l
+        JOIN users u ON u.id = l.user_id
+        WHERE l.period = %(period)s
+        ORDER BY l.rank, l.user_id
         LIMIT %(limit)s;
     """
 
+def refresh_leaderboards_query() -> str:
+    """
+    Returns a SQL query that rebuilds `leaderboard_snapshot` concurrently and returns its row count.
+
+    Returns:
+        str: A SQL query string without parameters.
+    """
+    return """
+        SELECT refresh_leaderboards();
+    """
+
+@read_only
 def get_users_query() -> str:
     """
-    Returns a SQL query to retrieve a list of users with basic information.
+    Returns a SQL query to retrieve a page of users with basic information.
 
-    The query selects the user's ID, name, and email from the `users` table, with a limit on the number of results.
+    The query selects the user's ID, name, email and points from the `users` and `user_points` tables for
+    the users whose ID comes after the cursor, in ID order, so each page is an index range scan however
+    deep it is.
 
     Returns:
-        str: A SQL query string with a placeholder for the limit parameter (%(limit)s).
+        str: A SQL query string with placeholders for the last ID of the previous page (%(after_id)s)
+             and the limit (%(limit)s) parameters.
     """
     return """
-        SELECT u.id, u.name, u.email up.points 
+        SELECT u.id, u.name, u.email, up.points
         FROM users u
-        JOIN user_points up ON u.email = up.email
+        LEFT JOIN user_points up ON up.user_id = u.id
+        WHERE u.id > %(after_id)s
+        ORDER BY u.id
         LIMIT %(limit)s;
     """
 
+@read_only
+def get_users_estimate_query() -> str:
+    """
+    Returns a SQL query to retrieve the planner's estimate of the number of users.
+
+    The estimate is kept up to date by autovacuum and ANALYZE; it is -1 for a table that was never analyzed.
+
+    Returns:
+        str: A SQL query string without parameters.
+    """
+    return """
+        SELECT reltuples::BIGINT
+        FROM pg_class
+        WHERE oid = 'users'::regclass;
+    """
+
+@read_only
+def get_users_count_query() -> str:
+    """
+    Returns a SQL query to count the users exactly.
+
+    Returns:
+        str: A SQL query string without parameters.
+    """
+    return """
+        SELECT count(*)
+        FROM users;
+    """
+
+@read_only
 def get_scheme_query() -> str:
     """
     Returns a SQL query to retrieve all schemes.
 
-    The query selects all columns from the `schemes` table.
+    The query selects the schemes that have not been expired by the expiry sweeper.
 
     Returns:
         str: A SQL query string.
     """
     return """
-        SELECT * FROM schemes;
+        SELECT scheme_id, scheme_title, scheme_valid_from, scheme_valid_to, scheme_perks, points
+        FROM scheme
+        WHERE status = 'active'
+        ORDER BY scheme_id;
     """
 
 def get_applied_scheme() -> str:
@@ -72,25 +127,25 @@ def get_applied_scheme() -> str:
         str: A SQL query string.
     """
     return """
-        SELECT scheme_title, scheme_status FROM schemes_redemption WHERE email = %(email)s;
+        SELECT scheme_title, scheme_status FROM schemes_redemption WHERE user_id = %(user_id)s;
     """
 
 def insert_scheme_query() -> str:
     """
     Returns a SQL query to insert a new scheme redemption record.
 
-    The query inserts a record into the `schemes_redemption` table with the provided name, email, and scheme status.
+    The query inserts a record into the `schemes_redemption` table with the provided name, user id, and scheme id.
 
     Note: The query contains a typo ('shcemes_redemption' should be 'schemes_redemption') and incorrect syntax
     ('VALUES ... SET' is invalid). It should be corrected to use proper INSERT syntax.
 
     Returns:
-        str: A SQL query string with placeholders for name, email, and scheme_status
-             (%(name)s, %(email)s, %(scheme_status)s).
+        str: A SQL query string with placeholders for name, user_id, and scheme_id
+             (%(name)s, %(user_id)s, %(scheme_id)s).
     """
     return """
-        INSERT INTO schemes_redemption (name, email, scheme_id)
-        VALUES (%(name)s, %(email)s, %(scheme_id)s);
+        INSERT INTO schemes_redemption (name, user_id, scheme_id)
+        VALUES (%(name)s, %(user_id)s, %(scheme_id)s);
     """
     
 def get_scheme_valid_to_query()->str:
@@ -101,15 +156,16 @@ def get_scheme_valid_to_query()->str:
 
 def scheme_already_applied_query()->str:
     return """
-        SELECT EXISTS (SELECT 1 FROM schemes_redemption WHERE email = %(email)s);
+        SELECT EXISTS (SELECT 1 FROM schemes_redemption WHERE user_id = %(user_id)s);
 """
 
+@read_only
 def scheme_status_query()->str:
     return """
         SELECT s.scheme_title, sr.scheme_status
         FROM scheme s
         LEFT JOIN schemes_redemption sr ON s.scheme_id = sr.scheme_id
-        WHERE sr.email = %(email)s;
+        WHERE sr.user_id = %(user_id)s;
 """
 
 def get_points_required_for_scheme_query() -> str:
@@ -122,4 +178,65 @@ def get_points_required_for_scheme_query() -> str:
         SELECT points
         FROM scheme
         WHERE scheme_id = %(scheme_id)s;
-"""
\ No newline at end of file
+"""
+def apply_for_scheme_query() -> str:
+    """
+    Returns a SQL query that checks whether a user may apply for a scheme and, if so,
+    inserts the pending redemption in the same statement.
+
+    The reason column is one of 'applied', 'user_not_found', 'scheme_not_found',
+    'already_applied', 'expired' or 'insufficient_points'. The unique user_id of
+    schemes_redemption settles concurrent applications of the same user.
+
+    Returns:
+        str: A SQL query string with placeholders for user_id and scheme_id
+             (%(user_id)s, %(scheme_id)s).
+    """
+    return """
+        WITH candidate AS (
+            SELECT
+                u.id AS user_id,
+                u.name,
+                COALESCE(up.points, 0) AS user_points,
+                s.scheme_id,
+                COALESCE(s.points, 0) AS required_points,
+                s.scheme_valid_to,
+                s.status AS scheme_status,
+                EXISTS (SELECT 1 FROM schemes_redemption WHERE user_id = %(user_id)s) AS applied
+            FROM (SELECT 1) AS one
+            LEFT JOIN users u ON u.id = %(user_id)s
+            LEFT JOIN user_points up ON up.user_id = u.id
+            LEFT JOIN scheme s ON s.scheme_id = %(scheme_id)s
+        ),
+        eligibility AS (
+            SELECT *,
+                CASE
+                    WHEN user_id IS NULL THEN 'user_not_found'
+                    WHEN scheme_id IS NULL THEN 'scheme_not_found'
+                    WHEN applied THEN 'already_applied'
+                    WHEN scheme_status = 'expired' THEN 'expired'
+                    WHEN scheme_date(scheme_valid_to) < CURRENT_DATE THEN 'expired'
+                    WHEN user_points < required_points THEN 'insufficient_points'
+                    ELSE 'eligible'
+                END AS reason
+            FROM candidate
+        ),
+        inserted AS (
+            INSERT INTO schemes_redemption (name, user_id, scheme_id)
+            SELECT name, user_id, scheme_id
+            FROM eligibility
+            WHERE reason = 'eligible'
+            ON CONFLICT (user_id) DO NOTHING
+            RETURNING id
+        )
+        SELECT
+            CASE
+                WHEN e.reason <> 'eligible' THEN e.reason
+                WHEN EXISTS (SELECT 1 FROM inserted) THEN 'applied'
+                ELSE 'already_applied'
+            END AS reason,
+            (SELECT id FROM inserted) AS redemption_id,
+            e.user_points,
+            e.required_points
+        FROM eligibility e;
+    """
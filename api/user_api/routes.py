@@ -1,8 +1,12 @@
+import logging
 from api.blueprints import user
 from flask import jsonify, request
 from api.user_api.utils.users_util import*
+from api.response_cache import cached_response
+from api.config import USERS_PAGE_MAX_LIMIT
 from psycopg2 import DatabaseError
-from api.points_api.utils.points_util import get_user_points
+
+logger = logging.getLogger(__name__)
 @user.route('/get_user_profile',methods=["POST"])
 def get_user_profile():
     try:
@@ -25,77 +29,83 @@ def get_user_profile():
         
         return jsonify({"message":response}), 200
     except DatabaseError as de:
-        print(f"Database error : {str(de)}")
+        logger.error(f"Database error : {str(de)}")
         return jsonify({"message":"Database error"}), 500
     except Exception as e:
-        print(f"error: {str(e)}")
+        logger.exception(f"error: {str(e)}")
         return jsonify({"message":"Internal server error"}), 500
         
-@user.route('/redeem_scheme',methods=["POST"])
-def redeem_scheme():
-    pass
-
 @user.route('/top_users',methods=["GET"])
+@cached_response(depends_on=("leaderboards",), max_age=30, stale_while_revalidate=120, private=True)
 def top_user():
     try:
-        if not request.is_json:
-            return jsonify({"message": "Request must contain JSON"}), 400
+        # ?limit=&period= or, as before, a JSON body
+        data = request.get_json(silent=True) if request.is_json else None
+        if not isinstance(data, dict):
+            data = {}
 
-        data = request.get_json()
-        if not data:
-            return jsonify({"message": "JSON payload cannot be empty"}), 400
-
-        limit = data.get("limit")
-        if not limit:
-            return jsonify({"message": "Limit is required"}), 400
+        limit = data.get("limit", request.args.get("limit", 10))
+        if isinstance(limit, str) and limit.isdigit():
+            limit = int(limit)
 
         if not isinstance(limit, int):
             return jsonify({"message": f"Limit must be an integer, got {type(limit).__name__}"}), 400
 
         if limit <= 0:
             return jsonify({"message": "Limit must be a positive integer"}), 400
+
+        period = data.get("period", request.args.get("period", "all"))
+        if period not in LEADERBOARD_PERIODS:
+            return jsonify({"message": f"Period must be one of {', '.join(LEADERBOARD_PERIODS)}"}), 400
         
-        if not response or response == []:
-            return jsonify({"message":"Unable to fetch users, Please try later"}), 400
-        
-        response = get_user_with_most_points(limit)
-        
-        if not response:
-            return jsonify({"message":"Unable to fetch top user, Please try later"}), 400
-        return jsonify({"message":response}),200
+        response = get_user_with_most_points(limit, period)
+        return jsonify({"message":response, "period":period}),200
     except DatabaseError as de:
-        print(f"Database error: {str(de)}")
+        logger.error(f"Database error: {str(de)}")
         return jsonify({"message":"Database error"}), 500
     except Exception as e:
         return jsonify({"message":f"Internal server error {str(e)}"}), 500
     
     
 @user.route("get_users", methods=["GET"])
+@cached_response(depends_on=("users",), max_age=30, stale_while_revalidate=60, private=True)
 def get_users():
     try:
-        limit = 0
-        if request.is_json:
-            data = request.get_json()
-            if data:
-                limit = data.get("limit")
+        # ?limit=&cursor=&count=exact or, as before, a JSON body
+        data = request.get_json(silent=True) if request.is_json else None
+        if not isinstance(data, dict):
+            data = {}
+        
+        limit = data.get("limit", request.args.get("limit")) or 10
+        if isinstance(limit, str) and limit.isdigit():
+            limit = int(limit)
         
-        if limit and not isinstance(limit, int):
+        if not isinstance(limit, int):
             return jsonify({"message":f"Limit should be tpye of int, but provided {type(limit).__name__}"}), 400
-
-        res_limit = limit if limit else 10
-        response = get_users_(res_limit)
-        if not response:
-            return jsonify({"message":"Unable to fetch user, Please try later"}), 400
-        return response
+        
+        if limit <= 0 or limit > USERS_PAGE_MAX_LIMIT:
+            return jsonify({"message":f"Limit must be between 1 and {USERS_PAGE_MAX_LIMIT}"}), 400
+        
+        cursor = data.get("cursor", request.args.get("cursor"))
+        try:
+            after_id = decode_users_cursor(cursor) if cursor else 0
+        except (TypeError, ValueError):
+            return jsonify({"message":"Invalid cursor"}), 400
+        
+        exact_count = data.get("count", request.args.get("count")) == "exact"
+        
+        page = get_users_(limit, after_id, exact_count)
+        return jsonify({"message":page["users"], "next_cursor":page["next_cursor"],
+                        "total":page["total"], "total_is_estimate":page["total_is_estimate"]}), 200
     except DatabaseError as de:
-        print(f"Database error {str(de)}")
+        logger.error(f"Database error {str(de)}")
         return jsonify({"message":"Database error"}), 500
     except Exception as e:
-        print(f"errror:{str(e)}")
+        logger.exception(f"errror:{str(e)}")
         return jsonify({"message":"Internal server error"}), 500
     
 @user.route('/scheme_status',methods=["POST"])
-def scheme_status():
+def scheme_status_route():
     try:
         if not request.is_json:
             return jsonify({"message":"JSON paylaod required"}), 400
@@ -110,14 +120,15 @@ def scheme_status():
             return jsonify({"message":"No scheme found"}), 404
         return jsonify({"response":status}), 200
     except DatabaseError as dber:
-        print(f" Database error {str(dber)}")
+        logger.error(f" Database error {str(dber)}")
         return jsonify({"message":"Database error"}), 500
     except Exception as e:
-        print(f"Internal server error {str(e)}")
+        logger.exception(f"Internal server error {str(e)}")
         return jsonify({"message":"Internal server error"}), 500
         
 # need to be added to main api
 @user.route('/get_schemes_for_user',methods=["GET"])
+@cached_response(depends_on=("schemes",), max_age=60, stale_while_revalidate=300)
 def get_scheme():
     try:
         schemes = get_schemes_()
@@ -126,10 +137,10 @@ def get_scheme():
             return jsonify({"message":"No scheme found"}), 404
         return jsonify({"response":schemes}), 200
     except DatabaseError as dber:
-        print(f"Database error occured {str(dber)}")
+        logger.error(f"Database error occured {str(dber)}")
         return jsonify({"message":"Database error"}), 500
     except Exception as e:
-        print(f"Internal server error")
+        logger.exception(f"Internal server error")
         return jsonify({"message":"Internal server error"}), 500
 
 @user.route('/redeem_scheme',methods=["POST"])
@@ -144,29 +155,33 @@ def redeem_scheme():
         scheme_id = data.get("scheme_id")
         if not email or not scheme_id:
             return jsonify({"message":"Email and Scheme_id required"}), 400
+        try:
+            scheme_id = int(scheme_id)
+        except (TypeError, ValueError):
+            return jsonify({"message":"Scheme_id must be an integer"}), 400
         email = email.strip()
         
-    # need check if user have applied before or not
-        if scheme_already_applied(email):
-            return jsonify({"message":"Scheme alredy applied"}),400
-        if not is_scheme_date_valid(scheme_id):
-            return jsonify({"message":"Scheme expired"}), 400
-    # need to check if user have enough point to apply scheme
-        required_points = get_points_required_for_scheme(int(scheme_id))
-        user_points = get_user_points(email)
-        if user_points < required_points:
-            return jsonify({"message":"Insufficient points"}), 400
-        user_details = get_user_details(email)
-        name = user_details.get("name")
-        insert_scheme(name, email, scheme_id)
-    
-        return jsonify({"message":"Applied for scheme"}), 200
+        # Applied / expired / balance / user checks and the insert run as one statement
+        result = apply_for_scheme(email, scheme_id)
+        reason = result.get("reason")
+        
+        if reason == "applied":
+            return jsonify({"message":"Applied for scheme","reason":reason,"redemption_id":result.get("redemption_id")}), 200
+        if reason in ("user_not_found", "scheme_not_found"):
+            return jsonify({"message":REDEEM_SCHEME_MESSAGES[reason],"reason":reason}), 404
+        return jsonify({"message":REDEEM_SCHEME_MESSAGES.get(reason, "Unable to apply for scheme"),"reason":reason,
+                        "points":result.get("points"),"required_points":result.get("required_points")}), 400
     except DatabaseError as dber:
-        print(str(dber))
-        return jsonify({"Database error"}), 500
+        logger.error(str(dber))
+        return jsonify({"message":"Database error"}), 500
     except Exception as e:
-        print(str(e))
+        logger.exception(str(e))
         return jsonify({"message":"Internal server error"}), 500
-    
-    
-    
+
+REDEEM_SCHEME_MESSAGES = {
+    "user_not_found":"No such user exists",
+    "scheme_not_found":"No such scheme exists",
+    "already_applied":"Scheme alredy applied",
+    "expired":"Scheme expired",
+    "insufficient_points":"Insufficient points"
+}
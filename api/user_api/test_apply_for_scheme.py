@@ -0,0 +1,63 @@
+import pytest
+from datetime import date, timedelta
+from api.user_api.queries import apply_for_scheme_query
+
+
+def add_scheme(cursor, points: int, valid_to: date) -> int:
+    cursor.execute(
+        """
+        INSERT INTO scheme (scheme_title, scheme_valid_from, scheme_valid_to, points)
+        VALUES ('pytest scheme', '01-01-2020', %s, %s)
+        RETURNING scheme_id
+        """,
+        (valid_to.strftime("%d-%m-%Y"), points)
+    )
+    return cursor.fetchone()[0]
+
+
+def apply(cursor, user_id: int, scheme_id: int) -> tuple:
+    cursor.execute(apply_for_scheme_query(), {"user_id": user_id, "scheme_id": scheme_id})
+    return cursor.fetchone()
+
+
+@pytest.fixture
+def cursor(database, user):
+    cursor = database.cursor()
+    cursor.execute("UPDATE user_points SET points = 100 WHERE user_id = %s", (user,))
+    return cursor
+
+
+def test_eligible_user_is_applied_once(cursor, user):
+    scheme_id = add_scheme(cursor, 80, date.today() + timedelta(days=30))
+
+    reason, redemption_id, points, required_points = apply(cursor, user, scheme_id)
+    assert (reason, points, required_points) == ("applied", 100, 80)
+    cursor.execute("SELECT user_id, scheme_id, scheme_status FROM schemes_redemption WHERE id = %s", (redemption_id,))
+    assert cursor.fetchone() == (user, scheme_id, "pending")
+
+    assert apply(cursor, user, scheme_id)[:2] == ("already_applied", None)
+
+
+@pytest.mark.parametrize("points, valid_to, reason", [
+    (101, date.today() + timedelta(days=30), "insufficient_points"),
+    (10, date.today() - timedelta(days=1), "expired"),
+])
+def test_ineligible_user_is_not_applied(cursor, user, points, valid_to, reason):
+    scheme_id = add_scheme(cursor, points, valid_to)
+
+    assert apply(cursor, user, scheme_id)[:2] == (reason, None)
+    cursor.execute("SELECT COUNT(*) FROM schemes_redemption WHERE user_id = %s", (user,))
+    assert cursor.fetchone()[0] == 0
+
+
+def test_scheme_valid_until_today_is_not_expired(cursor, user):
+    scheme_id = add_scheme(cursor, 10, date.today())
+
+    assert apply(cursor, user, scheme_id)[0] == "applied"
+
+
+def test_unknown_user_and_scheme(cursor, user):
+    scheme_id = add_scheme(cursor, 10, date.today() + timedelta(days=30))
+
+    assert apply(cursor, -1, scheme_id)[0] == "user_not_found"
+    assert apply(cursor, user, -1)[0] == "scheme_not_found"
@@ -0,0 +1,108 @@
+import pytest
+from flask import Flask
+from api import response_cache as response_cache_module
+from api.rate_limiter import limiter
+from api.response_cache import ResponseCache
+from api.user_api import queries, routes
+
+
+class Leaderboard:
+    """Stands in for get_user_with_most_points(), recording what it was asked for."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, limit, period="all"):
+        self.calls.append((limit, period))
+        return [{"id": 1, "name": "a", "email": "a@example.com", "points": 30, "rank": 1}][:limit]
+
+
+@pytest.fixture
+def leaderboard(monkeypatch):
+    leaderboard = Leaderboard()
+    monkeypatch.setattr(routes, "get_user_with_most_points", leaderboard)
+    return leaderboard
+
+
+@pytest.fixture
+def client(monkeypatch, leaderboard):
+    from api.blueprints import user
+    monkeypatch.setattr(limiter, "enabled", False)
+    monkeypatch.setattr(response_cache_module, "response_cache", ResponseCache(100000, 10000))
+    app = Flask(__name__)
+    app.register_blueprint(user, url_prefix="/user")
+    return app.test_client()
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("", (10, "all")),
+    ("?limit=5", (5, "all")),
+    ("?period=week", (10, "week")),
+    ("?limit=3&period=month", (3, "month")),
+])
+def test_limit_and_period_from_the_query_string(client, leaderboard, query, expected):
+    response = client.get(f"/user/top_users{query}")
+
+    assert response.status_code == 200
+    assert response.get_json()["period"] == expected[1]
+    assert leaderboard.calls == [expected]
+
+
+def test_limit_and_period_from_a_json_body(client, leaderboard):
+    response = client.get("/user/top_users", json={"limit": 2, "period": "week"})
+
+    assert response.status_code == 200
+    assert leaderboard.calls == [(2, "week")]
+
+
+@pytest.mark.parametrize("query, body, message", [
+    ("?limit=ten", None, "Limit must be an integer, got str"),
+    ("?limit=-1", None, "Limit must be an integer, got str"),
+    ("?limit=0", None, "Limit must be a positive integer"),
+    ("", {"limit": 2.5}, "Limit must be an integer, got float"),
+    ("", {"limit": 0}, "Limit must be a positive integer"),
+    ("?period=year", None, "Period must be one of all, week, month"),
+    ("", {"period": "day"}, "Period must be one of all, week, month"),
+])
+def test_invalid_limit_or_period(client, leaderboard, query, body, message):
+    response = client.get(f"/user/top_users{query}", json=body)
+
+    assert response.status_code == 400
+    assert response.get_json()["message"] == message
+    assert leaderboard.calls == []
+
+
+def add_user(cursor, email):
+    cursor.execute("INSERT INTO users (name, email, password) VALUES ('pytest', %s, 'x') RETURNING id", (email,))
+    user_id = cursor.fetchone()[0]
+    cursor.execute("INSERT INTO user_points (user_id, points) VALUES (%s, 0)", (user_id,))
+    return user_id
+
+
+def credit(cursor, user_id, points, entry_type="credit"):
+    cursor.execute(
+        "INSERT INTO points_ledger (user_id, entry_type, points, source) VALUES (%s, %s, %s, 'pytest')",
+        (user_id, entry_type, points)
+    )
+
+
+def ranking(cursor, period, user_ids):
+    cursor.execute(queries.get_top_users_query(), {"period": period, "limit": 100000})
+    return [(row[0], row[3]) for row in cursor.fetchall() if row[0] in user_ids]
+
+
+def test_snapshot_ranks_earnings_and_balances(database, user):
+    cursor = database.cursor()
+    other = add_user(cursor, "pytest.other@example.com")
+    credit(cursor, user, 50)
+    credit(cursor, user, -40, "debit")
+    credit(cursor, other, 20)
+
+    cursor.execute("SELECT points FROM points_earned_daily WHERE user_id = %s AND day = CURRENT_DATE", (user,))
+    # Debits do not count as earnings
+    assert cursor.fetchone() == (50,)
+
+    cursor.execute("SELECT refresh_leaderboards()")
+    assert ranking(cursor, "week", {user, other}) == [(user, 50), (other, 20)]
+    assert ranking(cursor, "month", {user, other}) == [(user, 50), (other, 20)]
+    assert ranking(cursor, "all", {user, other}) == [(other, 20), (user, 10)]
@@ -0,0 +1,79 @@
+import base64
+import pytest
+import api.user_api.utils.users_util as users_util
+from api.user_api.utils.users_util import encode_users_cursor, decode_users_cursor, get_users_
+
+
+@pytest.mark.parametrize("user_id", [0, 1, 42, 2 ** 31 - 1, 10 ** 12])
+def test_cursor_round_trip(user_id):
+    cursor = encode_users_cursor(user_id)
+
+    assert decode_users_cursor(cursor) == user_id
+    # Safe in a query string without escaping
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+
+def b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "%%%", b64("42"), b64("u2:42"), b64("u1:"),
+                                    b64("u1:-5"), b64("u1:4 2"), b64("u1:abc"), None, 42])
+def test_invalid_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_users_cursor(cursor)
+
+
+@pytest.fixture
+def users_table(monkeypatch):
+    """Answers the get_users queries from seven users in memory."""
+    rows = [(user_id, f"user {user_id}", f"u{user_id}@x.com", user_id * 10) for user_id in range(1, 8)]
+    queries = []
+
+    def stream_query(query, params, batch_size):
+        queries.append(params)
+        return iter([row for row in rows if row[0] > params["after_id"]][:params["limit"]])
+
+    def execute_query(query, params=None, fetch_results=False):
+        if "reltuples" in query:
+            return [(-1,)]
+        return [(len(rows),)]
+
+    monkeypatch.setattr(users_util, "stream_query", stream_query)
+    monkeypatch.setattr(users_util, "execute_query", execute_query)
+    return queries
+
+
+def test_pages_walk_every_user_once(users_table):
+    seen, cursor = [], None
+    while True:
+        page = get_users_(3, decode_users_cursor(cursor) if cursor else 0)
+        seen.extend(user["id"] for user in page["users"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == list(range(1, 8))
+    # One row more than the page is read to know whether another page follows
+    assert [params["limit"] for params in users_table] == [4, 4, 4]
+
+
+def test_last_full_page_has_no_cursor(users_table):
+    page = get_users_(7)
+
+    assert len(page["users"]) == 7
+    assert page["next_cursor"] is None
+
+
+def test_next_cursor_points_after_the_last_user(users_table):
+    page = get_users_(2, after_id=3)
+
+    assert [user["id"] for user in page["users"]] == [4, 5]
+    assert decode_users_cursor(page["next_cursor"]) == 5
+
+
+def test_total_falls_back_to_exact_count_before_analyze(users_table):
+    page = get_users_(2)
+
+    assert page["total"] == 7
+    assert page["total_is_estimate"] is False
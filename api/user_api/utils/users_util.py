@@ -2,10 +2,58 @@
 # import os
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 from api.user_api.queries import*
-from api.database import execute_query
+from api.database import execute_query, execute_query_for_points, on_primary, stream_query
+from api.user_cache import user_cache
+from api.response_cache import response_cache
+from api.user_ids import resolve_user_id
+from api.config import SCHEME_CATALOG_TTL_SECONDS, DB_READ_YOUR_WRITES_SECONDS, USERS_PAGE_FETCH_SIZE
+from cachetools import TTLCache
 from typing import Optional
 from psycopg2 import DatabaseError
 from datetime import datetime
+import base64
+from contextlib import nullcontext
+import threading
+import time
+
+# Active schemes shown to users; dropped by scheme changes and by the expiry sweeper
+_scheme_catalog = TTLCache(maxsize=1, ttl=SCHEME_CATALOG_TTL_SECONDS)
+_scheme_catalog_lock = threading.Lock()
+# A catalog reloaded soon after a scheme change is read from the primary, a replica may
+# not have the change yet and it would be cached for the whole TTL
+_scheme_catalog_changed_at = 0.0
+
+# Leaderboards kept in leaderboard_snapshot (migrations/0009_leaderboards.sql)
+LEADERBOARD_PERIODS = ("all", "week", "month")
+
+# get_users cursors are the last users.id of a page, versioned and base64 encoded so
+# clients treat them as opaque
+USERS_CURSOR_PREFIX = "u1:"
+
+def encode_users_cursor(user_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{USERS_CURSOR_PREFIX}{user_id}".encode()).decode().rstrip("=")
+
+def decode_users_cursor(cursor: str) -> int:
+    """
+    Raises:
+        ValueError: If cursor was not made by encode_users_cursor().
+    """
+    try:
+        decoded = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except Exception:
+        raise ValueError("Invalid cursor")
+    user_id = decoded[len(USERS_CURSOR_PREFIX):]
+    if not decoded.startswith(USERS_CURSOR_PREFIX) or not user_id.isdigit():
+        raise ValueError("Invalid cursor")
+    return int(user_id)
+
+def invalidate_scheme_catalog() -> None:
+    """Drops the cached scheme catalog so the next read reloads it from the database."""
+    global _scheme_catalog_changed_at
+    with _scheme_catalog_lock:
+        _scheme_catalog.clear()
+        _scheme_catalog_changed_at = time.monotonic()
+    response_cache.bump("schemes")
 
 def get_user_details(email: str) -> Optional[dict | None]:
     """
@@ -23,9 +71,14 @@ def get_user_details(email: str) -> Optional[dict | None]:
         Exception: For unexpected database or query execution errors.
     """
     try:
-        # Validate email input
+        email = email.strip()
+        cached = user_cache.get("profile", email)
+        if cached is not None:
+            return dict(cached)
+        generation = user_cache.generation(email)
+        
         query = get_users_detail_query()
-        params = {"email": email.strip()}
+        params = {"email": email}
         
         # Execute query
         response = execute_query(query, params, fetch_results=True)
@@ -42,8 +95,9 @@ def get_user_details(email: str) -> Optional[dict | None]:
             "point": row[2] if row[2] is not None else 0,
             "email": row[3] if row[3] is not None else 'NA'
         }
+        user_cache.put("profile", email, user_details, generation)
         
-        return user_details
+        return dict(user_details)
     except DatabaseError as de:
         raise DatabaseError(str(de))
     except ValueError as ve:
@@ -51,28 +105,32 @@ def get_user_details(email: str) -> Optional[dict | None]:
     except Exception as e:
         raise RuntimeError(f"An unexpected error occurred: {str(e)}")
 
-def get_user_with_most_points(limit: int) -> Optional[list[dict] | None]:
+def get_user_with_most_points(limit: int, period: str = "all") -> list[dict]:
     """
-    Retrieves a list of users with the highest points from the database.
+    Retrieves the top users of a leaderboard period from the last leaderboard snapshot.
 
     Args:
         limit (int): The maximum number of users to return.
+        period (str): One of LEADERBOARD_PERIODS: "all" ranks current balances, "week" and
+                      "month" the points earned since the current week or month started.
 
     Returns:
-        list[dict]: A list of dictionaries containing user details (id, name, email, points).
-                    Returns None if  no users are found.
+        list[dict]: A list of dictionaries containing user details (id, name, email, points, rank),
+                    best first. Empty if nobody is ranked for the period.
 
     Raises:
-        ValueError: If the limit is less than or equal to 0.
+        ValueError: If the period is not one of LEADERBOARD_PERIODS.
         Exception: For unexpected errors during query execution or processing.
     """
     try:
+        if period not in LEADERBOARD_PERIODS:
+            raise ValueError(f"Unknown leaderboard period {period}")
         query = get_top_users_query()
-        params = {"limit": limit}
+        params = {"limit": limit, "period": period}
         response = execute_query(query, params, fetch_results=True)
 
         if not response:
-            return None
+            return []
 
         top_users_details = []
         for row in response:
@@ -82,6 +140,7 @@ def get_user_with_most_points(limit: int) -> Optional[list[dict] | None]:
                     "name": row[1] if row[1] is not None else 'NA',
                     "email": row[2] if row[2] is not None else 'NA',
                     "points": row[3] if row[3] is not None else 'NA',
+                    "rank": row[4],
                 }
                 top_users_details.append(details)
             except IndexError as e:
@@ -95,27 +154,89 @@ def get_user_with_most_points(limit: int) -> Optional[list[dict] | None]:
     except Exception as e:
         raise RuntimeError(f"An unexpected error occurred: {str(e)}")
 
-def get_users_(limit:int)->Optional[list[dict] | None]:
-    
+def refresh_leaderboards() -> int:
+    """
+    Rebuilds the leaderboard snapshot from the daily points rollup and the balances. The
+    previous snapshot keeps being served while it runs.
+
+    Returns:
+        int: The number of ranked rows across all periods.
+
+    Raises:
+        DatabaseError: If a database error occurs during query execution.
+        RuntimeError: For other unexpected errors.
+    """
+    try:
+        query = refresh_leaderboards_query()
+        response = execute_query_for_points(query, fetch_results=True)
+        response_cache.bump("leaderboards")
+        return response[0][0] if response else 0
+    except DatabaseError as dber:
+        raise DatabaseError(f"Database error {str(dber)}")
+    except Exception as e:
+        raise RuntimeError(str(e))
+
+def get_users_(limit:int, after_id:int = 0, exact_count:bool = False)->dict:
+    """
+    Retrieves a page of users in ID order, starting after the user with ID after_id.
+
+    Rows are read through a server-side cursor, USERS_PAGE_FETCH_SIZE at a time. One row more than
+    limit is read to tell whether another page follows.
+
+    Args:
+        limit (int): The maximum number of users to return.
+        after_id (int): The last ID of the previous page, 0 for the first page.
+        exact_count (bool): Count the users instead of using the planner's estimate.
+
+    Returns:
+        dict: Containing:
+            - users (list[dict]): id, name, email and points of each user on the page.
+            - next_cursor (str | None): Cursor of the next page, None on the last page.
+            - total (int): Number of users, estimated unless exact_count is set or no estimate exists.
+            - total_is_estimate (bool): Whether total is the planner's estimate.
+
+    Raises:
+        DatabaseError: If a database error occurs during query execution.
+        RuntimeError: For other unexpected errors.
+    """
     try:
     
         query = get_users_query()
-        params = {"limit":limit}
-        response = execute_query(query, params, fetch_results=True)
+        params = {"after_id":after_id, "limit":limit + 1}
         
         users = []
         
-        if not response:
-            return None
-        for row in response:
+        for row in stream_query(query, params, batch_size=USERS_PAGE_FETCH_SIZE):
             user_details = {
-                "id":row[0] if row[0] else 'NA',
+                "id":row[0],
                 "name":row[1] if row[1] else 'NA',
                 "email":row[2] if row[2] else 'NA',
                 "points":row[3] if row[3] else 0
             }
             users.append(user_details)
-        return users
+        
+        next_cursor = None
+        if len(users) > limit:
+            users.pop()
+            next_cursor = encode_users_cursor(users[-1]["id"])
+        
+        total = None
+        if not exact_count:
+            response = execute_query(get_users_estimate_query(), fetch_results=True)
+            # -1 until the table is first analyzed
+            if response and response[0][0] >= 0:
+                total = response[0][0]
+        total_is_estimate = total is not None
+        if total is None:
+            response = execute_query(get_users_count_query(), fetch_results=True)
+            total = response[0][0] if response else 0
+        
+        return {
+            "users":users,
+            "next_cursor":next_cursor,
+            "total":total,
+            "total_is_estimate":total_is_estimate
+        }
     except DatabaseError as de:
         raise DatabaseError(str(de))
     except Exception as e:
@@ -174,8 +295,11 @@ def insert_scheme(name: str, email: str, scheme_id: int) -> bool:
         RuntimeError: For other unexpected errors.
     """
     try:
+        user_id = resolve_user_id(email)
+        if user_id is None:
+            return False
         query = insert_scheme_query()
-        params = {"name": name, "email": email, "scheme_id": scheme_id}
+        params = {"name": name, "user_id": user_id, "scheme_id": scheme_id}
         response = execute_query(query, params)
     
         return response > 1
@@ -185,11 +309,48 @@ def insert_scheme(name: str, email: str, scheme_id: int) -> bool:
     except Exception as e:
         raise RuntimeError(f"Error: {str(e)}")
 
+def apply_for_scheme(email: str, scheme_id: int) -> dict:
+    """
+    Checks a user's eligibility for a scheme and records the redemption request in one round trip.
+
+    Args:
+        email (str): The user's email address.
+        scheme_id (int): The ID of the scheme to apply for.
+
+    Returns:
+        dict: The reason code ('applied', 'user_not_found', 'scheme_not_found', 'already_applied',
+              'expired' or 'insufficient_points'), the new redemption id (None unless applied),
+              the user's points and the points required by the scheme.
+
+    Raises:
+        DatabaseError: If a database error occurs during query execution.
+        RuntimeError: For other unexpected errors.
+    """
+    try:
+        query = apply_for_scheme_query()
+        params = {"user_id": resolve_user_id(email), "scheme_id": scheme_id}
+        # The insert has to be committed, so this goes through the committing executor
+        response = execute_query_for_points(query, params, fetch_results=True)
+        
+        row = response[0]
+        return {
+            "reason": row[0],
+            "redemption_id": row[1],
+            "points": row[2],
+            "required_points": row[3]
+        }
+    except DatabaseError as dber:
+        raise DatabaseError(f"Database error: {str(dber)}")
+    except Exception as e:
+        raise RuntimeError(f"Error: {str(e)}")
+
 def scheme_already_applied(email:str)->bool:
     try:
-        # Construct a safe query to check for the email
+        user_id = resolve_user_id(email)
+        if user_id is None:
+            return False
         query = scheme_already_applied_query()
-        params = {"email": email}
+        params = {"user_id": user_id}
 
         # Execute the query
         response = execute_query(query, params, fetch_results=True)
@@ -229,8 +390,11 @@ def scheme_status(email: str) -> Optional[list[dict]| None]:
         [{'scheme_title': 'Summer Bonanza', 'scheme_status': 'Pending'}]
     """
     try:
+        user_id = resolve_user_id(email)
+        if user_id is None:
+            return None
         query = scheme_status_query()
-        params = {"email":email}
+        params = {"user_id": user_id}
         response = execute_query(query, params, fetch_results=True)
         
         if not response or response == []:
@@ -268,8 +432,15 @@ def get_schemes_()->Optional[ list[dict] | None]:
         RuntimeError: If an unexpected error occurs.
     """
     try:
+        with _scheme_catalog_lock:
+            cached = _scheme_catalog.get("schemes")
+        if cached is not None:
+            return [dict(scheme) for scheme in cached]
+        
         query = get_scheme_query()
-        response = execute_query(query, fetch_results=True)
+        recently_changed = time.monotonic() - _scheme_catalog_changed_at < DB_READ_YOUR_WRITES_SECONDS
+        with on_primary() if recently_changed else nullcontext():
+            response = execute_query(query, fetch_results=True)
         
         if not response or response == []:
             return None
@@ -285,7 +456,9 @@ def get_schemes_()->Optional[ list[dict] | None]:
                 "points":row[5] if row[5] else 10000
             }
             scheme.append(scheme_details)
-        return scheme
+        with _scheme_catalog_lock:
+            _scheme_catalog["schemes"] = scheme
+        return [dict(scheme_details) for scheme_details in scheme]
     except DatabaseError as dber:
         raise DatabaseError(f"Database error occured {str(dber)}")
     except Exception as e:
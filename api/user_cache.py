@@ -0,0 +1,85 @@
+import threading
+from typing import Any, Optional
+from cachetools import TTLCache
+from api.response_cache import response_cache
+from api.config import USER_CACHE_ENABLED, USER_CACHE_TTL_SECONDS, USER_CACHE_MAXSIZE
+
+
+class UserCache:
+    """
+    Per-email read cache for user profiles and point balances.
+
+    Entries expire after USER_CACHE_TTL_SECONDS and are dropped explicitly by every write
+    to the user or the balance. Each invalidation bumps a per-email generation, so a read
+    that started before the write cannot store the value it loaded afterwards.
+    Invalidation is per process; other workers see the change once their entry expires.
+    """
+
+    KINDS = ("profile", "points")
+
+    def __init__(self, maxsize: int, ttl: int, enabled: bool = True):
+        self.enabled = enabled
+        self._entries = {kind: TTLCache(maxsize=maxsize, ttl=ttl) for kind in self.KINDS}
+        self._generations = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._hits = dict.fromkeys(self.KINDS, 0)
+        self._misses = dict.fromkeys(self.KINDS, 0)
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, email: str) -> Optional[Any]:
+        """Returns the cached value, or None on a miss."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            value = self._entries[kind].get(email)
+            if value is None:
+                self._misses[kind] += 1
+            else:
+                self._hits[kind] += 1
+            return value
+
+    def generation(self, email: str) -> int:
+        """Token to take before loading a value, to be passed back to put()."""
+        return self._generations.get(email, 0)
+
+    def put(self, kind: str, email: str, value: Any, generation: int) -> None:
+        if not self.enabled or value is None:
+            return
+        with self._lock:
+            if self._generations.get(email, 0) == generation:
+                self._entries[kind][email] = value
+
+    def invalidate(self, email: str, listed: bool = False) -> None:
+        """
+        Drops every cached value of a user. Call after any write to the user or the balance.
+        Pass listed=True for writes that add, remove or rename a user in the user list, which
+        also bumps the "users" version of the response cache. Balance changes leave cached
+        lists alone, so their points catch up within the list's max-age instead of every scan
+        emptying the cache.
+        """
+        if listed:
+            response_cache.bump("users")
+        if not self.enabled or not email:
+            return
+        email = email.strip()
+        with self._lock:
+            for entries in self._entries.values():
+                entries.pop(email, None)
+            self._generations[email] = self._generations.get(email, 0) + 1
+            self._invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"enabled": self.enabled, "invalidations": self._invalidations}
+            for kind in self.KINDS:
+                hits, misses = self._hits[kind], self._misses[kind]
+                stats[kind] = {
+                    "entries": len(self._entries[kind]),
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0
+                }
+            return stats
+
+
+user_cache = UserCache(USER_CACHE_MAXSIZE, USER_CACHE_TTL_SECONDS, USER_CACHE_ENABLED)
@@ -0,0 +1,69 @@
+import threading
+from typing import Optional
+from flask import g, has_request_context, request
+from cachetools import TTLCache
+from api.database import execute_query
+from api.login_api.queries import get_user_id_query
+from api.config import USER_CACHE_ENABLED, USER_CACHE_TTL_SECONDS, USER_CACHE_MAXSIZE
+from psycopg2 import DatabaseError
+
+# An email keeps its id until the user is deleted, so balance writes do not drop these
+# entries; forget_user_id() does when a user is deleted or created.
+_user_ids = TTLCache(maxsize=USER_CACHE_MAXSIZE, ttl=USER_CACHE_TTL_SECONDS)
+_user_ids_lock = threading.Lock()
+
+
+def resolve_user_id(email: str) -> Optional[int]:
+    """
+    Returns the users.id of an email, or None if there is no such user.
+
+    Tables reference users by id while routes identify users by email, so data access
+    starts with this lookup. It reaches the database at most once per request: the id
+    is taken from the JWT "uid" claim when the token belongs to the same email, then
+    from the ids already resolved in this request, then from the process wide cache.
+
+    Raises:
+        DatabaseError: If the lookup query fails.
+    """
+    if not email or not isinstance(email, str):
+        return None
+    email = email.strip()
+
+    in_request = has_request_context()
+    if in_request:
+        if getattr(request, "user", None) == email and getattr(request, "user_id", None):
+            return request.user_id
+        resolved = g.setdefault("user_ids", {})
+        if email in resolved:
+            return resolved[email]
+
+    with _user_ids_lock:
+        user_id = _user_ids.get(email) if USER_CACHE_ENABLED else None
+    if user_id is None:
+        try:
+            response = execute_query(get_user_id_query(), {"email": email}, fetch_results=True)
+        except DatabaseError as dber:
+            raise DatabaseError(f"Database error: {str(dber)}")
+        except Exception as e:
+            raise RuntimeError(f"Error resolving user id: {str(e)}")
+        if not response:
+            return None
+        user_id = response[0][0]
+        if USER_CACHE_ENABLED:
+            with _user_ids_lock:
+                _user_ids[email] = user_id
+
+    if in_request:
+        resolved[email] = user_id
+    return user_id
+
+
+def forget_user_id(email: str) -> None:
+    """Drops the resolved id of an email. Call after a user is deleted or created."""
+    if not email:
+        return
+    email = email.strip()
+    with _user_ids_lock:
+        _user_ids.pop(email, None)
+    if has_request_context():
+        g.get("user_ids", {}).pop(email, None)
@@ -0,0 +1,41 @@
+import os
+import sys
+import pytest
+
+# The app runs as api/app.py with api/ on the path, and its modules import each other
+# and config as "api.*" from the repository root
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(ROOT, "api"), ROOT]
+
+# Settings config.py reads without a default
+os.environ.setdefault("JWT_EXPIRY_MINUTES", "30")
+os.environ.setdefault("JWT_SECRET_KEY", "test")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+
+
+@pytest.fixture
+def database():
+    """
+    A psycopg2 connection to TEST_DATABASE_URL that is rolled back after the test.
+    Tests using it are skipped when the variable is not set.
+    """
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    psycopg2 = pytest.importorskip("psycopg2")
+    connection = psycopg2.connect(url)
+    try:
+        yield connection
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+@pytest.fixture
+def user(database):
+    """users.id of a user with an empty balance, created in the database fixture's transaction."""
+    cursor = database.cursor()
+    cursor.execute("INSERT INTO users (name, email, password) VALUES ('pytest', 'pytest.user@example.com', 'x') RETURNING id")
+    user_id = cursor.fetchone()[0]
+    cursor.execute("INSERT INTO user_points (user_id, points) VALUES (%s, 0)", (user_id,))
+    return user_id
@@ -0,0 +1,15 @@
+-- Idempotency keys for offline scan batches submitted to /points/validate_points.
+
+-- migrate:up
+CREATE TABLE scan_batches (
+    batch_id UUID PRIMARY KEY,
+    email VARCHAR(100) NOT NULL,
+    status VARCHAR(12) CHECK (status IN ('pending', 'processing', 'completed', 'failed')) DEFAULT 'pending',
+    codes JSONB,
+    result JSONB,
+    created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- migrate:down
+DROP TABLE scan_batches;
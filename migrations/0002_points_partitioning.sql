@@ -0,0 +1,143 @@
+-- Keep only live codes in a points table range partitioned by expiry month.
+-- Scanned and expired codes are moved to points_archive by archive_points(),
+-- so partition scans and the partial index track the number of live codes.
+-- The primary key has to include the partition key, so codes are only unique
+-- per expiry date at the database level; the minting path must not reuse codes.
+
+-- migrate:up
+ALTER TABLE points RENAME TO points_legacy;
+
+CREATE TABLE points (
+    points_code VARCHAR(12) NOT NULL,
+    status VARCHAR(12) CHECK (status IN ('scanned', 'not_scanned')) DEFAULT 'not_scanned',
+    points_value INT,
+    expiry_date DATE NOT NULL,
+    PRIMARY KEY (points_code, expiry_date)
+) PARTITION BY RANGE (expiry_date);
+
+CREATE TABLE points_default PARTITION OF points DEFAULT;
+
+CREATE INDEX points_live_code_idx ON points (points_code) WHERE status = 'not_scanned';
+CREATE INDEX points_scanned_idx ON points (expiry_date) WHERE status = 'scanned';
+
+CREATE TABLE points_archive (
+    points_code VARCHAR(12) PRIMARY KEY,
+    status VARCHAR(12) CHECK (status IN ('scanned', 'not_scanned')),
+    points_value INT,
+    expiry_date DATE,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Creates the monthly partitions from the current month up to until_date, at most
+-- two years ahead; codes expiring later stay in the default partition until then.
+-- Rows that landed in the default partition for a new month are moved into it.
+CREATE FUNCTION ensure_points_partitions(until_date DATE) RETURNS INT AS $$
+DECLARE
+    month_start DATE := date_trunc('month', CURRENT_DATE)::DATE;
+    last_month DATE := LEAST(until_date, (CURRENT_DATE + INTERVAL '2 years')::DATE);
+    partition_name TEXT;
+    created INT := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := 'points_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE points INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM points_default WHERE expiry_date >= %L AND expiry_date < %L RETURNING *)
+                 INSERT INTO %I SELECT * FROM moved',
+                month_start, (month_start + INTERVAL '1 month')::DATE, partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE points ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, (month_start + INTERVAL '1 month')::DATE
+            );
+            created := created + 1;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::DATE;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Moves up to batch_size scanned or expired codes into points_archive and
+-- drops monthly partitions that have fully expired. Returns the rows moved.
+CREATE FUNCTION archive_points(batch_size INT) RETURNS INT AS $$
+DECLARE
+    partition_name TEXT;
+    moved_rows INT;
+    total INT := 0;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'points'::regclass
+        AND c.relname ~ '^points_\d{4}_\d{2}$'
+        AND (to_date(substring(c.relname FROM 8), 'YYYY_MM') + INTERVAL '1 month')::DATE <= CURRENT_DATE
+    LOOP
+        EXECUTE format(
+            'INSERT INTO points_archive (points_code, status, points_value, expiry_date)
+             SELECT points_code, status, points_value, expiry_date FROM %I
+             ON CONFLICT (points_code) DO NOTHING',
+            partition_name
+        );
+        GET DIAGNOSTICS moved_rows = ROW_COUNT;
+        total := total + moved_rows;
+        EXECUTE format('DROP TABLE %I', partition_name);
+    END LOOP;
+
+    WITH batch AS (
+        SELECT points_code, expiry_date
+        FROM points
+        WHERE status = 'scanned' OR expiry_date < CURRENT_DATE
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    ),
+    moved AS (
+        DELETE FROM points p
+        USING batch b
+        WHERE p.points_code = b.points_code AND p.expiry_date = b.expiry_date
+        RETURNING p.points_code, p.status, p.points_value, p.expiry_date
+    )
+    INSERT INTO points_archive (points_code, status, points_value, expiry_date)
+    SELECT points_code, status, points_value, expiry_date FROM moved
+    ON CONFLICT (points_code) DO NOTHING;
+    GET DIAGNOSTICS moved_rows = ROW_COUNT;
+
+    RETURN total + moved_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_points_partitions((SELECT COALESCE(MAX(expiry_date), CURRENT_DATE) FROM points_legacy));
+
+INSERT INTO points (points_code, status, points_value, expiry_date)
+SELECT points_code, status, points_value, expiry_date
+FROM points_legacy
+WHERE status = 'not_scanned' AND expiry_date >= CURRENT_DATE;
+
+INSERT INTO points_archive (points_code, status, points_value, expiry_date)
+SELECT points_code, status, points_value, expiry_date
+FROM points_legacy
+WHERE status = 'scanned' OR expiry_date < CURRENT_DATE OR expiry_date IS NULL;
+
+DROP TABLE points_legacy;
+
+-- migrate:down
+CREATE TABLE points_legacy (
+    points_code VARCHAR(12) PRIMARY KEY,
+    status VARCHAR(12) CHECK (status IN ('scanned', 'not_scanned')) DEFAULT 'not_scanned',
+    points_value INT,
+    expiry_date DATE
+);
+
+INSERT INTO points_legacy (points_code, status, points_value, expiry_date)
+SELECT points_code, status, points_value, expiry_date FROM points
+UNION ALL
+SELECT points_code, status, points_value, expiry_date FROM points_archive
+ON CONFLICT (points_code) DO NOTHING;
+
+DROP FUNCTION archive_points(INT);
+DROP FUNCTION ensure_points_partitions(DATE);
+DROP TABLE points_archive;
+DROP TABLE points;
+ALTER TABLE points_legacy RENAME TO points;
@@ -0,0 +1,53 @@
+-- Append-only history of every balance change. user_points.points becomes a
+-- balance maintained by a statement level trigger on points_ledger, so callers
+-- append entries instead of doing a read-modify-write of the balance.
+
+-- migrate:up
+CREATE TABLE points_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    email VARCHAR(100) NOT NULL,
+    entry_type VARCHAR(12) CHECK (entry_type IN ('credit', 'debit', 'adjustment')) NOT NULL,
+    points INT NOT NULL,
+    source VARCHAR(100),
+    created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX points_ledger_email_idx ON points_ledger (email, created DESC);
+CREATE INDEX points_ledger_source_idx ON points_ledger (source);
+
+-- Opening balances, recorded before the trigger exists so they are not applied twice
+INSERT INTO points_ledger (email, entry_type, points, source)
+SELECT email, 'adjustment', points, 'opening_balance'
+FROM user_points
+WHERE COALESCE(points, 0) <> 0;
+
+UPDATE user_points SET points = 0 WHERE points IS NULL;
+ALTER TABLE user_points ALTER COLUMN points SET NOT NULL;
+ALTER TABLE user_points ADD CONSTRAINT user_points_non_negative CHECK (points >= 0);
+
+-- One UPDATE per statement and email, however many entries a batch inserts
+CREATE FUNCTION apply_points_ledger() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE user_points up
+    SET points = up.points + d.delta
+    FROM (
+        SELECT email, SUM(points) AS delta
+        FROM new_entries
+        GROUP BY email
+    ) d
+    WHERE up.email = d.email AND d.delta <> 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER points_ledger_balance
+AFTER INSERT ON points_ledger
+REFERENCING NEW TABLE AS new_entries
+FOR EACH STATEMENT EXECUTE FUNCTION apply_points_ledger();
+
+-- migrate:down
+DROP TRIGGER points_ledger_balance ON points_ledger;
+DROP FUNCTION apply_points_ledger();
+ALTER TABLE user_points DROP CONSTRAINT user_points_non_negative;
+ALTER TABLE user_points ALTER COLUMN points DROP NOT NULL;
+DROP TABLE points_ledger;
@@ -0,0 +1,13 @@
+-- Schemes get an explicit status that the expiry sweeper flips to 'expired' once
+-- scheme_valid_to has passed; pending redemptions of expired schemes are rejected.
+
+-- migrate:up
+ALTER TABLE scheme ADD COLUMN status VARCHAR(10) CHECK (status IN ('active', 'expired')) DEFAULT 'active';
+UPDATE scheme SET status = 'active' WHERE status IS NULL;
+ALTER TABLE scheme ALTER COLUMN status SET NOT NULL;
+
+CREATE INDEX schemes_redemption_pending_idx ON schemes_redemption (scheme_id) WHERE scheme_status = 'pending';
+
+-- migrate:down
+DROP INDEX schemes_redemption_pending_idx;
+ALTER TABLE scheme DROP COLUMN status;
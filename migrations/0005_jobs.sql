@@ -0,0 +1,27 @@
+-- Durable queue for work that should not block a request (OTP mails, scan
+-- batches, maintenance). Workers claim rows with FOR UPDATE SKIP LOCKED.
+
+-- migrate:up
+CREATE TABLE jobs (
+    id BIGSERIAL PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    priority SMALLINT NOT NULL DEFAULT 100,
+    status VARCHAR(10) CHECK (status IN ('queued', 'running', 'done', 'failed')) NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX jobs_queue_idx ON jobs (priority, run_after, id) WHERE status = 'queued';
+CREATE INDEX jobs_running_idx ON jobs (locked_at) WHERE status = 'running';
+CREATE INDEX jobs_finished_idx ON jobs (updated) WHERE status IN ('done', 'failed');
+CREATE INDEX otp_verification_valid_till_idx ON otp_verification (valid_till);
+
+-- migrate:down
+DROP INDEX otp_verification_valid_till_idx;
+DROP TABLE jobs;
@@ -0,0 +1,30 @@
+-- Indexes for the columns the queries filter and join on. user_points.email gets a
+-- unique constraint: every points call looks a balance up by email, and a second
+-- row for the same email would split the balance.
+
+-- migrate:up
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM user_points GROUP BY email HAVING COUNT(*) > 1) THEN
+        RAISE EXCEPTION 'user_points has more than one row for some emails, merge them before applying this migration';
+    END IF;
+END $$;
+
+ALTER TABLE user_points ADD CONSTRAINT user_points_email_key UNIQUE (email);
+CREATE INDEX user_points_points_idx ON user_points (points DESC);
+CREATE INDEX otp_verification_email_idx ON otp_verification (email);
+CREATE INDEX pending_signups_status_idx ON pending_signups (email_status, status);
+CREATE INDEX schemes_redemption_scheme_idx ON schemes_redemption (scheme_id, scheme_status);
+CREATE INDEX scheme_title_idx ON scheme (scheme_title);
+CREATE INDEX scheme_status_idx ON scheme (status, scheme_id);
+CREATE INDEX jobs_status_idx ON jobs (status, job_type);
+
+-- migrate:down
+DROP INDEX jobs_status_idx;
+DROP INDEX scheme_status_idx;
+DROP INDEX scheme_title_idx;
+DROP INDEX schemes_redemption_scheme_idx;
+DROP INDEX pending_signups_status_idx;
+DROP INDEX otp_verification_email_idx;
+DROP INDEX user_points_points_idx;
+ALTER TABLE user_points DROP CONSTRAINT user_points_email_key;
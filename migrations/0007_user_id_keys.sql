@@ -0,0 +1,89 @@
+-- user_points, schemes_redemption and points_ledger reference users.id instead of
+-- repeating the email, so joins and indexes use 4 byte keys and an email change only
+-- touches users. Deleting a user now removes their balance and redemptions; ledger
+-- entries are kept as history.
+
+-- migrate:up
+ALTER TABLE user_points ADD COLUMN user_id INT;
+ALTER TABLE schemes_redemption ADD COLUMN user_id INT;
+ALTER TABLE points_ledger ADD COLUMN user_id INT;
+
+UPDATE user_points up SET user_id = u.id FROM users u WHERE u.email = up.email;
+UPDATE schemes_redemption sr SET user_id = u.id FROM users u WHERE u.email = sr.email;
+UPDATE points_ledger pl SET user_id = u.id FROM users u WHERE u.email = pl.email;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM schemes_redemption WHERE user_id IS NULL) THEN
+        RAISE EXCEPTION 'schemes_redemption has rows for emails that are not in users, delete them before applying this migration';
+    END IF;
+    IF EXISTS (SELECT 1 FROM points_ledger WHERE user_id IS NULL) THEN
+        RAISE EXCEPTION 'points_ledger has entries for emails that are not in users, delete them before applying this migration';
+    END IF;
+END $$;
+
+ALTER TABLE user_points ALTER COLUMN user_id SET NOT NULL;
+ALTER TABLE user_points ADD CONSTRAINT user_points_user_id_key UNIQUE (user_id);
+ALTER TABLE user_points ADD CONSTRAINT user_points_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
+ALTER TABLE user_points DROP COLUMN email;
+
+ALTER TABLE schemes_redemption ALTER COLUMN user_id SET NOT NULL;
+ALTER TABLE schemes_redemption ADD CONSTRAINT schemes_redemption_user_id_key UNIQUE (user_id);
+ALTER TABLE schemes_redemption ADD CONSTRAINT schemes_redemption_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
+ALTER TABLE schemes_redemption DROP COLUMN email;
+
+ALTER TABLE points_ledger ALTER COLUMN user_id SET NOT NULL;
+CREATE INDEX points_ledger_user_idx ON points_ledger (user_id, created DESC);
+ALTER TABLE points_ledger DROP COLUMN email;
+
+CREATE OR REPLACE FUNCTION apply_points_ledger() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE user_points up
+    SET points = up.points + d.delta
+    FROM (
+        SELECT user_id, SUM(points) AS delta
+        FROM new_entries
+        GROUP BY user_id
+    ) d
+    WHERE up.user_id = d.user_id AND d.delta <> 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- migrate:down
+ALTER TABLE user_points ADD COLUMN email VARCHAR(100);
+ALTER TABLE schemes_redemption ADD COLUMN email VARCHAR(255);
+ALTER TABLE points_ledger ADD COLUMN email VARCHAR(100);
+
+UPDATE user_points up SET email = u.email FROM users u WHERE u.id = up.user_id;
+UPDATE schemes_redemption sr SET email = u.email FROM users u WHERE u.id = sr.user_id;
+UPDATE points_ledger pl SET email = u.email FROM users u WHERE u.id = pl.user_id;
+
+CREATE OR REPLACE FUNCTION apply_points_ledger() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE user_points up
+    SET points = up.points + d.delta
+    FROM (
+        SELECT email, SUM(points) AS delta
+        FROM new_entries
+        GROUP BY email
+    ) d
+    WHERE up.email = d.email AND d.delta <> 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Fails if ledger entries of deleted users remain; delete them before rolling back
+ALTER TABLE points_ledger ALTER COLUMN email SET NOT NULL;
+CREATE INDEX points_ledger_email_idx ON points_ledger (email, created DESC);
+DROP INDEX points_ledger_user_idx;
+ALTER TABLE points_ledger DROP COLUMN user_id;
+
+ALTER TABLE schemes_redemption ALTER COLUMN email SET NOT NULL;
+ALTER TABLE schemes_redemption ADD CONSTRAINT schemes_redemption_email_key UNIQUE (email);
+ALTER TABLE schemes_redemption DROP COLUMN user_id;
+
+ALTER TABLE user_points ALTER COLUMN email SET NOT NULL;
+ALTER TABLE user_points ADD CONSTRAINT user_points_email_key UNIQUE (email);
+ALTER TABLE user_points ADD CONSTRAINT user_points_email_fkey FOREIGN KEY (email) REFERENCES users(email);
+ALTER TABLE user_points DROP COLUMN user_id;
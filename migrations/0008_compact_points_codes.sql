@@ -0,0 +1,184 @@
+-- Points codes are stored as BIGINT instead of VARCHAR(12) and their status as a
+-- boolean scanned column, so heap rows, the primary key and the partial indexes
+-- hold fixed width integers and the scan path compares 8 byte keys instead of text.
+-- A code (8 digits and 4 capital letters) is packed as digits * 26^4 + letters with
+-- two ISO 7064 MOD 97-10 check digits appended; encode_points_code() and
+-- decode_points_code() match api/points_api/utils/code_codec.py and are plain
+-- expressions so the planner inlines them. Both return NULL for malformed input.
+
+-- migrate:up
+CREATE FUNCTION encode_points_code(code TEXT) RETURNS BIGINT AS $$
+    SELECT CASE WHEN code ~ '^[0-9]{8}[A-Z]{4}$' THEN
+        (substr(code, 1, 8)::BIGINT * 456976
+            + (ascii(substr(code, 9, 1)) - 65) * 17576
+            + (ascii(substr(code, 10, 1)) - 65) * 676
+            + (ascii(substr(code, 11, 1)) - 65) * 26
+            + ascii(substr(code, 12, 1)) - 65) * 100 / 97 * 97 + 98
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE FUNCTION decode_points_code(code BIGINT) RETURNS TEXT AS $$
+    SELECT CASE WHEN code % 97 = 1 AND code >= 0 AND code < 4569760000000000 THEN
+        lpad((code / 45697600)::TEXT, 8, '0')
+        || chr(65 + (code / 1757600 % 26)::INT)
+        || chr(65 + (code / 67600 % 26)::INT)
+        || chr(65 + (code / 2600 % 26)::INT)
+        || chr(65 + (code / 100 % 26)::INT)
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM points WHERE points_code !~ '^[0-9]{8}[A-Z]{4}$')
+    OR EXISTS (SELECT 1 FROM points_archive WHERE points_code !~ '^[0-9]{8}[A-Z]{4}$') THEN
+        RAISE EXCEPTION 'points or points_archive hold codes that are not 8 digits followed by 4 capital letters, fix or delete them before applying this migration';
+    END IF;
+END $$;
+
+DROP INDEX points_live_code_idx;
+DROP INDEX points_scanned_idx;
+-- 0002 created points while points_legacy still held points_status_check, so the name varies
+DO $$
+DECLARE
+    status_check TEXT;
+BEGIN
+    SELECT conname INTO status_check FROM pg_constraint
+    WHERE conrelid = 'points'::regclass AND contype = 'c' AND pg_get_constraintdef(oid) LIKE '%status%';
+    IF FOUND THEN
+        EXECUTE format('ALTER TABLE points DROP CONSTRAINT %I', status_check);
+    END IF;
+END $$;
+ALTER TABLE points
+    ALTER COLUMN points_code TYPE BIGINT USING encode_points_code(points_code),
+    ALTER COLUMN status DROP DEFAULT,
+    ALTER COLUMN status TYPE BOOLEAN USING COALESCE(status = 'scanned', false),
+    ALTER COLUMN status SET DEFAULT false,
+    ALTER COLUMN status SET NOT NULL;
+ALTER TABLE points RENAME COLUMN status TO scanned;
+CREATE INDEX points_live_code_idx ON points (points_code) WHERE NOT scanned;
+CREATE INDEX points_scanned_idx ON points (expiry_date) WHERE scanned;
+
+ALTER TABLE points_archive DROP CONSTRAINT points_archive_status_check;
+ALTER TABLE points_archive
+    ALTER COLUMN points_code TYPE BIGINT USING encode_points_code(points_code),
+    ALTER COLUMN status TYPE BOOLEAN USING COALESCE(status = 'scanned', false),
+    ALTER COLUMN status SET NOT NULL;
+ALTER TABLE points_archive RENAME COLUMN status TO scanned;
+
+CREATE OR REPLACE FUNCTION archive_points(batch_size INT) RETURNS INT AS $$
+DECLARE
+    partition_name TEXT;
+    moved_rows INT;
+    total INT := 0;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'points'::regclass
+        AND c.relname ~ '^points_\d{4}_\d{2}$'
+        AND (to_date(substring(c.relname FROM 8), 'YYYY_MM') + INTERVAL '1 month')::DATE <= CURRENT_DATE
+    LOOP
+        EXECUTE format(
+            'INSERT INTO points_archive (points_code, scanned, points_value, expiry_date)
+             SELECT points_code, scanned, points_value, expiry_date FROM %I
+             ON CONFLICT (points_code) DO NOTHING',
+            partition_name
+        );
+        GET DIAGNOSTICS moved_rows = ROW_COUNT;
+        total := total + moved_rows;
+        EXECUTE format('DROP TABLE %I', partition_name);
+    END LOOP;
+
+    WITH batch AS (
+        SELECT points_code, expiry_date
+        FROM points
+        WHERE scanned OR expiry_date < CURRENT_DATE
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    ),
+    moved AS (
+        DELETE FROM points p
+        USING batch b
+        WHERE p.points_code = b.points_code AND p.expiry_date = b.expiry_date
+        RETURNING p.points_code, p.scanned, p.points_value, p.expiry_date
+    )
+    INSERT INTO points_archive (points_code, scanned, points_value, expiry_date)
+    SELECT points_code, scanned, points_value, expiry_date FROM moved
+    ON CONFLICT (points_code) DO NOTHING;
+    GET DIAGNOSTICS moved_rows = ROW_COUNT;
+
+    RETURN total + moved_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+-- migrate:down
+CREATE OR REPLACE FUNCTION archive_points(batch_size INT) RETURNS INT AS $$
+DECLARE
+    partition_name TEXT;
+    moved_rows INT;
+    total INT := 0;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'points'::regclass
+        AND c.relname ~ '^points_\d{4}_\d{2}$'
+        AND (to_date(substring(c.relname FROM 8), 'YYYY_MM') + INTERVAL '1 month')::DATE <= CURRENT_DATE
+    LOOP
+        EXECUTE format(
+            'INSERT INTO points_archive (points_code, status, points_value, expiry_date)
+             SELECT points_code, status, points_value, expiry_date FROM %I
+             ON CONFLICT (points_code) DO NOTHING',
+            partition_name
+        );
+        GET DIAGNOSTICS moved_rows = ROW_COUNT;
+        total := total + moved_rows;
+        EXECUTE format('DROP TABLE %I', partition_name);
+    END LOOP;
+
+    WITH batch AS (
+        SELECT points_code, expiry_date
+        FROM points
+        WHERE status = 'scanned' OR expiry_date < CURRENT_DATE
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    ),
+    moved AS (
+        DELETE FROM points p
+        USING batch b
+        WHERE p.points_code = b.points_code AND p.expiry_date = b.expiry_date
+        RETURNING p.points_code, p.status, p.points_value, p.expiry_date
+    )
+    INSERT INTO points_archive (points_code, status, points_value, expiry_date)
+    SELECT points_code, status, points_value, expiry_date FROM moved
+    ON CONFLICT (points_code) DO NOTHING;
+    GET DIAGNOSTICS moved_rows = ROW_COUNT;
+
+    RETURN total + moved_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE points_archive RENAME COLUMN scanned TO status;
+ALTER TABLE points_archive
+    ALTER COLUMN points_code TYPE VARCHAR(12) USING decode_points_code(points_code),
+    ALTER COLUMN status DROP NOT NULL,
+    ALTER COLUMN status TYPE VARCHAR(12) USING CASE WHEN status THEN 'scanned' ELSE 'not_scanned' END;
+ALTER TABLE points_archive ADD CONSTRAINT points_archive_status_check CHECK (status IN ('scanned', 'not_scanned'));
+
+DROP INDEX points_live_code_idx;
+DROP INDEX points_scanned_idx;
+ALTER TABLE points RENAME COLUMN scanned TO status;
+ALTER TABLE points
+    ALTER COLUMN points_code TYPE VARCHAR(12) USING decode_points_code(points_code),
+    ALTER COLUMN status DROP DEFAULT,
+    ALTER COLUMN status DROP NOT NULL,
+    ALTER COLUMN status TYPE VARCHAR(12) USING CASE WHEN status THEN 'scanned' ELSE 'not_scanned' END,
+    ALTER COLUMN status SET DEFAULT 'not_scanned';
+ALTER TABLE points ADD CONSTRAINT points_status_check CHECK (status IN ('scanned', 'not_scanned'));
+CREATE INDEX points_live_code_idx ON points (points_code) WHERE status = 'not_scanned';
+CREATE INDEX points_scanned_idx ON points (expiry_date) WHERE status = 'scanned';
+
+DROP FUNCTION decode_points_code(BIGINT);
+DROP FUNCTION encode_points_code(TEXT);
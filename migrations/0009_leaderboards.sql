@@ -0,0 +1,80 @@
+-- Weekly and monthly leaderboards over points earned in the period. Credits (scans
+-- and other earnings, not debits or adjustments) are rolled up per user and day by a
+-- statement level trigger on points_ledger, so a ranking sums a few rows per user
+-- instead of reading the ledger. Rankings are kept in leaderboard_snapshot, which
+-- refresh_leaderboards() rebuilds with REFRESH MATERIALIZED VIEW CONCURRENTLY so
+-- /user/top_users keeps reading the previous snapshot meanwhile. The "all" period
+-- ranks current balances, as top_users did before.
+
+-- migrate:up
+CREATE TABLE points_earned_daily (
+    day DATE NOT NULL,
+    user_id INT NOT NULL,
+    points BIGINT NOT NULL,
+    PRIMARY KEY (day, user_id)
+);
+
+INSERT INTO points_earned_daily (day, user_id, points)
+SELECT created::DATE, user_id, SUM(points)
+FROM points_ledger
+WHERE entry_type = 'credit' AND created IS NOT NULL
+GROUP BY 1, 2;
+
+-- One upsert per statement, user and day; rows are locked in key order so concurrent
+-- batches for the same users cannot deadlock
+CREATE FUNCTION roll_up_points_earned() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO points_earned_daily AS d (day, user_id, points)
+    SELECT COALESCE(created, CURRENT_TIMESTAMP)::DATE, user_id, SUM(points)
+    FROM new_entries
+    WHERE entry_type = 'credit'
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (day, user_id) DO UPDATE SET points = d.points + EXCLUDED.points;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER points_ledger_earned_daily
+AFTER INSERT ON points_ledger
+REFERENCING NEW TABLE AS new_entries
+FOR EACH STATEMENT EXECUTE FUNCTION roll_up_points_earned();
+
+CREATE MATERIALIZED VIEW leaderboard_snapshot AS
+WITH periods (period, period_start) AS (
+    VALUES ('week', date_trunc('week', CURRENT_DATE)::DATE),
+           ('month', date_trunc('month', CURRENT_DATE)::DATE)
+),
+totals AS (
+    SELECT p.period, p.period_start, d.user_id, SUM(d.points)::BIGINT AS points
+    FROM periods p
+    JOIN points_earned_daily d ON d.day >= p.period_start
+    GROUP BY p.period, p.period_start, d.user_id
+    HAVING SUM(d.points) > 0
+    UNION ALL
+    SELECT 'all', NULL, user_id, points::BIGINT
+    FROM user_points
+)
+SELECT t.period, t.period_start, t.user_id, t.points,
+       rank() OVER (PARTITION BY t.period ORDER BY t.points DESC) AS rank,
+       CURRENT_TIMESTAMP AS refreshed_at
+FROM totals t
+JOIN users u ON u.id = t.user_id;
+
+-- REFRESH ... CONCURRENTLY needs a unique index without a WHERE clause
+CREATE UNIQUE INDEX leaderboard_snapshot_key ON leaderboard_snapshot (period, user_id);
+CREATE INDEX leaderboard_snapshot_rank_idx ON leaderboard_snapshot (period, rank, user_id);
+
+CREATE FUNCTION refresh_leaderboards() RETURNS BIGINT AS $$
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY leaderboard_snapshot;
+    RETURN (SELECT count(*) FROM leaderboard_snapshot);
+END;
+$$ LANGUAGE plpgsql;
+
+-- migrate:down
+DROP FUNCTION refresh_leaderboards();
+DROP MATERIALIZED VIEW leaderboard_snapshot;
+DROP TRIGGER points_ledger_earned_daily ON points_ledger;
+DROP FUNCTION roll_up_points_earned();
+DROP TABLE points_earned_daily;
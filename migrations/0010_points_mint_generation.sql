@@ -0,0 +1,30 @@
+-- Shared counter of points code inserts. Every statement that inserts into points bumps
+-- it in the same transaction, whichever worker, script or migration runs it, so a
+-- process that read generation N before scanning points knows its scan saw every code
+-- once the counter still reads N. The in-memory code filter only reports a code as
+-- unknown on that condition and otherwise sends it to the database.
+
+-- migrate:up
+CREATE TABLE points_mint_generation (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    generation BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO points_mint_generation DEFAULT VALUES;
+
+CREATE FUNCTION bump_points_mint_generation() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE points_mint_generation SET generation = generation + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement level so a mint of thousands of codes updates the counter once
+CREATE TRIGGER points_mint_generation_bump
+AFTER INSERT ON points
+FOR EACH STATEMENT EXECUTE FUNCTION bump_points_mint_generation();
+
+-- migrate:down
+DROP TRIGGER points_mint_generation_bump ON points;
+DROP FUNCTION bump_points_mint_generation();
+DROP TABLE points_mint_generation;
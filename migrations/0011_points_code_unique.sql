@@ -0,0 +1,49 @@
+-- points is partitioned by expiry month, so its primary key (points_code, expiry_date)
+-- no longer stops a code being issued twice with another expiry date. The
+-- points_code_unique trigger rejects a statement that inserts a code already in
+-- points or points_archive. It first locks the points_mint_generation row, which every
+-- insert into points also updates, so concurrent mints run the check one at a time and
+-- each sees the codes the previous one committed.
+
+-- migrate:up
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT points_code FROM (
+            SELECT points_code FROM points
+            UNION ALL
+            SELECT points_code FROM points_archive
+        ) codes
+        GROUP BY points_code HAVING COUNT(*) > 1
+    ) THEN
+        RAISE EXCEPTION 'points and points_archive hold some codes more than once, delete the duplicates before applying this migration';
+    END IF;
+END $$;
+
+CREATE FUNCTION check_points_codes_unique() RETURNS TRIGGER AS $$
+DECLARE
+    duplicate BIGINT;
+BEGIN
+    PERFORM 1 FROM points_mint_generation FOR UPDATE;
+
+    SELECT n.points_code INTO duplicate
+    FROM new_codes n
+    WHERE (SELECT COUNT(*) FROM points p WHERE p.points_code = n.points_code) > 1
+       OR EXISTS (SELECT 1 FROM points_archive a WHERE a.points_code = n.points_code)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'points code % was already issued', decode_points_code(duplicate)
+            USING ERRCODE = 'unique_violation';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER points_code_unique
+AFTER INSERT ON points
+REFERENCING NEW TABLE AS new_codes
+FOR EACH STATEMENT EXECUTE FUNCTION check_points_codes_unique();
+
+-- migrate:down
+DROP TRIGGER points_code_unique ON points;
+DROP FUNCTION check_points_codes_unique();
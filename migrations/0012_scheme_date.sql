@@ -0,0 +1,23 @@
+-- scheme_valid_from and scheme_valid_to are DD-MM-YYYY strings. Queries compare them
+-- through scheme_date(), which returns NULL for a value that is not a DD-MM-YYYY date
+-- instead of failing the statement, so one malformed row can neither stop the expiry
+-- sweep nor every /user/apply_for_scheme call. add_scheme() and update_scheme()
+-- reject such values; a NULL date here means the scheme does not expire.
+
+-- migrate:up
+CREATE FUNCTION scheme_date(value TEXT) RETURNS DATE AS $$
+BEGIN
+    IF value IS NULL OR value !~ '^\d{2}-\d{2}-\d{4}$' THEN
+        RETURN NULL;
+    END IF;
+    -- The pattern still lets through days a month does not have
+    BEGIN
+        RETURN to_date(value, 'DD-MM-YYYY');
+    EXCEPTION WHEN data_exception THEN
+        RETURN NULL;
+    END;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- migrate:down
+DROP FUNCTION scheme_date(TEXT);
@@ -0,0 +1,10 @@
+-- send_otp_email jobs used to carry the OTP in jobs.payload, where it stayed until the
+-- job was purged JOB_RETENTION_HOURS later. The job now reads the OTP from
+-- otp_verification when it runs; drop the copies left in the queue.
+
+-- migrate:up
+UPDATE jobs SET payload = payload - 'otp' WHERE job_type = 'send_otp_email' AND payload ? 'otp';
+
+-- migrate:down
+-- The removed OTPs are not restored
+SELECT 1;
@@ -8,9 +8,33 @@ CREATE TABLE users (
 
 CREATE TABLE user_points (
     id SERIAL PRIMARY KEY,
-    email VARCHAR(100) NOT NULL,
-    points INT DEFAULT 0,
-    FOREIGN KEY (email) REFERENCES users(email)
+    user_id INT NOT NULL CONSTRAINT user_points_user_id_key UNIQUE REFERENCES users(id) ON DELETE CASCADE,
+    points INT NOT NULL DEFAULT 0 CONSTRAINT user_points_non_negative CHECK (points >= 0)
+);
+
+CREATE INDEX user_points_points_idx ON user_points (points DESC);
+
+-- user_points.points is maintained by the points_ledger_balance trigger (migrations/0003_points_ledger.sql,
+-- keyed by user_id since migrations/0007_user_id_keys.sql). Entries outlive deleted users as history.
+CREATE TABLE points_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INT NOT NULL,
+    entry_type VARCHAR(12) CHECK (entry_type IN ('credit', 'debit', 'adjustment')) NOT NULL,
+    points INT NOT NULL,
+    source VARCHAR(100),
+    created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX points_ledger_user_idx ON points_ledger (user_id, created DESC);
+CREATE INDEX points_ledger_source_idx ON points_ledger (source);
+
+-- Credits per user and day, maintained by the points_ledger_earned_daily trigger. Ranked into the
+-- leaderboard_snapshot materialized view by refresh_leaderboards() (migrations/0009_leaderboards.sql).
+CREATE TABLE points_earned_daily (
+    day DATE NOT NULL,
+    user_id INT NOT NULL,
+    points BIGINT NOT NULL,
+    PRIMARY KEY (day, user_id)
 );
 
 CREATE TABLE otp_verification (
@@ -21,6 +45,8 @@ CREATE TABLE otp_verification (
     valid_till TIMESTAMP NOT NULL,
 );
 
+CREATE INDEX otp_verification_email_idx ON otp_verification (email);
+
 
 CREATE TABLE pending_signups (
     id SERIAL PRIMARY KEY,
@@ -32,11 +58,39 @@ CREATE TABLE pending_signups (
     email_status VARCHAR(20) CHECK (email_status IN ('verified', 'unverified')) DEFAULT 'unverified'
 );
 
+CREATE INDEX pending_signups_status_idx ON pending_signups (email_status, status);
+
+-- Monthly partitions are created by ensure_points_partitions() and scanned/expired
+-- codes are moved to points_archive by archive_points() (migrations/0002_points_partitioning.sql).
+-- Codes are stored encoded by encode_points_code() (migrations/0008_compact_points_codes.sql).
+-- Codes are unique across points and points_archive, enforced by the points_code_unique trigger
+-- (migrations/0011_points_code_unique.sql) as the primary key has to include the partition key.
 CREATE TABLE points (
-    points_code VARCHAR(12) PRIMARY KEY,  
-    status VARCHAR(12) CHECK (status IN ('scanned', 'not_scanned')) DEFAULT 'not_scanned',
+    points_code BIGINT NOT NULL,
+    scanned BOOLEAN NOT NULL DEFAULT false,
     points_value INT,
-    expiry_date DATE
+    expiry_date DATE NOT NULL,
+    PRIMARY KEY (points_code, expiry_date)
+) PARTITION BY RANGE (expiry_date);
+
+CREATE TABLE points_default PARTITION OF points DEFAULT;
+
+CREATE INDEX points_live_code_idx ON points (points_code) WHERE NOT scanned;
+CREATE INDEX points_scanned_idx ON points (expiry_date) WHERE scanned;
+
+-- Bumped once per statement inserting into points by the points_mint_generation_bump trigger
+-- (migrations/0010_points_mint_generation.sql); the code filter compares it with the value it was built at.
+CREATE TABLE points_mint_generation (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    generation BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE points_archive (
+    points_code BIGINT PRIMARY KEY,
+    scanned BOOLEAN NOT NULL,
+    points_value INT,
+    expiry_date DATE,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 CREATE TABLE scheme (
@@ -44,14 +98,53 @@ CREATE TABLE scheme (
     scheme_title VARCHAR(255) NOT NULL,
     scheme_valid_from VARCHAR(12) NOT NULL,
     scheme_valid_to VARCHAR(12),
-    scheme_perks TEXT
+    scheme_perks TEXT,
+    points INT,
+    status VARCHAR(10) CHECK (status IN ('active', 'expired')) DEFAULT 'active' NOT NULL
 );
 
+CREATE INDEX scheme_title_idx ON scheme (scheme_title);
+CREATE INDEX scheme_status_idx ON scheme (status, scheme_id);
+
 CREATE TABLE schemes_redemption (
     id SERIAL PRIMARY KEY,
     name VARCHAR(255) NOT NULL,
-    email VARCHAR(255) NOT NULL UNIQUE,
+    user_id INT NOT NULL CONSTRAINT schemes_redemption_user_id_key UNIQUE REFERENCES users(id) ON DELETE CASCADE,
     scheme_status VARCHAR(20) CHECK (scheme_status IN ('pending', 'approved', 'rejected')) DEFAULT 'pending',
     scheme_id INT REFERENCES scheme(scheme_id)
 );
 
+CREATE INDEX schemes_redemption_pending_idx ON schemes_redemption (scheme_id) WHERE scheme_status = 'pending';
+CREATE INDEX schemes_redemption_scheme_idx ON schemes_redemption (scheme_id, scheme_status);
+
+
+CREATE TABLE scan_batches (
+    batch_id UUID PRIMARY KEY,
+    email VARCHAR(100) NOT NULL,
+    status VARCHAR(12) CHECK (status IN ('pending', 'processing', 'completed', 'failed')) DEFAULT 'pending',
+    codes JSONB,
+    result JSONB,
+    created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE jobs (
+    id BIGSERIAL PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    priority SMALLINT NOT NULL DEFAULT 100,
+    status VARCHAR(10) CHECK (status IN ('queued', 'running', 'done', 'failed')) NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX jobs_queue_idx ON jobs (priority, run_after, id) WHERE status = 'queued';
+CREATE INDEX jobs_running_idx ON jobs (locked_at) WHERE status = 'running';
+CREATE INDEX jobs_finished_idx ON jobs (updated) WHERE status IN ('done', 'failed');
+CREATE INDEX jobs_status_idx ON jobs (status, job_type);
+CREATE INDEX otp_verification_valid_till_idx ON otp_verification (valid_till);